@@ -0,0 +1,138 @@
+"""
+bench_layer1_adversarial.py
+===========================
+Benchmark đối kháng cho Layer 1: sinh input "bệnh lý" (pathological) cho từng regex
+có lượng từ lồng nhau trên khoảng trắng / ký tự từ, đo thời gian theo độ dài input.
+
+Chạy benchmark:
+    python Smishing/benchmarks/bench_layer1_adversarial.py
+    python Smishing/benchmarks/bench_layer1_adversarial.py --lengths 500 1000 2000 4000 8000
+    python Smishing/benchmarks/bench_layer1_adversarial.py --max-length 500 --time-budget-ms 20
+
+Cột "bậc" = log2(t(2n) / t(n)) giữa 2 độ dài cuối: ~1 là tuyến tính, ~2 là bình phương.
+Phần cuối so sánh mask() mặc định với bounded-time mode (max_length / time_budget_ms).
+"""
+
+import argparse
+import math
+import sys
+import time
+from pathlib import Path
+
+# === SETUP PATH ===
+ROOT_DIR = Path(__file__).resolve().parent.parent.parent  # IE403_DoAnCuoiKy/
+sys.path.insert(0, str(ROOT_DIR))
+
+from Smishing.preprocessing.layer1_masking import AggressiveMasker
+
+
+def repeat_to(unit: str, length: int, suffix: str = "") -> str:
+    """Lặp `unit` cho đủ ~length ký tự"""
+    return unit * max(1, length // len(unit)) + suffix
+
+
+# Regex trong registry compiled -> các input đối kháng (tên, hàm sinh theo độ dài)
+ADVERSARIAL_INPUTS = {
+    "url_broken_shortener": [
+        ("'b i t ' lặp", lambda n: repeat_to("b i t ", n)),
+    ],
+    "url_heavily_obfuscated": [
+        ("'a ' lặp, không có dấu chấm", lambda n: repeat_to("a ", n)),
+        ("'1 ' lặp", lambda n: repeat_to("1 ", n)),
+        ("'a ' lặp + '.' cuối", lambda n: repeat_to("a ", n, ".")),
+    ],
+    "url_protocol": [
+        ("'www.' lặp", lambda n: repeat_to("www.", n)),
+        ("http:// + 'ab ' lặp", lambda n: "http://" + repeat_to("ab ", n)),
+    ],
+    "url_schemeless_safe": [
+        ("'a . ' lặp", lambda n: repeat_to("a . ", n)),
+        ("'ab.' lặp", lambda n: repeat_to("ab.", n, "!")),
+    ],
+    "url_schemeless_risky": [
+        ("'ab.' lặp", lambda n: repeat_to("ab.", n, "!")),
+        ("'www.' lặp", lambda n: repeat_to("www.", n)),
+    ],
+    "email": [
+        ("'ab.' lặp", lambda n: repeat_to("ab.", n, "!")),
+    ],
+    "bank_acc": [
+        ("'stk ' lặp", lambda n: repeat_to("stk ", n)),
+    ],
+    "shortcode_context": [
+        ("'gui ' lặp", lambda n: repeat_to("gui ", n)),
+    ],
+}
+
+
+def get_regex(masker: AggressiveMasker, key: str):
+    compiled = masker._compiled
+    return compiled[key] if key in compiled else compiled["entities"][key][1]
+
+
+def best_time(func, text: str, repeat: int) -> float:
+    """Thời gian nhỏ nhất (giây) trong `repeat` lần chạy"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def growth(timings: list[float]) -> str:
+    if len(timings) < 2 or timings[-2] <= 0:
+        return "  -"
+    return f"{math.log2(timings[-1] / timings[-2]):4.1f}"
+
+
+def bench_patterns(masker: AggressiveMasker, lengths: list[int], repeat: int):
+    """Thời gian re.sub() của từng regex trên input đối kháng (ms)"""
+    header = "".join(f"{n:>10}" for n in lengths)
+    print(f"\n{'regex':<24}{'input':<30}{header}   bậc")
+    print("-" * (60 + 10 * len(lengths)))
+    for key, generators in ADVERSARIAL_INPUTS.items():
+        regex = get_regex(masker, key)
+        for name, generate in generators:
+            timings = [best_time(lambda t: regex.sub("", t), generate(n), repeat) for n in lengths]
+            cells = "".join(f"{t * 1000:8.1f}ms" for t in timings)
+            print(f"{key:<24}{name:<30}{cells}  {growth(timings)}")
+
+
+def bench_mask(lengths: list[int], repeat: int, max_length: int, time_budget_ms: float):
+    """mask() đầy đủ: mặc định vs bounded-time mode, trên input xấu nhất của mỗi regex"""
+    maskers = {
+        "mặc định": AggressiveMasker(cache_size=0),
+        f"bounded ({max_length} ký tự, {time_budget_ms}ms)": AggressiveMasker(
+            cache_size=0, max_length=max_length, time_budget_ms=time_budget_ms),
+    }
+    header = "".join(f"{n:>10}" for n in lengths)
+    print(f"\n{'mask() - tổng trên mọi input':<54}{header}")
+    print("-" * (54 + 10 * len(lengths)))
+    for name, masker in maskers.items():
+        timings = []
+        for n in lengths:
+            inputs = [generate(n) for generators in ADVERSARIAL_INPUTS.values() for _, generate in generators]
+            timings.append(max(best_time(masker.mask, text, repeat) for text in inputs))
+        cells = "".join(f"{t * 1000:8.1f}ms" for t in timings)
+        print(f"{name + ' (max mỗi tin)':<54}{cells}")
+        print(f"{'':<54}budget_stats={masker.budget_stats}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Layer 1 adversarial regex benchmark")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[250, 500, 1000, 2000, 4000],
+                        help="Độ dài input (ký tự)")
+    parser.add_argument("--repeat", type=int, default=1, help="Số lần lặp cho mỗi phép đo")
+    parser.add_argument("--max-length", type=int, default=500, help="max_length của bounded-time mode")
+    parser.add_argument("--time-budget-ms", type=float, default=20, help="time_budget_ms của bounded-time mode")
+    args = parser.parse_args()
+
+    masker = AggressiveMasker(cache_size=0)
+    print(f"\n⏱  Layer 1 adversarial benchmark (repeat={args.repeat})")
+    bench_patterns(masker, args.lengths, args.repeat)
+    bench_mask(args.lengths, args.repeat, args.max_length, args.time_budget_ms)
+
+
+if __name__ == "__main__":
+    main()
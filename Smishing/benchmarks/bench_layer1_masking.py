@@ -0,0 +1,296 @@
+"""
+bench_layer1_masking.py
+=======================
+Microbenchmark cho Layer 1: đo thời gian mask() trên từng tin nhắn của data/dataset.csv
+
+Chạy benchmark:
+    python Smishing/benchmarks/bench_layer1_masking.py
+    python Smishing/benchmarks/bench_layer1_masking.py --repeat 5 --purge-re-cache
+    python Smishing/benchmarks/bench_layer1_masking.py --init
+    python Smishing/benchmarks/bench_layer1_masking.py --per-entity
+    python Smishing/benchmarks/bench_layer1_masking.py --spans
+    python Smishing/benchmarks/bench_layer1_masking.py --cache
+    python Smishing/benchmarks/bench_layer1_masking.py --batch 1 2 4
+    python Smishing/benchmarks/bench_layer1_masking.py --anchors
+    python Smishing/benchmarks/bench_layer1_masking.py --joined 1 10 100 1000 10000
+    python Smishing/benchmarks/bench_layer1_masking.py --trie
+
+Các phép đo per-message tắt LRU cache của mask() (cache_size=0); --cache đo riêng hiệu quả cache.
+
+--purge-re-cache gọi re.purge() trước mỗi tin nhắn để mô phỏng trường hợp code khác
+đẩy pattern của Layer 1 ra khỏi cache nội bộ (512 entry) của module `re`.
+"""
+
+import argparse
+import os
+import random
+import re
+import unicodedata
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# === SETUP PATH ===
+ROOT_DIR = Path(__file__).resolve().parent.parent.parent  # IE403_DoAnCuoiKy/
+sys.path.insert(0, str(ROOT_DIR))
+
+from Smishing.preprocessing.layer1_masking import AggressiveMasker
+from Smishing.data_loader import load_dataset
+
+
+def load_texts(data_path: Path) -> list[str]:
+    """Load nội dung tin nhắn từ dataset"""
+    df = load_dataset(data_path)
+    return df["content"].fillna("").astype(str).tolist()
+
+
+def time_per_message(masker, texts: list[str], repeat: int = 3, purge_re_cache: bool = False,
+                     method: str = "mask") -> list[float]:
+    """
+    Đo thời gian masker.<method>() (mặc định mask()) cho từng tin nhắn (micro giây).
+    Mỗi tin nhắn lấy thời gian nhỏ nhất trong `repeat` lần chạy để giảm nhiễu.
+    """
+    run = getattr(masker, method)
+    timings = []
+    for text in texts:
+        best = float("inf")
+        for _ in range(repeat):
+            if purge_re_cache:
+                re.purge()
+            start = time.perf_counter()
+            run(text)
+            best = min(best, time.perf_counter() - start)
+        timings.append(best * 1e6)
+    return timings
+
+
+def summarize(name: str, timings: list[float]):
+    """In thống kê thời gian (µs/tin nhắn)"""
+    ordered = sorted(timings)
+    p95 = ordered[int(len(ordered) * 0.95) - 1]
+    p99 = ordered[int(len(ordered) * 0.99) - 1]
+    print(f"{name:<28} mean={statistics.mean(timings):8.1f}µs  "
+          f"p50={statistics.median(timings):8.1f}µs  p95={p95:8.1f}µs  p99={p99:8.1f}µs")
+
+
+def time_per_entity(masker, texts: list[str], repeat: int = 3):
+    """
+    So sánh findall() + sub() với _sub_and_collect() (subn + callback) cho từng pattern thuần.
+    Mỗi pattern chạy trên toàn bộ texts, lấy thời gian nhỏ nhất trong `repeat` lần (µs/tin nhắn).
+    """
+    texts = [unicodedata.normalize("NFC", t) for t in texts]
+    print(f"\n{'entity':<12}{'findall+sub':>14}{'subn':>12}{'speedup':>10}")
+    for label, (token_tag, logic) in masker._compiled["entities"].items():
+        if callable(logic):
+            continue
+        best_old = best_new = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for text in texts:
+                if logic.findall(text):
+                    logic.sub(token_tag, text)
+            best_old = min(best_old, time.perf_counter() - start)
+
+            start = time.perf_counter()
+            for text in texts:
+                masker._sub_and_collect(logic, token_tag, text)
+            best_new = min(best_new, time.perf_counter() - start)
+
+        old_us, new_us = best_old / len(texts) * 1e6, best_new / len(texts) * 1e6
+        print(f"{label:<12}{old_us:>12.2f}µs{new_us:>10.2f}µs{old_us / new_us:>9.2f}x")
+
+
+def time_spam_wave(texts: list[str], copies: int = 5, cache_size: int = 4096):
+    """
+    Mô phỏng đợt spam: mỗi nội dung xuất hiện `copies` lần, thứ tự xáo trộn.
+    So sánh tổng thời gian mask() khi tắt/bật LRU cache.
+    """
+    stream = texts * copies
+    random.Random(0).shuffle(stream)
+    print(f"\n📨 Spam wave: {len(stream):,} tin nhắn ({copies} bản sao mỗi nội dung)")
+    for size in (0, cache_size):
+        masker = AggressiveMasker(cache_size=size)
+        start = time.perf_counter()
+        for text in stream:
+            masker.mask(text)
+        elapsed = (time.perf_counter() - start) / len(stream) * 1e6
+        print(f"cache_size={size:<6} {elapsed:8.1f}µs/tin nhắn  {masker.get_cache_stats()}")
+
+
+def time_mask_batch(texts: list[str], workers_list: list[int], chunk_size: int = 256):
+    """Đo thông lượng mask_batch() với số worker khác nhau (cache tắt để đo đúng phần tính toán)"""
+    masker = AggressiveMasker(cache_size=0)
+    print(f"\n🧵 mask_batch() trên {len(texts):,} tin nhắn (chunk_size={chunk_size}, CPU={os.cpu_count()})")
+    baseline = None
+    for workers in workers_list:
+        start = time.perf_counter()
+        masker.mask_batch(texts, workers=workers, chunk_size=chunk_size, min_parallel_size=0)
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        print(f"workers={workers:<3} {elapsed:7.2f}s  {len(texts) / elapsed:9.0f} tin nhắn/s  x{baseline / elapsed:.2f}")
+
+
+def time_keyword_anchors(texts: list[str], repeat: int = 3):
+    """
+    So sánh regex.sub() quét mọi vị trí với _anchored_sub() (chỉ match tại vị trí từ khóa)
+    cho 2 regex bắt đầu bằng từ khóa: bank_acc và shortcode_context.
+    Tách riêng tin nhắn có / không có từ khóa (µs/tin nhắn).
+    """
+    masker = AggressiveMasker(cache_size=0)
+    compiled = masker._compiled
+    texts = [unicodedata.normalize("NFC", t) for t in texts]
+    replacer = lambda m: f"{m.group(1)} <TAG>"
+
+    print(f"\n{'regex':<20}{'nhóm tin nhắn':<20}{'số tin':>8}{'sub':>12}{'anchored':>12}{'speedup':>10}")
+    for key, anchors_key in (("bank_acc", "bank_anchors"), ("shortcode_context", "shortcode_anchors")):
+        regex, anchors = compiled[key], compiled[anchors_key]
+        groups = {"có từ khóa": [], "không từ khóa": []}
+        for text in texts:
+            groups["có từ khóa" if masker._keyword_hits(text, anchors) else "không từ khóa"].append(text)
+
+        for name, group in groups.items():
+            if not group:
+                continue
+            best_old = best_new = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                for text in group:
+                    regex.sub(replacer, text)
+                best_old = min(best_old, time.perf_counter() - start)
+
+                start = time.perf_counter()
+                for text in group:
+                    masker._anchored_sub(regex, anchors, replacer, text)
+                best_new = min(best_new, time.perf_counter() - start)
+            old_us, new_us = best_old / len(group) * 1e6, best_new / len(group) * 1e6
+            print(f"{key:<20}{name:<20}{len(group):>8}{old_us:>10.1f}µs{new_us:>10.1f}µs{old_us / new_us:>9.2f}x")
+
+
+def time_joined_batch(texts: list[str], batch_sizes: list[int], repeat: int = 3):
+    """
+    So sánh _mask_batch() (mask từng tin) với _mask_joined() (ghép buffer) theo kích thước batch.
+    Toàn bộ texts được chia thành các batch liên tiếp; kiểm tra kết quả giống hệt nhau (µs/tin nhắn).
+    """
+    masker = AggressiveMasker(cache_size=0)
+    print(f"\n{'batch size':>10}{'_mask_batch':>14}{'_mask_joined':>14}{'speedup':>10}  kết quả")
+    for size in batch_sizes:
+        batches = [texts[i:i + size] for i in range(0, len(texts), size)]
+        best_old = best_new = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            expected = [masker._mask_batch(batch) for batch in batches]
+            best_old = min(best_old, time.perf_counter() - start)
+
+            start = time.perf_counter()
+            actual = [masker._mask_joined(batch) for batch in batches]
+            best_new = min(best_new, time.perf_counter() - start)
+        old_us, new_us = best_old / len(texts) * 1e6, best_new / len(texts) * 1e6
+        status = "giống" if actual == expected else "KHÁC"
+        print(f"{size:>10}{old_us:>12.1f}µs{new_us:>12.1f}µs{old_us / new_us:>9.2f}x  {status}")
+
+
+# Regex dựng từ danh sách từ (AggressiveMasker.WORD_LISTS): key trong registry compiled
+TRIE_REGEX_KEYS = ("url_schemeless_safe", "url_schemeless_risky", "bank_acc", "shortcode_whitelist",
+                   "shortcode_context", "money")
+
+
+def time_trie_regex(texts: list[str], repeat: int = 3):
+    """
+    So sánh alternation phẳng với trie regex cho từng regex dựng từ danh sách từ:
+    thời gian finditer() trên toàn bộ texts (µs/tin nhắn) và kiểm tra match giống hệt (span + group).
+    """
+    flat, trie = AggressiveMasker(cache_size=0, trie_regex=False), AggressiveMasker(cache_size=0)
+    texts = [unicodedata.normalize("NFC", t) for t in texts]
+
+    def get(masker, key):
+        compiled = masker._compiled
+        return compiled[key] if key in compiled else compiled["entities"][key][1]
+
+    def scan(regex):
+        return [[(m.span(), m.groups()) for m in regex.finditer(text)] for text in texts]
+
+    print(f"\n{'regex':<24}{'phẳng':>12}{'trie':>12}{'speedup':>10}  kết quả")
+    for key in TRIE_REGEX_KEYS:
+        old, new = get(flat, key), get(trie, key)
+        status = "giống" if scan(old) == scan(new) else "KHÁC"
+        best_old = best_new = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            scan(old)
+            best_old = min(best_old, time.perf_counter() - start)
+
+            start = time.perf_counter()
+            scan(new)
+            best_new = min(best_new, time.perf_counter() - start)
+        old_us, new_us = best_old / len(texts) * 1e6, best_new / len(texts) * 1e6
+        print(f"{key:<24}{old_us:>10.2f}µs{new_us:>10.2f}µs{old_us / new_us:>9.2f}x  {status}")
+
+    summarize("mask() alternation phẳng", time_per_message(flat, texts, repeat))
+    summarize("mask() trie regex", time_per_message(trie, texts, repeat))
+
+
+def time_init(repeat: int = 20):
+    """Thời gian AggressiveMasker() (mỗi mask_batch worker / reload_config đều trả chi phí này)"""
+    AggressiveMasker()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        AggressiveMasker()
+    warm_ms = (time.perf_counter() - start) / repeat * 1e3
+
+    re.purge()
+    start = time.perf_counter()
+    AggressiveMasker()
+    cold_ms = (time.perf_counter() - start) * 1e3
+    print(f"\nAggressiveMasker() warm re cache={warm_ms:.2f}ms  re.purge()={cold_ms:.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Layer 1 masking microbenchmark")
+    parser.add_argument("--data", default=str(ROOT_DIR / "data" / "dataset.csv"), help="Đường dẫn dataset")
+    parser.add_argument("--repeat", type=int, default=3, help="Số lần lặp cho mỗi tin nhắn")
+    parser.add_argument("--limit", type=int, default=None, help="Chỉ chạy N tin nhắn đầu")
+    parser.add_argument("--purge-re-cache", action="store_true", help="Gọi re.purge() trước mỗi tin nhắn")
+    parser.add_argument("--init", action="store_true", help="Đo thời gian khởi tạo AggressiveMasker()")
+    parser.add_argument("--per-entity", action="store_true", help="So sánh findall+sub với subn cho từng entity")
+    parser.add_argument("--spans", action="store_true", help="Đo thêm extract_spans()")
+    parser.add_argument("--cache", action="store_true", help="Đo LRU cache của mask() trên luồng spam lặp lại")
+    parser.add_argument("--batch", type=int, nargs="+", metavar="WORKERS", help="Đo mask_batch() với các số worker")
+    parser.add_argument("--anchors", action="store_true", help="So sánh regex.sub với keyword-anchored sub")
+    parser.add_argument("--trie", action="store_true", help="So sánh alternation phẳng với trie regex")
+    parser.add_argument("--joined", type=int, nargs="+", metavar="SIZE",
+                        help="So sánh _mask_batch với _mask_joined theo các kích thước batch")
+    args = parser.parse_args()
+
+    texts = load_texts(Path(args.data))
+    if args.limit:
+        texts = texts[:args.limit]
+
+    print(f"\n⏱  Layer 1 mask() trên {len(texts):,} tin nhắn (repeat={args.repeat})")
+    print("-" * 90)
+    masker = AggressiveMasker(cache_size=0)
+    summarize("warm re cache", time_per_message(masker, texts, args.repeat))
+    if args.purge_re_cache:
+        summarize("re.purge()", time_per_message(masker, texts, args.repeat, purge_re_cache=True))
+    skip_rate = masker.get_prefilter_stats()["skip_rate"]
+    print("    prefilter skip rate: " + ", ".join(f"{k}={v:.0%}" for k, v in skip_rate.items()))
+    summarize("no prefilter", time_per_message(AggressiveMasker(prefilter=False, cache_size=0), texts, args.repeat))
+    if args.init:
+        time_init()
+    if args.spans:
+        summarize("extract_spans()", time_per_message(AggressiveMasker(cache_size=0), texts, args.repeat, method="extract_spans"))
+    if args.anchors:
+        time_keyword_anchors(texts, args.repeat)
+    if args.trie:
+        time_trie_regex(texts, args.repeat)
+    if args.joined:
+        time_joined_batch(texts, args.joined, args.repeat)
+    if args.batch:
+        time_mask_batch(texts, args.batch)
+    if args.cache:
+        time_spam_wave(texts)
+    if args.per_entity:
+        time_per_entity(AggressiveMasker(cache_size=0), texts, args.repeat)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+bench_layer2_scaling.py
+=======================
+Benchmark khả năng mở rộng của Layer 2 (TextNormalizer.normalize) theo độ dài tin nhắn.
+Tin nhắn dài được ghép từ dataset (đã qua Layer 1) để giữ tỷ lệ leet / từ có trong từ điển thực tế.
+Phần cuối so sánh tách separator + tokenize cũ (regex sub + findall + gộp khoảng trắng + finditer)
+với _clean_and_tokenize() (str.translate + 1 lượt findall) trên tin ngắn và dài.
+
+Chạy benchmark:
+    python Smishing/benchmarks/bench_layer2_scaling.py
+    python Smishing/benchmarks/bench_layer2_scaling.py --lengths 50 200 1000 5000 20000 --repeat 5
+
+Cột "bậc" = log2(t(2n) / t(n)) quy đổi theo tỷ lệ độ dài giữa 2 mốc liên tiếp:
+~1 là tuyến tính, ~2 là bình phương. Cột µs/ký tự phải gần như không đổi khi tuyến tính.
+"""
+
+import argparse
+import contextlib
+import io
+import math
+import re
+import sys
+import time
+from pathlib import Path
+
+# === SETUP PATH ===
+ROOT_DIR = Path(__file__).resolve().parent.parent.parent  # IE403_DoAnCuoiKy/
+sys.path.insert(0, str(ROOT_DIR))
+sys.path.insert(0, str(ROOT_DIR / "Smishing"))
+
+from Smishing.data_loader import load_dataset
+from Smishing.preprocessing.layer1_masking import AggressiveMasker
+from linguistic_features.layer2_normalization import TextNormalizer
+
+DICTS_DIR = ROOT_DIR / "Smishing" / "dicts"
+
+
+def build_normalizer() -> TextNormalizer:
+    """
+    TextNormalizer với từ điển; fallback sang full_dict.txt / shadow_dict.txt đã export nếu thiếu words.txt
+    Tắt memo token để đo đúng chi phí pipeline regex (lặp lại cùng tin nhắn sẽ luôn hit memo)
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        normalizer = TextNormalizer(token_cache_size=0)
+    if not normalizer.full_dict:
+        for attr, name in (("full_dict", "full_dict.txt"), ("shadow_dict", "shadow_dict.txt")):
+            path = DICTS_DIR / name
+            if path.exists():
+                words = path.read_text(encoding="utf-8").split("\n")
+                setattr(normalizer, attr, {w for w in words if w})
+    print(f"Từ điển: {len(normalizer.full_dict):,} từ (full), {len(normalizer.shadow_dict):,} từ (shadow)")
+    return normalizer
+
+
+def make_message(corpus: str, length: int) -> str:
+    """Cắt `length` ký tự từ corpus (lặp lại nếu thiếu), cắt tại khoảng trắng"""
+    text = corpus * (length // len(corpus) + 1)
+    cut = text.rfind(" ", 0, length)
+    return text[:cut if cut > 0 else length]
+
+
+def best_time(func, text: str, repeat: int) -> float:
+    """Thời gian nhỏ nhất (giây) trong `repeat` lần chạy"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def old_clean_and_tokenize(normalizer: TextNormalizer, segments: list[str]) -> tuple[list[str], str, int]:
+    """Cách cũ: separator regex sub + findall để đếm, gộp khoảng trắng, rồi finditer tokenize"""
+    cleaned = list(segments)
+    count = 0
+    for i in range(0, len(cleaned), 2):
+        count += len(normalizer.separator_pattern.findall(cleaned[i]))
+        cleaned[i] = normalizer.separator_pattern.sub(" ", cleaned[i])
+    text = re.sub(r"\s+", " ", "".join(cleaned)).strip()
+    tokens = []
+    for match in normalizer.token_pattern.finditer(text):
+        if match.group(1):
+            tokens.append(match.group(1))
+        elif match.group(2):
+            tokens.append(match.group(2).lower())
+    return tokens, " ".join(tokens), count
+
+
+def bench_separator_tokenize(normalizer: TextNormalizer, corpus: str, lengths: list[int], repeat: int):
+    """Tách separator + tokenize: cách cũ vs 1 lượt (µs mỗi tin nhắn)"""
+    print(f"\n⏱  Tách separator + tokenize (repeat={repeat})")
+    print(f"{'độ dài':>8}{'cũ':>12}{'1 lượt':>12}{'speedup':>10}")
+    print("-" * 42)
+    for length in lengths:
+        segments = normalizer._split_tag_segments(make_message(corpus, length))
+        assert old_clean_and_tokenize(normalizer, segments) == normalizer._clean_and_tokenize(segments)
+        old = best_time(lambda s: old_clean_and_tokenize(normalizer, s), segments, repeat * 10)
+        new = best_time(normalizer._clean_and_tokenize, segments, repeat * 10)
+        print(f"{length:>8}{old * 1e6:>10.1f}µs{new * 1e6:>10.1f}µs{old / new:>9.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Layer 2 length-scaling benchmark")
+    parser.add_argument("--data", default=str(ROOT_DIR / "data" / "dataset.csv"), help="Dataset nguồn")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[50, 200, 1000, 5000, 20000],
+                        help="Độ dài tin nhắn (ký tự)")
+    parser.add_argument("--repeat", type=int, default=3, help="Số lần lặp cho mỗi phép đo")
+    args = parser.parse_args()
+
+    df = load_dataset(Path(args.data))
+    masker = AggressiveMasker()
+    # Ưu tiên tin spam (nhiều leet) để phần validate từ điển chạy nhiều nhất
+    spam = df[df["label"] == 1]["content"].fillna("").astype(str).tolist()
+    corpus = " ".join(masker.mask(text)[0] for text in spam)
+    normalizer = build_normalizer()
+
+    print(f"\n⏱  Layer 2 normalize() theo độ dài (repeat={args.repeat})")
+    print(f"{'độ dài':>8}{'thời gian':>12}{'µs/ký tự':>10}{'validated':>11}{'bậc':>6}")
+    print("-" * 47)
+    previous = None
+    for length in args.lengths:
+        text = make_message(corpus, length)
+        elapsed = best_time(normalizer.normalize, text, args.repeat)
+        validated = normalizer.normalize(text).validated_leet_count
+        order = "   -"
+        if previous is not None:
+            prev_len, prev_time = previous
+            order = f"{math.log(elapsed / prev_time) / math.log(len(text) / prev_len):4.2f}"
+        print(f"{len(text):>8}{elapsed * 1000:>10.2f}ms{elapsed * 1e6 / len(text):>10.2f}{validated:>11}{order:>6}")
+        previous = (len(text), elapsed)
+
+    bench_separator_tokenize(normalizer, corpus, args.lengths, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
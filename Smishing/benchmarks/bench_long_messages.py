@@ -0,0 +1,164 @@
+"""
+bench_long_messages.py
+======================
+Đánh giá chế độ chi phí giới hạn cho tin nhắn dài của SmishingFeatureExtractor
+(long_message_chars / window_chars / time_budget_ms):
+    1. Độ trễ extract_features() mỗi tin nhắn: đầy đủ vs chế độ tin nhắn dài (dataset + tin nhắn dài tổng hợp)
+    2. Sai lệch feature trên các tin nhắn bị cắt cửa sổ đầu+cuối
+    3. Ảnh hưởng tới độ chính xác của model đã train (cần joblib + xgboost và file model/encoder)
+
+Chạy benchmark:
+    python Smishing/benchmarks/bench_long_messages.py
+    python Smishing/benchmarks/bench_long_messages.py --long-message-chars 400 --window-chars 300
+    python Smishing/benchmarks/bench_long_messages.py --synthetic-lengths 2000 5000 10000 --time-budget-ms 50
+"""
+
+import argparse
+import contextlib
+import io
+import logging
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# === SETUP PATH ===
+ROOT_DIR = Path(__file__).resolve().parent.parent.parent  # IE403_DoAnCuoiKy/
+sys.path.insert(0, str(ROOT_DIR))
+sys.path.insert(0, str(ROOT_DIR / "Smishing"))
+
+from Smishing.data_loader import load_dataset
+from features import SmishingFeatureExtractor
+
+logging.getLogger("features").setLevel(logging.WARNING)
+
+
+def build_extractor(dict_path: str, **kwargs) -> SmishingFeatureExtractor:
+    """Khởi tạo extractor (ẩn log load từ điển)"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return SmishingFeatureExtractor(dict_path=dict_path, **kwargs)
+
+
+def run(extractor: SmishingFeatureExtractor, texts: list[str]) -> tuple[list[list], list[float]]:
+    """Vector feature và thời gian (ms) cho từng tin nhắn"""
+    vectors, timings = [], []
+    for text in texts:
+        start = time.perf_counter()
+        vectors.append(extractor.extract_features(text))
+        timings.append((time.perf_counter() - start) * 1000)
+    return vectors, timings
+
+
+def latency_line(name: str, timings: list[float]) -> str:
+    ordered = sorted(timings)
+    p99 = ordered[max(int(len(ordered) * 0.99) - 1, 0)]
+    return (f"{name:<28} mean={statistics.mean(timings):7.2f}ms  p99={p99:7.2f}ms  "
+            f"max={ordered[-1]:7.2f}ms")
+
+
+def report_latency(texts: list[str], full: tuple, bounded: tuple, long_chars: int):
+    print(f"\n⏱  Độ trễ extract_features() trên {len(texts):,} tin nhắn")
+    print(latency_line("đầy đủ", full[1]))
+    print(latency_line("tin nhắn dài (bounded)", bounded[1]))
+    long_idx = [i for i, t in enumerate(texts) if len(t) > long_chars]
+    if long_idx:
+        print(latency_line(f"đầy đủ, > {long_chars} ký tự", [full[1][i] for i in long_idx]))
+        print(latency_line(f"bounded, > {long_chars} ký tự", [bounded[1][i] for i in long_idx]))
+
+
+def report_feature_drift(names: list[str], full_vectors: list, bounded_vectors: list):
+    """Sai lệch tuyệt đối trung bình của từng feature trên các tin nhắn có vector khác nhau"""
+    changed = [i for i, (a, b) in enumerate(zip(full_vectors, bounded_vectors)) if a != b]
+    print(f"\n📐 Sai lệch feature: {len(changed):,} tin nhắn có vector khác bản đầy đủ")
+    if not changed:
+        return
+    print(f"{'feature':<24}{'mean |Δ|':>10}{'mean đầy đủ':>14}")
+    for j, name in enumerate(names):
+        diffs = [abs(full_vectors[i][j] - bounded_vectors[i][j]) for i in changed]
+        if any(diffs):
+            base = statistics.mean(full_vectors[i][j] for i in changed)
+            print(f"{name:<24}{statistics.mean(diffs):>10.3f}{base:>14.3f}")
+
+
+def report_accuracy(df, full_vectors: list, bounded_vectors: list, model_path: Path, encoder_path: Path,
+                    threshold: float):
+    """Accuracy / Recall / F1 của model đã train trên 2 bộ feature (vector = [sender_code] + features)"""
+    try:
+        import joblib  # model XGBoost cần cài xgboost để load
+        model = joblib.load(model_path)
+        encoder = joblib.load(encoder_path)
+    except (ImportError, OSError) as e:
+        print(f"\n⚠ Bỏ qua đánh giá độ chính xác (không load được model/encoder): {e}")
+        return
+
+    senders = df["sender_type"].astype(str).tolist()
+    known = set(encoder.classes_)
+    codes = [encoder.transform([s])[0] if s in known else 0 for s in senders]
+    labels = df["label"].astype(int).tolist()
+
+    print(f"\n🎯 Ảnh hưởng tới model {model_path.name} (threshold={threshold})")
+    predictions = {}
+    for name, vectors in (("đầy đủ", full_vectors), ("tin nhắn dài (bounded)", bounded_vectors)):
+        probs = model.predict_proba([[code] + vec for code, vec in zip(codes, vectors)])[:, 1]
+        preds = [int(p >= threshold) for p in probs]
+        predictions[name] = preds
+        tp = sum(1 for p, y in zip(preds, labels) if p == 1 and y == 1)
+        fp = sum(1 for p, y in zip(preds, labels) if p == 1 and y == 0)
+        fn = sum(1 for p, y in zip(preds, labels) if p == 0 and y == 1)
+        accuracy = sum(1 for p, y in zip(preds, labels) if p == y) / len(labels)
+        recall = tp / (tp + fn) if tp + fn else 0.0
+        precision = tp / (tp + fp) if tp + fp else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        print(f"{name:<28} accuracy={accuracy:.4f}  recall={recall:.4f}  precision={precision:.4f}  f1={f1:.4f}")
+    flipped = sum(1 for a, b in zip(*predictions.values()) if a != b)
+    print(f"Số dự đoán bị đổi: {flipped:,} / {len(labels):,}")
+
+
+def report_synthetic(texts: list[str], lengths: list[int], full_ex, bounded_ex):
+    """Tin nhắn dài tổng hợp (ghép các tin nhắn của dataset) để kiểm tra chặn độ trễ"""
+    print(f"\n📏 Tin nhắn dài tổng hợp")
+    print(f"{'độ dài':>8}{'đầy đủ':>12}{'bounded':>12}")
+    joined = " ".join(texts)
+    for length in lengths:
+        samples = [joined[start:start + length] for start in range(0, 5 * length, length)]
+        full_ms = max(run(full_ex, samples)[1])
+        bounded_ms = max(run(bounded_ex, samples)[1])
+        print(f"{length:>8}{full_ms:>10.1f}ms{bounded_ms:>10.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Long-message bounded-cost mode report")
+    parser.add_argument("--data", default=str(ROOT_DIR / "data" / "dataset.csv"), help="Dataset có nhãn")
+    parser.add_argument("--dict-path", default=None, help="File từ điển cho Layer 2/4")
+    parser.add_argument("--long-message-chars", type=int, default=500, help="Ngưỡng tin nhắn dài (ký tự)")
+    parser.add_argument("--window-chars", type=int, default=400, help="Tổng độ dài cửa sổ đầu+cuối")
+    parser.add_argument("--time-budget-ms", type=float, default=None, help="Ngân sách thời gian Layer 1")
+    parser.add_argument("--synthetic-lengths", type=int, nargs="*", default=[2000, 5000, 10000],
+                        help="Độ dài tin nhắn tổng hợp")
+    parser.add_argument("--model", default=str(ROOT_DIR / "smishing_xgb.pkl"), help="Model đã train")
+    parser.add_argument("--encoder", default=str(ROOT_DIR / "sender_encoder.pkl"), help="Sender encoder")
+    parser.add_argument("--threshold", type=float, default=0.46, help="Ngưỡng phân loại")
+    args = parser.parse_args()
+
+    df = load_dataset(Path(args.data))
+    texts = df["content"].fillna("").astype(str).tolist()
+
+    full_ex = build_extractor(args.dict_path)
+    bounded_ex = build_extractor(args.dict_path, long_message_chars=args.long_message_chars,
+                                 window_chars=args.window_chars, time_budget_ms=args.time_budget_ms)
+    print(f"\nChế độ tin nhắn dài: long_message_chars={args.long_message_chars}, "
+          f"window_chars={args.window_chars}, time_budget_ms={args.time_budget_ms}")
+
+    full = run(full_ex, texts)
+    bounded = run(bounded_ex, texts)
+    print(f"Tin nhắn xử lý theo cửa sổ: {bounded_ex.long_message_stats['windowed']:,} / {len(texts):,}")
+
+    report_latency(texts, full, bounded, args.long_message_chars)
+    report_feature_drift(full_ex.get_feature_names(), full[0], bounded[0])
+    report_accuracy(df, full[0], bounded[0], Path(args.model), Path(args.encoder), args.threshold)
+    if args.synthetic_lengths:
+        report_synthetic(texts, args.synthetic_lengths, full_ex, bounded_ex)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+bench_unicode_normalization.py
+==============================
+So sánh chuẩn hóa Unicode cũ/mới trên dataset, tách tin nhắn ASCII (không dấu) và có dấu:
+    - NFC: unicodedata.normalize('NFC') vs to_nfc() (AggressiveMasker.mask, TextNormalizer._normalize_unicode)
+    - NFKD + bỏ dấu: generator unicodedata.combining vs strip_accents() (SmishingDetectionSystem._simple_normalize)
+    - Pipeline: NFC tin gốc (Layer 1) + NFC tin đã mask (Layer 2) + NFKD bỏ dấu (từ khóa ngữ cảnh)
+    - Bỏ dấu tiếng Việt: NFD + unicodedata.category vs remove_vietnamese_diacritics() (bảng translate + memo),
+      trên token của dataset (lặp nhiều -> memo), mục từ điển (load dict) và nguyên tin nhắn
+    - Fold homoglyph (Tầng 0, trước Layer 1) so với NFC, trên tin ASCII / có dấu / tin bị thay chữ Cyrillic
+
+Chạy benchmark:
+    python Smishing/benchmarks/bench_unicode_normalization.py
+    python Smishing/benchmarks/bench_unicode_normalization.py --repeat 10
+    python Smishing/benchmarks/bench_unicode_normalization.py --diacritics-only
+    python Smishing/benchmarks/bench_unicode_normalization.py --homoglyph-only
+"""
+
+import argparse
+import re
+import sys
+import time
+import unicodedata
+from pathlib import Path
+
+# === SETUP PATH ===
+ROOT_DIR = Path(__file__).resolve().parent.parent.parent  # IE403_DoAnCuoiKy/
+sys.path.insert(0, str(ROOT_DIR))
+sys.path.insert(0, str(ROOT_DIR / "Smishing"))
+
+from Smishing.preprocessing.homoglyph import fold_homoglyphs
+from Smishing.preprocessing.layer1_masking import AggressiveMasker
+from Smishing.data_loader import load_dataset
+from dicts.dict import _fold_token, remove_vietnamese_diacritics, strip_accents, to_nfc
+
+DICTS_DIR = ROOT_DIR / "Smishing" / "dicts"
+
+
+def old_nfc(text: str) -> str:
+    return unicodedata.normalize("NFC", text)
+
+
+def old_strip_accents(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def old_remove_diacritics(text: str) -> str:
+    text = unicodedata.normalize("NFD", text)
+    return "".join([c for c in text if unicodedata.category(c) != "Mn"])
+
+
+def cold_remove_diacritics(text: str) -> str:
+    """remove_vietnamese_diacritics() khi memo luôn miss (đo riêng phần bảng translate)"""
+    _fold_token.cache_clear()
+    return remove_vietnamese_diacritics(text)
+
+
+def best_time(func, texts: list[str], repeat: int) -> float:
+    """Thời gian nhỏ nhất trong `repeat` lần chạy func trên mọi texts (µs/tin nhắn)"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            func(text)
+        best = min(best, time.perf_counter() - start)
+    return best / max(len(texts), 1) * 1e6
+
+
+def bench_diacritics(texts: list[str], repeat: int):
+    """Bỏ dấu tiếng Việt: cách cũ vs bảng translate (memo lạnh / memo nóng)"""
+    tokens = [token for text in texts for token in re.findall(r"\w+", text.lower())]
+    dictionary = [word for name in ("full_dict.txt", "shadow_dict.txt") if (DICTS_DIR / name).exists()
+                  for word in (DICTS_DIR / name).read_text(encoding="utf-8").split("\n") if word]
+    groups = {"token dataset": tokens, "mục từ điển": dictionary, "tin nhắn": texts}
+
+    for group in groups.values():
+        assert all(remove_vietnamese_diacritics(t) == old_remove_diacritics(t) for t in group)
+
+    print(f"\n⏱  Bỏ dấu tiếng Việt (repeat={repeat}): "
+          + ", ".join(f"{name}={len(group):,}" for name, group in groups.items()))
+    print(f"\n{'nhóm':<16}{'cũ':>10}{'bảng':>10}{'bảng+memo':>12}{'speedup':>10}")
+    for name, group in groups.items():
+        old_us = best_time(old_remove_diacritics, group, repeat)
+        # Bảng không memo: xóa memo trước mỗi lần gọi (thời gian cache_clear được trừ ra)
+        clear_us = best_time(lambda _: _fold_token.cache_clear(), group, repeat)
+        table_us = best_time(cold_remove_diacritics, group, repeat) - clear_us
+        memo_us = best_time(remove_vietnamese_diacritics, group, repeat)
+        print(f"{name:<16}{old_us:>8.2f}µs{table_us:>8.2f}µs{memo_us:>10.2f}µs{old_us / memo_us:>9.2f}x")
+
+
+# Chữ Latin -> Cyrillic look-alike dùng để giả lập tin nhắn obfuscate
+_OBFUSCATE_TABLE = str.maketrans({'a': 'а', 'o': 'о', 'e': 'е', 'c': 'с', 'p': 'р', 'V': 'Ѵ'})
+
+
+def bench_homoglyph(texts: list[str], repeat: int):
+    """Fold homoglyph (1 lượt str.translate) so với NFC: chi phí trên hot path phải không đáng kể"""
+    obfuscated = [text.translate(_OBFUSCATE_TABLE) for text in texts]
+    for text, fake in zip(texts, obfuscated):
+        folded, count = fold_homoglyphs(fake)
+        assert count >= sum(1 for a, b in zip(text, fake) if a != b)
+        if fold_homoglyphs(text)[1] == 0:
+            assert folded == text
+
+    groups = {"ASCII": [t for t in texts if t.isascii()], "có dấu": [t for t in texts if not t.isascii()],
+              "obfuscate": obfuscated}
+    print(f"\n⏱  Fold homoglyph vs NFC (repeat={repeat}): "
+          + ", ".join(f"{name}={len(group):,}" for name, group in groups.items()) + " tin nhắn")
+    print(f"\n{'nhóm':<12}{'NFC':>10}{'to_nfc':>10}{'homoglyph':>12}{'homoglyph/NFC':>15}")
+    for name, group in groups.items():
+        nfc_us = best_time(old_nfc, group, repeat)
+        to_nfc_us = best_time(to_nfc, group, repeat)
+        fold_us = best_time(fold_homoglyphs, group, repeat)
+        print(f"{name:<12}{nfc_us:>8.2f}µs{to_nfc_us:>8.2f}µs{fold_us:>10.2f}µs{fold_us / nfc_us:>14.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Unicode normalization fast-path benchmark")
+    parser.add_argument("--data", default=str(ROOT_DIR / "data" / "dataset.csv"), help="Đường dẫn dataset")
+    parser.add_argument("--repeat", type=int, default=5, help="Số lần lặp cho mỗi phép đo")
+    parser.add_argument("--diacritics-only", action="store_true", help="Chỉ chạy phần bỏ dấu tiếng Việt")
+    parser.add_argument("--homoglyph-only", action="store_true", help="Chỉ chạy phần fold homoglyph")
+    args = parser.parse_args()
+
+    texts = load_dataset(Path(args.data))["content"].fillna("").astype(str).tolist()
+    bench_homoglyph(texts, args.repeat)
+    if args.homoglyph_only:
+        return
+    bench_diacritics(texts, args.repeat)
+    if args.diacritics_only:
+        return
+
+    masker = AggressiveMasker(cache_size=0)
+    masked = {text: masker.mask(text)[0] for text in texts}
+
+    # Kết quả phải giống hệt cách cũ
+    assert all(to_nfc(t) == old_nfc(t) and strip_accents(t) == old_strip_accents(t) for t in texts)
+
+    def old_pipeline(text):
+        old_nfc(text)
+        old_nfc(masked[text])
+        old_strip_accents(text)
+
+    def new_pipeline(text):
+        to_nfc(text)
+        to_nfc(masked[text])
+        strip_accents(text)
+
+    groups = {"ASCII": [t for t in texts if t.isascii()], "có dấu": [t for t in texts if not t.isascii()]}
+    groups["tất cả"] = texts
+    cases = [("NFC", old_nfc, to_nfc),
+             ("NFKD bỏ dấu", old_strip_accents, strip_accents),
+             ("pipeline", old_pipeline, new_pipeline)]
+
+    print(f"\n⏱  Chuẩn hóa Unicode (repeat={args.repeat}): "
+          + ", ".join(f"{name}={len(group):,}" for name, group in groups.items()) + " tin nhắn")
+    print(f"\n{'phép chuẩn hóa':<16}{'nhóm':<10}{'cũ':>10}{'mới':>10}{'speedup':>10}")
+    for case, old, new in cases:
+        for name, group in groups.items():
+            old_us, new_us = best_time(old, group, args.repeat), best_time(new, group, args.repeat)
+            print(f"{case:<16}{name:<10}{old_us:>8.2f}µs{new_us:>8.2f}µs{old_us / new_us:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,107 @@
+import re
 import unicodedata
 import json
+from functools import lru_cache
 from pathlib import Path
 from typing import Set, Optional, Tuple
 
-def remove_vietnamese_diacritics(text):
+# Bảng bỏ dấu tiếng Việt dựng sẵn: 12 nguyên âm gốc x 6 thanh (kể cả chữ hoa) -> chữ gốc,
+# cùng các dấu kết hợp (text dạng NFD) -> xóa. Giá trị tính từ NFD nên khớp 100% với cách cũ.
+_VIETNAMESE_VOWELS = 'aăâeêioôơuưy'
+_VIETNAMESE_TONES = ('', '\u0300', '\u0301', '\u0309', '\u0303', '\u0323')  # không dấu, huyền, sắc, hỏi, ngã, nặng
+_VIETNAMESE_COMBINING = '\u0300\u0301\u0303\u0309\u0323\u0302\u0306\u031b'  # 5 thanh + mũ, trăng, móc
+
+
+def _remove_diacritics_nfd(text: str) -> str:
+    """NFD rồi bỏ mọi ký tự category Mn (cách gốc, dùng cho text ngoài bảng tiếng Việt)"""
+    text = unicodedata.normalize('NFD', text)
+    return ''.join([c for c in text if unicodedata.category(c) != 'Mn'])
+
+
+def _build_vietnamese_fold_table() -> dict:
+    table = {ord(mark): None for mark in _VIETNAMESE_COMBINING}
+    for vowel in _VIETNAMESE_VOWELS + _VIETNAMESE_VOWELS.upper():
+        for tone in _VIETNAMESE_TONES:
+            letter = unicodedata.normalize('NFC', vowel + tone)
+            table[ord(letter)] = _remove_diacritics_nfd(letter)
+    # đ/Đ không có dạng phân tách NFD nên cách gốc giữ nguyên (shadow dict và model dựa vào điều này)
+    table[ord('đ')] = 'đ'
+    table[ord('Đ')] = 'Đ'
+    return table
+
+
+_VIETNAMESE_FOLD_TABLE = _build_vietnamese_fold_table()
+# fold_d=True: bỏ dấu hoàn toàn về ASCII (đ -> d, Đ -> D)
+_VIETNAMESE_FOLD_D_TABLE = {**_VIETNAMESE_FOLD_TABLE, ord('đ'): 'd', ord('Đ'): 'D'}
+# Text chỉ gồm ASCII + chữ/dấu tiếng Việt thì dùng bảng, còn lại (ký tự ngoài bảng) quay về NFD
+_NON_VIETNAMESE_CHAR = re.compile(
+    '[^\x00-\x7f' + ''.join(re.escape(chr(code)) for code in _VIETNAMESE_FOLD_TABLE) + ']'
+)
+
+DIACRITIC_CACHE_SIZE = 65536  # Số token tối đa trong memo bỏ dấu
+DIACRITIC_CACHE_MAX_LENGTH = 32  # Chỉ memo token ngắn (từ), không memo cả câu
+
+
+@lru_cache(maxsize=DIACRITIC_CACHE_SIZE)
+def _fold_token(token: str, fold_d: bool) -> str:
+    return _fold_diacritics(token, fold_d)
+
+
+def _fold_diacritics(text: str, fold_d: bool) -> str:
+    if _NON_VIETNAMESE_CHAR.search(text) is None:
+        return text.translate(_VIETNAMESE_FOLD_D_TABLE if fold_d else _VIETNAMESE_FOLD_TABLE)
+    text = _remove_diacritics_nfd(text)
+    return text.translate(_VIETNAMESE_FOLD_D_TABLE) if fold_d else text
+
+
+def remove_vietnamese_diacritics(text, fold_d: bool = False):
     """
     Chuyển text tiếng Việt có dấu về không dấu.
     Giữ nguyên chữ cái tiếng Anh, số, ký tự đặc biệt.
+    Mặc định giữ đ/Đ như cách NFD gốc; fold_d=True chuyển đ -> d, Đ -> D.
+
+    Text ASCII trả về ngay; text tiếng Việt dùng bảng str.translate dựng sẵn,
+    token ngắn được memo (LRU giới hạn DIACRITIC_CACHE_SIZE).
     """
     if not isinstance(text, str):
         return text
-    text = unicodedata.normalize('NFD', text)
-    text = ''.join([c for c in text if unicodedata.category(c) != 'Mn'])
-    return text
+    if text.isascii():
+        return text
+    if len(text) <= DIACRITIC_CACHE_MAX_LENGTH:
+        return _fold_token(text, fold_d)
+    return _fold_diacritics(text, fold_d)
+
+def to_nfc(text: str) -> str:
+    """
+    Chuẩn hóa NFC, bỏ qua hoàn toàn với text ASCII (tin nhắn không dấu - phần lớn traffic).
+    Text đã là NFC (VD: output của AggressiveMasker.mask()) được unicodedata trả về nguyên vẹn sau quick-check.
+    """
+    if text.isascii():
+        return text
+    return unicodedata.normalize('NFC', text)
+
+
+class _CombiningTable(dict):
+    """Bảng str.translate: ký tự kết hợp (dấu) -> xóa, ký tự khác -> giữ. Điền dần theo ký tự gặp phải."""
+
+    def __missing__(self, code):
+        value = None if unicodedata.combining(chr(code)) else code
+        self[code] = value
+        return value
+
+
+_COMBINING_TABLE = _CombiningTable()
+
+
+def strip_accents(text: str) -> str:
+    """
+    NFKD rồi bỏ ký tự kết hợp (giống ''.join(ch for ch in NFKD(text) if not combining(ch))).
+    Text ASCII trả về ngay; text có dấu lọc bằng str.translate thay vì generator từng ký tự.
+    """
+    if text.isascii():
+        return text
+    return unicodedata.normalize('NFKD', text).translate(_COMBINING_TABLE)
+
 
 def load_full_dict(word_file: Optional[str] = None) -> Set[str]:
     """
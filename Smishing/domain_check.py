@@ -1,10 +1,7 @@
 import logging
-import tldextract
 import requests
 from bs4 import BeautifulSoup
 from duckduckgo_search import DDGS
-from functools import lru_cache
-import re
 import warnings
 try:
     import urllib3
@@ -16,21 +13,26 @@ except (ImportError, AttributeError):
 warnings.filterwarnings("ignore")
 
 try:
-    from preprocessing.layer1_masking import AggressiveMasker
+    from preprocessing.layer1_masking import AggressiveMasker, parse_url
     from linguistic_features.layer2_normalization import TextNormalizer
     from linguistic_features.layer3_whitelist import WhitelistFilter
+    from linguistic_features.lexicon import LEX_BRAND, Lexicon
 except ImportError:
     pass
 
 logger = logging.getLogger(__name__)
 
 class DomainVerifier:
+    # Label Layer 1 được kiểm tra domain (link Zalo/Telegram không tra DuckDuckGo)
+    URL_LABELS = ('url',)
+
     def __init__(self):
         self.ddgs = DDGS()
         self.masker = AggressiveMasker()
-        self.normalizer = TextNormalizer()
-        self.whitelist = WhitelistFilter()
-        self.known_brands = set(self.whitelist.brand_list)
+        # Lexicon dùng chung giữa normalizer và whitelist: brand = bit LEX_BRAND
+        self.lexicon = Lexicon()
+        self.normalizer = TextNormalizer(lexicon=self.lexicon)
+        self.whitelist = WhitelistFilter(lexicon=self.lexicon)
         
         # --- FIX 1: STATIC WHITELIST (Giải quyết vấn đề đa tên miền) ---
         # Nếu gặp các domain này -> Bỏ qua thuật toán bài báo -> Auto Legit
@@ -52,26 +54,23 @@ class DomainVerifier:
     def _get_registered_domain(self, url):
         """
         FIX 2: Dùng tldextract để lấy gốc chính xác (Chống Ngrok)
+        Dùng chung parser của Layer 1 (memo theo host) cho link trong kết quả search / source code
         """
         try:
-            # Loại bỏ dấu chấm thừa cuối câu
-            url = url.rstrip('.,;:')
-            
-            if not url.startswith(('http://', 'https://')): 
-                url = 'http://' + url
-            
-            ext = tldextract.extract(url)
-            if not ext.suffix: return ""
             # Trả về domain gốc: ngrok-free.app thay vì vietcombank.ngrok...
-            return f"{ext.domain}.{ext.suffix}".lower()
+            return parse_url(url).registered_domain
         except:
             return ""
 
-    def _smart_brand_extraction(self, text):
-        masked_text, _ = self.masker.mask(text)
+    @property
+    def known_brands(self):
+        return self.lexicon.words(LEX_BRAND)
+
+    def _smart_brand_extraction(self, masked_text):
+        # Input là text đã qua Layer 1 (verify() mask 1 lần, dùng chung cho URL và brand)
         norm_res = self.normalizer.normalize(masked_text)
         for token in norm_res.tokens:
-            if token in self.known_brands:
+            if self.lexicon.lookup(token) & LEX_BRAND:
                 return token
         return None
 
@@ -127,27 +126,25 @@ class DomainVerifier:
             return False, f"Connection Failed: {e}"
 
     def verify(self, text):
-        # 1. Lấy tất cả URL (Regex + Masker)
-        regex_urls = re.findall(r'(?:https?://|www\.)[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}(?:/\S*)?', text)
-        regex_urls = [u.rstrip('.,:;') for u in regex_urls]
-        
-        _, metadata = self.masker.mask(text)
-        masked_urls = metadata.get('url', []) + metadata.get('app_link', [])
-        
-        all_urls = list(set(regex_urls + masked_urls))
-        if not all_urls:
+        # 1. Lấy các URL web dạng UrlEntity từ Layer 1:
+        # đã bỏ khoảng trắng, không trùng lặp, registered domain đã parse sẵn.
+        # Chỉ label 'url': link Zalo/Telegram không được kiểm tra domain (giống bản gốc)
+        # 1 lượt Layer 1 cho cả spans (URL) lẫn text đã mask (tìm brand)
+        masked_text, _, spans = self.masker.mask_with_spans(text)
+        url_entities = self.masker.extract_urls(text, labels=self.URL_LABELS, spans=spans)
+        if not url_entities:
             return "SKIP", "No URL", 0.0
 
-        brand_n = self._smart_brand_extraction(text)
+        brand_n = self._smart_brand_extraction(masked_text)
         
         has_whitelist = False
         has_phishing = False
         phishing_reason = ""
         whitelist_reason = ""
 
-        for url in all_urls:
-            clean_url = url.replace(" ", "")
-            domain_d = self._get_registered_domain(clean_url)
+        for entity in url_entities:
+            clean_url = entity.cleaned
+            domain_d = entity.registered_domain
             
             if not domain_d: continue
 
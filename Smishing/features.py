@@ -7,37 +7,75 @@ import numpy as np
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # Import các layer
+from preprocessing.homoglyph import fold_homoglyphs
 from preprocessing.layer1_masking import AggressiveMasker
 from linguistic_features.layer2_normalization import TextNormalizer
 from linguistic_features.layer3_whitelist import WhitelistFilter
 from linguistic_features.layer4_misspell import MisspellExtractor
+from linguistic_features.lexicon import Lexicon
+from linguistic_features.vocabulary import StaleTokenIdsError, Vocabulary
 
 # Cấu hình logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 class SmishingFeatureExtractor:
-    def __init__(self, dict_path=None):
+    # Feature dạng đếm của Layer 2-4: được scale theo tỉ lệ độ dài khi chỉ xử lý cửa sổ đầu+cuối.
+    # Các feature còn lại (oov_density, longest_oov_length) là tỉ lệ / cực đại nên giữ nguyên.
+    WINDOW_SCALED_FEATURES = (
+        'leet_count', 'separator_count', 'teencode_count', 'visual_leet_count', 'symbol_leet_count',
+        'validated_leet_count', 'weighted_leet_score', 'whitelist_count',
+        'oov_count', 'broken_telex_count', 'gibberish_count', 'repeated_char_count', 'run_on_word_count'
+    )
+
+    def __init__(self, dict_path=None, long_message_chars=None, window_chars=None, time_budget_ms=None,
+                 homoglyph_folding=True, homoglyph_feature=False):
         """
         Khởi tạo pipeline và load tài nguyên (từ điển) một lần duy nhất.
+
+        Args:
+            dict_path: File từ điển cho Layer 2/4
+            long_message_chars: Bật chế độ chi phí giới hạn cho tin nhắn dài (None = tắt).
+                Layer 1 vẫn quét toàn bộ tin nhắn (URL, SĐT, STK...) trên text đầy đủ (không cắt đoạn);
+                tin nhắn đã mask dài hơn ngưỡng chỉ đưa cửa sổ đầu+cuối vào Layer 2-4,
+                các feature đếm được scale theo tỉ lệ độ dài.
+            window_chars: Tổng độ dài cửa sổ đầu+cuối (mỗi phần window_chars // 2 ký tự),
+                mặc định min(600, long_message_chars)
+            time_budget_ms: Ngân sách thời gian Layer 1 cho mỗi tin nhắn (bounded-time mode của AggressiveMasker)
+            homoglyph_folding: Tầng 0 - đưa ký tự look-alike (Cyrillic/Greek, fullwidth) về chữ Latin trước Layer 1
+            homoglyph_feature: Thêm homoglyph_count vào cuối vector đặc trưng (model đã train dùng 27 feature,
+                nên mặc định chỉ có trong dict khi return_dict=True)
         """
         logger.info("Initializing Smishing Feature Extractor...")
-        
-        # 1. Init Layer 1
-        self.masker = AggressiveMasker()
+
+        if long_message_chars is not None:
+            if window_chars is None:
+                window_chars = min(600, long_message_chars)
+            if not 2 <= window_chars <= long_message_chars:
+                raise ValueError("window_chars must be between 2 and long_message_chars")
+        self.long_message_chars = long_message_chars
+        self.window_chars = window_chars
+        # Số tin nhắn đã xử lý theo cửa sổ đầu+cuối
+        self.long_message_stats = {'windowed': 0}
+        self.homoglyph_folding = homoglyph_folding
+
+        # 1. Init Layer 1: luôn mask toàn bộ tin nhắn (cắt đoạn có thể làm mất URL/SĐT nằm vắt qua điểm cắt),
+        # chế độ tin nhắn dài chỉ giới hạn cửa sổ đưa vào Layer 2-4
+        self.masker = AggressiveMasker(time_budget_ms=time_budget_ms)
         
         # 2. Init Layer 2 (Sẽ load từ điển ở đây)
-        self.normalizer = TextNormalizer(dict_path=dict_path)
+        # Vocabulary dùng chung: Layer 2 cấp ID cho token, Layer 3/4 làm việc trên mảng ID
+        # Lexicon dùng chung: từ điển (Layer 2 load) + whitelist (Layer 3) trong 1 dict từ -> bitmask category
+        self.vocabulary = Vocabulary()
+        self.lexicon = Lexicon()
+        self.normalizer = TextNormalizer(dict_path=dict_path, vocabulary=self.vocabulary, lexicon=self.lexicon)
         
         # 3. Init Layer 3
-        self.whitelist = WhitelistFilter()
+        self.whitelist = WhitelistFilter(lexicon=self.lexicon)
         
         # 4. Init Layer 4 
-        # TỐI ƯU: Truyền từ điển đã load từ Layer 2 sang Layer 4 để không phải load lại
-        self.misspell = MisspellExtractor(
-            full_dict=self.normalizer.full_dict, 
-            shadow_dict=self.normalizer.shadow_dict
-        )
+        # TỐI ƯU: Dùng chung Lexicon với Layer 2 -> từ điển đã load không phải load lại
+        self.misspell = MisspellExtractor(lexicon=self.lexicon)
         
         # Định nghĩa tên các đặc trưng theo thứ tự cố định để đảm bảo đồng bộ vector
         self.feature_names = [
@@ -59,6 +97,9 @@ class SmishingFeatureExtractor:
             'longest_oov_length', 'gibberish_count', 
             'repeated_char_count', 'run_on_word_count'
         ]
+        if homoglyph_feature:
+            # --- Tầng 0: Homoglyph (1) ---
+            self.feature_names.append('homoglyph_count')
         
         logger.info(f"Initialization Complete. Total features: {len(self.feature_names)}")
 
@@ -71,6 +112,14 @@ class SmishingFeatureExtractor:
             return_dict: Nếu True trả về dict {tên_feature: giá_trị}, False trả về list giá trị.
         """
         if text is None: text = ""
+
+        # ==========================================
+        # BƯỚC 0: Tầng 0 - Homoglyph Folding
+        # ==========================================
+        # "Ѵietcombаnk" (Cyrillic) -> "Vietcombank": để Layer 1-4 thấy đúng chữ Latin
+        homoglyph_count = 0
+        if self.homoglyph_folding:
+            text, homoglyph_count = fold_homoglyphs(text)
         
         # ==========================================
         # BƯỚC 1: Layer 1 - Masking & Entity Extraction
@@ -94,10 +143,16 @@ class SmishingFeatureExtractor:
             'code_count': len(metadata.get('code', []))
         }
 
+        # Tin nhắn dài: Layer 2-4 chỉ xử lý cửa sổ đầu+cuối (chi phí giới hạn), feature đếm được scale lại
+        linguistic_text, scale = masked_text, 1.0
+        if self.long_message_chars is not None and len(masked_text) > self.long_message_chars:
+            linguistic_text, scale = self._head_tail_window(masked_text)
+            self.long_message_stats['windowed'] += 1
+
         # ==========================================
         # BƯỚC 2: Layer 2 - Normalization & Leetspeak
         # ==========================================
-        norm_res = self.normalizer.normalize(masked_text)
+        norm_res = self.normalizer.normalize(linguistic_text)
         
         l2_features = {
             'leet_count': norm_res.leet_count,
@@ -112,8 +167,8 @@ class SmishingFeatureExtractor:
         # ==========================================
         # BƯỚC 3: Layer 3 - Whitelist Filtering
         # ==========================================
-        # Input là tokens từ Layer 2
-        whitelist_res = self.whitelist.filter(norm_res.tokens)
+        # Input là tokens từ Layer 2 (Layer 4 chạy cùng trong _filter_by_ids, xem BƯỚC 4)
+        whitelist_res, misspell_res = self._filter_by_ids(norm_res)
         
         l3_features = {
             'whitelist_count': whitelist_res.whitelist_count
@@ -123,7 +178,6 @@ class SmishingFeatureExtractor:
         # BƯỚC 4: Layer 4 - Misspell Detection
         # ==========================================
         # Input là tokens_to_check từ Layer 3 (đã lọc whitelist)
-        misspell_res = self.misspell.extract(whitelist_res.tokens_to_check)
         
         l4_features = {
             'oov_count': misspell_res.oov_count,
@@ -139,7 +193,11 @@ class SmishingFeatureExtractor:
         # TỔNG HỢP KẾT QUẢ
         # ==========================================
         # Gom tất cả feature vào 1 dict duy nhất
-        all_features = {**l1_features, **l2_features, **l3_features, **l4_features}
+        all_features = {**l1_features, **l2_features, **l3_features, **l4_features,
+                        'homoglyph_count': homoglyph_count}
+        if scale != 1.0:
+            for name in self.WINDOW_SCALED_FEATURES:
+                all_features[name] = round(all_features[name] * scale, 3)
         
         if return_dict:
             return all_features, masked_text, norm_res.normalized_text
@@ -148,6 +206,41 @@ class SmishingFeatureExtractor:
         feature_vector = [all_features[name] for name in self.feature_names]
         return feature_vector
 
+    def _head_tail_window(self, text: str) -> tuple[str, float]:
+        """
+        Cắt cửa sổ đầu+cuối của text đã mask (không cắt ngang từ / token Layer 1).
+        Returns: (cửa sổ, hệ số scale = độ dài text / độ dài cửa sổ)
+        """
+        half = self.window_chars // 2
+        tail_start = len(text) - half
+        head = text[:half]
+        tail = text[tail_start:]
+        # Chỉ bỏ phần từ dở dang khi điểm cắt nằm giữa 1 từ
+        if text[half] != ' ':
+            cut = head.rfind(' ')
+            if cut > 0:
+                head = head[:cut]
+        if text[tail_start - 1] != ' ':
+            cut = tail.find(' ')
+            if cut >= 0:
+                tail = tail[cut + 1:]
+        window = f"{head} {tail}".strip()
+        return window, len(text) / max(len(window), 1)
+
+    def _filter_by_ids(self, norm_res):
+        """
+        Layer 3 + 4 theo ID token của Layer 2.
+        Vocabulary dùng chung (VD: nhiều session Streamlit) có thể reset giữa Layer 2 và Layer 3
+        -> ID cũ bị từ chối (StaleTokenIdsError), intern lại tokens và chạy lại.
+        """
+        token_ids = norm_res.token_ids
+        while True:
+            try:
+                whitelist_res = self.whitelist.filter_ids(token_ids, self.vocabulary)
+                return whitelist_res, self.misspell.extract_ids(whitelist_res.ids_to_check, self.vocabulary)
+            except StaleTokenIdsError:
+                token_ids = self.vocabulary.intern_all(norm_res.tokens)
+
     def get_feature_names(self):
         """Trả về danh sách tên cột cho DataFrame"""
         return self.feature_names
@@ -1,9 +1,8 @@
 import re
-import unicodedata
-import random
-import string
 import os
 import sys
+import threading
+from collections import OrderedDict
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Tuple, Dict, Set
@@ -16,7 +15,9 @@ if parent_dir not in sys.path:
     sys.path.append(parent_dir)
 
 # Import tuyệt đối
-from dicts.dict import load_both_dicts, remove_vietnamese_diacritics
+from dicts.dict import load_both_dicts, remove_vietnamese_diacritics, to_nfc
+from linguistic_features.lexicon import LEX_FULL, LEX_SHADOW, Lexicon
+from linguistic_features.vocabulary import TokenIds, Vocabulary
 
 @dataclass
 class NormalizationResult:
@@ -31,16 +32,29 @@ class NormalizationResult:
     symbol_leet_count: int = 0  # @->a, $->s, !->i (ký tự đặc biệt)
     validated_leet_count: int = 0  # Số leet đã validate bằng từ điển
     weighted_leet_score: float = 0.0  # Tổng điểm có trọng số
+    token_ids: TokenIds = None  # ID của tokens trong Vocabulary (chỉ có khi TextNormalizer có vocabulary)
+
+
+SEPARATOR_CHARS = "'-~:;,.\"*^{}[]()/|\\!"
+WORD_REGEX = r'\b[a-zA-Zàáảãạăằắẳẵặâầấẩẫậèéẻẽẹêềếểễệìíỉĩịòóỏõọôồốổỗộơờớởỡợùúủũụưừứửữựỳýỷỹỵđ]+\b'
 
 
 class TextNormalizer:
-    def __init__(self, dict_path: str = None):
+    def __init__(self, dict_path: str = None, token_cache_size: int = 16384, vocabulary: Vocabulary = None,
+                 lexicon: Lexicon = None):
         """
         Khởi tạo TextNormalizer với dictionary validation
         
         Args:
             dict_path: Đường dẫn đến file từ điển (mặc định: sử dụng shadow_dict.py)
+            token_cache_size: Số token (cụm không khoảng trắng) tối đa giữ trong LRU memo (0 = tắt,
+                chạy pipeline regex trên cả tin nhắn)
+            vocabulary: Vocabulary dùng chung với Layer 3/4; nếu có, kết quả kèm token_ids
+            lexicon: Lexicon dùng chung với Layer 3/4 (từ điển được load vào bit LEX_FULL / LEX_SHADOW)
         """
+        if token_cache_size < 0:
+            raise ValueError("token_cache_size must be >= 0")
+
         # 1. Leet Map: CHỈ GIỮ KÝ TỰ ĐẶC BIỆT (Symbol Leet)
         self.leet_map_chars = str.maketrans({
             '@': 'a', '$': 's', '+': 't', 
@@ -88,8 +102,13 @@ class TextNormalizer:
             for pattern, replacement, _ in self.teencode_patterns + self.visual_leet_patterns + self.symbol_leet_patterns
         ]
 
+        # Fused scanner: gộp toàn bộ leet patterns thành 1 regex, decode + đếm trong 1 lượt quét
+        self._leet_scanner, self._leet_rules = self._compile_leet_scanner()
+
         # 3. Separator Pattern
-        self.separator_pattern = re.compile(r"['\-~:;,\.\"\*\^\{\}\[\]\(\)\/\|\\!]")
+        self.separator_pattern = re.compile('[' + re.escape(SEPARATOR_CHARS) + ']')
+        # Bảng str.translate: separator -> khoảng trắng (1 lượt C, không cần regex)
+        self._separator_table = str.maketrans(dict.fromkeys(SEPARATOR_CHARS, ' '))
 
         # 4. Token Pattern
         self.token_pattern = re.compile(
@@ -98,17 +117,42 @@ class TextNormalizer:
             re.IGNORECASE | re.UNICODE
         )
         
-        # 5. Layer 1 Tag regex
-        self.layer1_tag_regex = re.compile(r'<[A-Z_]+>')
+        # 5. Layer 1 Tag regex (group bắt để re.split giữ lại tag: [text, tag, text, ...])
+        self.layer1_tag_regex = re.compile(r'(<[A-Z_]+>)')
 
-        # 6. Placeholder prefix
-        self._placeholder_prefix = ''.join(random.choices(string.ascii_uppercase, k=12))
-        
-        # 7. Load từ điển từ shadow_dict.py
+        # 6. Memo theo token: kh0ng, t1en, vui... lặp lại qua hàng triệu tin nhắn -> decode + validate 1 lần
+        self.token_cache_size = token_cache_size
+        self._token_cache = OrderedDict()
+        self._token_cache_lock = threading.Lock()
+        self.token_cache_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self.vocabulary = vocabulary
+
+        # 7. Load từ điển từ shadow_dict.py vào Lexicon (sửa Lexicon -> version mới -> memo token bị xóa)
+        self.lexicon = lexicon if lexicon is not None else Lexicon()
+        self._token_cache_version = self.lexicon.version
         self.full_dict: Set[str] = set()  # Từ điển có dấu
         self.shadow_dict: Set[str] = set()  # Từ điển không dấu
         self._load_dictionary(dict_path)
 
+    @property
+    def full_dict(self) -> Set[str]:
+        return self.lexicon.words(LEX_FULL)
+
+    @full_dict.setter
+    def full_dict(self, value: Set[str]):
+        # Kết quả validate trong memo token phụ thuộc từ điển
+        self.lexicon.set_words(LEX_FULL, value)
+        self.clear_token_cache()
+
+    @property
+    def shadow_dict(self) -> Set[str]:
+        return self.lexicon.words(LEX_SHADOW)
+
+    @shadow_dict.setter
+    def shadow_dict(self, value: Set[str]):
+        self.lexicon.set_words(LEX_SHADOW, value)
+        self.clear_token_cache()
+
     def _remove_vietnamese_accents(self, text: str) -> str:
         """
         Loại bỏ dấu tiếng Việt, giữ lại chữ cái Latin gốc
@@ -159,50 +203,98 @@ class TextNormalizer:
         
         word_lower = word.lower().strip()
         
-        # Check 1: Full dict (có dấu)
-        if word_lower in self.full_dict:
+        # Check 1: Full dict (có dấu) - 1 lần tra Lexicon trả về cả bit full lẫn shadow
+        categories = self.lexicon.masks.get(word_lower, 0)
+        if categories & LEX_FULL:
             return True
         
-        # Check 2: Shadow dict (không dấu)
+        # Check 2: Shadow dict (không dấu), chỉ tra lại khi bỏ dấu làm đổi từ
         no_accent = remove_vietnamese_diacritics(word_lower)
-        if no_accent in self.shadow_dict:
-            return True
-        
-        return False
+        if no_accent != word_lower:
+            categories = self.lexicon.masks.get(no_accent, 0)
+        return bool(categories & LEX_SHADOW)
 
     def _normalize_unicode(self, text: str) -> str:
-        return unicodedata.normalize('NFC', text)
+        return to_nfc(text)
 
-    def _clean_separators_safe(self, text: str) -> tuple[str, int]:
-        """Tách separator nhưng BẢO VỆ các token Layer 1"""
-        tags = []
-        prefix = self._placeholder_prefix
-        
-        def store_tag(match):
-            tags.append(match.group(0))
-            idx_letter = chr(ord('A') + len(tags) - 1)
-            return f"SEPTAG{prefix}IDX{idx_letter}END"
-
-        safe_text = self.layer1_tag_regex.sub(store_tag, text)
-        cleaned_text = self.separator_pattern.sub(' ', safe_text)
-        count = len(self.separator_pattern.findall(safe_text))
-        
-        def restore_tag(match):
-            idx_letter = match.group(1)
-            idx = ord(idx_letter.upper()) - ord('A')
-            return tags[idx]
-            
-        final_text = re.sub(rf'SEPTAG{prefix}IDX([A-Z])END', restore_tag, cleaned_text, flags=re.IGNORECASE)
-        final_text = re.sub(r'\s+', ' ', final_text).strip()
-        
-        return final_text, count
+    def _split_tag_segments(self, text: str) -> list[str]:
+        """
+        Tách text 1 lần thành các đoạn xen kẽ: index chẵn là text thường, index lẻ là tag Layer 1
+        "Truy cap <URL> ngay" → ["Truy cap ", "<URL>", " ngay"]
+        """
+        return self.layer1_tag_regex.split(text)
 
-    def _decode_leetspeak_safe(self, text: str) -> Tuple[str, Dict[str, any]]:
+    def _clean_and_tokenize(self, segments: list[str]) -> Tuple[list[str], str, int]:
+        """
+        Tách separator + tokenize trong 1 lượt, giữ nguyên các tag Layer 1 (index lẻ)
+        Separator -> khoảng trắng bằng str.translate, số separator = số khoảng trắng tăng thêm
+
+        Returns:
+            (tokens, normalized_text, separator_count)
+        """
+        tokens = []
+        separator_count = 0
+        for i, segment in enumerate(segments):
+            if i % 2:
+                tokens.append(segment)
+                continue
+            if not segment:
+                continue
+            cleaned = segment.translate(self._separator_table)
+            separator_count += cleaned.count(' ') - segment.count(' ')
+            tokens.extend(tag or word.lower() for tag, word in self.token_pattern.findall(cleaned))
+
+        return tokens, ' '.join(tokens), separator_count
+
+    def _compile_leet_scanner(self) -> Tuple[re.Pattern, Dict[str, tuple]]:
+        """
+        Gộp teencode / visual leet / symbol leet patterns thành 1 regex alternation
+
+        Mỗi pattern được bọc trong named group `r{i}` (group con được đánh số lại trong replacement).
+        Các pattern bắt đầu ở những vị trí rời nhau (word boundary không đổi khi số -> chữ),
+        nên quét 1 lượt cho cùng kết quả với chạy tuần tự từng pattern. Ngoại lệ duy nhất là
+        symbol leet: '!' đứng cạnh số 0 sẽ được visual leet decode thành chữ trước
+        (ba0!ng -> bao!ng -> baoing, d!0ng -> d!ong -> diong) -> lookaround của '!' chấp nhận
+        thêm '0' và callback kiểm tra lại.
+
+        Returns:
+            (scanner, rules) với rules[group_name] = (stat_key, weight, replacement, is_template, check_left_zero)
+        """
+        vn_letters = 'a-zA-Zàáảãạăằắẳẵặâầấẩẫậèéẻẽẹêềếểễệìíỉĩịòóỏõọôồốổỗộơờớởỡợùúủũụưừứửữựỳýỷỹỵđ'
+        # '!' giữa 2 chữ, hoặc giữa chữ và số 0 sẽ được decode (cuối từ: ba0 / đầu từ: 0k, 0ng)
+        symbol_bridge = {
+            rf'(?<=[{vn_letters}])!(?=[{vn_letters}])':
+                rf'(?<=[{vn_letters}0])!(?=[{vn_letters}]|0(?:k|[a-zA-Z]{{2,}})\b)',
+        }
+
+        tracked = (
+            [('teencode_count', rule) for rule in self.teencode_patterns]
+            + [('visual_leet_count', rule) for rule in self.visual_leet_patterns]
+            + [('symbol_leet_count', rule) for rule in self.symbol_leet_patterns]
+        )
+        alternatives, rules = [], {}
+        group_index = 0
+        for i, (stat_key, (pattern, replacement, weight)) in enumerate(tracked):
+            name = f'r{i}'
+            check_left_zero = pattern in symbol_bridge
+            if check_left_zero:
+                pattern = symbol_bridge[pattern]
+            # \1 trong replacement -> số thứ tự group tương ứng trong regex gộp
+            offset = group_index + 1
+            template = re.sub(r'\\(\d+)', lambda m: rf'\g<{int(m.group(1)) + offset}>', replacement)
+            rules[name] = (stat_key, weight, template, template != replacement, check_left_zero)
+            alternatives.append(f'(?P<{name}>{pattern})')
+            group_index += 1 + re.compile(pattern).groups
+
+        return re.compile('|'.join(alternatives), re.IGNORECASE), rules
+
+    def _decode_leetspeak_safe(self, segments: list[str]) -> Tuple[list[str], Dict[str, any]]:
         """
         Decode leetspeak với tracking chi tiết theo từng loại và validation
+        Chỉ decode các đoạn text thường (index chẵn), tag Layer 1 giữ nguyên và đóng vai trò ranh giới từ
         
         Returns:
-            (decoded_text, stats_dict) với stats_dict chứa:
+            (decoded_segments, stats_dict) với stats_dict chứa:
             - leet_count: tổng số leet chars
             - teencode_count: số teencode patterns
             - visual_leet_count: số visual leet patterns
@@ -210,16 +302,6 @@ class TextNormalizer:
             - validated_leet_count: số leet đã validate bằng từ điển
             - weighted_leet_score: tổng điểm có trọng số
         """
-        tags = []
-        prefix = self._placeholder_prefix
-        
-        def store_tag(match):
-            tags.append(match.group(0))
-            idx_letter = chr(ord('A') + len(tags) - 1)
-            return f"LEETTAG{prefix}IDX{idx_letter}END"
-        
-        safe_text = self.layer1_tag_regex.sub(store_tag, text)
-        
         # Khởi tạo stats
         stats = {
             'leet_count': 0,
@@ -230,84 +312,81 @@ class TextNormalizer:
             'weighted_leet_score': 0.0,
             'leet_words': []  # Lưu các từ có leet để validate sau
         }
-        
-        # Đếm leet chars (character-level)
-        leet_chars = set('013456789!@$')
-        for char in safe_text:
-            if char in leet_chars:
-                stats['leet_count'] += 1
-                # Áp dụng trọng số cho character-level leet
-                if char in self.leet_char_weights:
-                    stats['weighted_leet_score'] += self.leet_char_weights[char]
-                    if char in ['@', '$', '+']:
-                        stats['symbol_leet_count'] += 1
-        
-        # Decode character-level (symbol leet)
-        text_decoded = safe_text.translate(self.leet_map_chars)
-        
-        # Track các từ trước và sau decode để validate
-        original_words = set(re.findall(r'\b[a-zA-Zàáảãạăằắẳẵặâầấẩẫậèéẻẽẹêềếểễệìíỉĩịòóỏõọôồốổỗộơờớởỡợùúủũụưừứửữựỳýỷỹỵđ]+\b', safe_text, re.IGNORECASE))
-        
-        # Apply patterns với tracking
-        # Teencode patterns
-        for pattern, replacement, weight in self.teencode_patterns:
-            matches = re.findall(pattern, text_decoded, re.IGNORECASE)
-            if matches:
-                stats['teencode_count'] += len(matches) if isinstance(matches, list) else 1
-                stats['weighted_leet_score'] += weight * (len(matches) if isinstance(matches, list) else 1)
-            text_decoded = re.sub(pattern, replacement, text_decoded, flags=re.IGNORECASE)
-        
-        # Visual leet patterns
-        for pattern, replacement, weight in self.visual_leet_patterns:
-            matches = re.findall(pattern, text_decoded, re.IGNORECASE)
-            if matches:
-                count = len(matches) if isinstance(matches, list) else 1
-                stats['visual_leet_count'] += count
-                stats['weighted_leet_score'] += weight * count
-            text_decoded = re.sub(pattern, replacement, text_decoded, flags=re.IGNORECASE)
-        
-        # Symbol leet patterns
-        for pattern, replacement, weight in self.symbol_leet_patterns:
-            matches = re.findall(pattern, text_decoded, re.IGNORECASE)
-            if matches:
-                count = len(matches) if isinstance(matches, list) else 1
-                stats['symbol_leet_count'] += count
-                stats['weighted_leet_score'] += weight * count
-            text_decoded = re.sub(pattern, replacement, text_decoded, flags=re.IGNORECASE)
-        
-        # Restore tags
-        def restore_tag(match):
-            idx_letter = match.group(1)
-            idx = ord(idx_letter.upper()) - ord('A')
-            return tags[idx]
-        
-        final_text = re.sub(rf'LEETTAG{prefix}IDX([A-Z])END', restore_tag, text_decoded, flags=re.IGNORECASE)
-        
-        # Validate các từ sau khi decode bằng từ điển
-        decoded_words = re.findall(r'\b[a-zA-Zàáảãạăằắẳẵặâầấẩẫậèéẻẽẹêềếểễệìíỉĩịòóỏõọôồốổỗộơờớởỡợùúủũụưừứửữựỳýỷỹỵđ]+\b', final_text, re.IGNORECASE)
+        rule_counts = dict.fromkeys(self._leet_rules, 0)
+        decoded, (leet_chars, at_count, dollar_count), original_words = self._scan_leet_segments(segments, rule_counts)
+        self._accumulate_leet_stats(stats, leet_chars, at_count, dollar_count, rule_counts)
+        
+        # Validate các từ sau khi decode bằng từ điển (trên text đã ghép lại, gồm cả tên tag như <URL>)
+        # Tập lowercase dựng 1 lần -> mỗi từ chỉ tra set O(1), tổng thời gian tuyến tính theo độ dài text
+        original_lower = {w.lower() for w in original_words}
+        decoded_words = re.findall(WORD_REGEX, ''.join(decoded), re.IGNORECASE)
         for word in decoded_words:
-            if self._validate_word_in_dict(word):
-                # Tìm xem từ này có phải là kết quả của leet decode không
-                # (so sánh với original_words để xác định)
-                word_lower = word.lower()
-                # Nếu từ này không có trong original (hoặc khác) → có thể là leet decode
-                if word_lower not in [w.lower() for w in original_words]:
-                    stats['validated_leet_count'] += 1
+            # Nếu từ này không có trong original (hoặc khác) → có thể là leet decode, validate bằng từ điển
+            if word.lower() not in original_lower and self._validate_word_in_dict(word):
+                stats['validated_leet_count'] += 1
         
-        return final_text, stats
+        return decoded, stats
 
-    def _tokenize(self, text: str) -> list[str]:
-        tokens = []
-        for match in self.token_pattern.finditer(text):
-            tag_group = match.group(1)
-            word_group = match.group(2)
+    def _scan_leet_segments(self, segments: list[str], rule_counts: Dict[str, int]) -> Tuple[list[str], Tuple[int, int, int], Set[str]]:
+        """
+        Decode các đoạn text thường (index chẵn), cộng số match vào rule_counts
+
+        Returns:
+            (decoded_segments, (leet_chars, at_count, dollar_count), original_words)
+        """
+        original_words = set()
+        leet_chars = at_count = dollar_count = 0
+        decoded = list(segments)
+        
+        for i in range(0, len(decoded), 2):
+            segment = decoded[i]
+            if not segment:
+                continue
             
-            if tag_group:
-                tokens.append(tag_group)
-            elif word_group:
-                tokens.append(word_group.lower())
-                
-        return tokens
+            # Đếm leet chars (character-level): str.count chạy trong C, '@'/'$' mất sau translate nên đếm trước
+            at_count += segment.count('@')
+            dollar_count += segment.count('$')
+            leet_chars += sum(map(segment.count, '013456789!@$'))
+            
+            # Track các từ trước và sau decode để validate
+            original_words.update(re.findall(WORD_REGEX, segment, re.IGNORECASE))
+            
+            # Decode character-level (symbol leet), rồi apply patterns trong 1 lượt quét
+            decoded[i] = self._decode_leet_segment(segment.translate(self.leet_map_chars), rule_counts)
+        
+        return decoded, (leet_chars, at_count, dollar_count), original_words
+
+    def _accumulate_leet_stats(self, stats: Dict[str, any], leet_chars: int, at_count: int, dollar_count: int,
+                               rule_counts: Dict[str, int]):
+        """Cộng dồn stats: ký tự leet trước, rồi theo đúng thứ tự pattern (teencode -> visual -> symbol)"""
+        stats['leet_count'] += leet_chars
+        stats['symbol_leet_count'] += at_count + dollar_count
+        stats['weighted_leet_score'] += self.leet_char_weights['@'] * at_count
+        stats['weighted_leet_score'] += self.leet_char_weights['$'] * dollar_count
+        for name, count in rule_counts.items():
+            if count:
+                stat_key, weight = self._leet_rules[name][:2]
+                stats[stat_key] += count
+                stats['weighted_leet_score'] += weight * count
+
+    def _decode_leet_segment(self, segment: str, rule_counts: Dict[str, int]) -> str:
+        """Apply fused leet scanner lên 1 đoạn text: callback vừa thay thế vừa đếm theo từng pattern"""
+        rules = self._leet_rules
+        decoded_zero_end = -1  # vị trí ngay sau số 0 vừa được decode (ba0 -> bao)
+        
+        def decode(match):
+            nonlocal decoded_zero_end
+            name = match.lastgroup
+            _, _, replacement, is_template, check_left_zero = rules[name]
+            start = match.start()
+            if check_left_zero and segment[start - 1] == '0' and decoded_zero_end != start:
+                return match.group(0)
+            if match.group(0)[-1] == '0':
+                decoded_zero_end = match.end()
+            rule_counts[name] += 1
+            return match.expand(replacement) if is_template else replacement
+        
+        return self._leet_scanner.sub(decode, segment)
 
     def normalize(self, text: str) -> NormalizationResult:
         if not text:
@@ -316,15 +395,19 @@ class TextNormalizer:
                 normalized_text="", 
                 original_text="", 
                 leet_count=0, 
-                separator_count=0
+                separator_count=0,
+                token_ids=TokenIds(generation=self.vocabulary.generation) if self.vocabulary is not None else None
             )
 
         original = text
         text = self._normalize_unicode(text)
-        text, leet_stats = self._decode_leetspeak_safe(text)
-        text, sep_count = self._clean_separators_safe(text)
-        tokens = self._tokenize(text)
-        normalized_text = ' '.join(tokens)
+        if self.token_cache_size:
+            tokens, leet_stats, sep_count = self._normalize_by_token(text)
+            normalized_text = ' '.join(tokens)
+        else:
+            segments = self._split_tag_segments(text)
+            segments, leet_stats = self._decode_leetspeak_safe(segments)
+            tokens, normalized_text, sep_count = self._clean_and_tokenize(segments)
         
         return NormalizationResult(
             tokens=tokens,
@@ -336,9 +419,128 @@ class TextNormalizer:
             visual_leet_count=leet_stats['visual_leet_count'],
             symbol_leet_count=leet_stats['symbol_leet_count'],
             validated_leet_count=leet_stats['validated_leet_count'],
-            weighted_leet_score=leet_stats['weighted_leet_score']
+            weighted_leet_score=leet_stats['weighted_leet_score'],
+            token_ids=self.vocabulary.intern_all(tokens) if self.vocabulary is not None else None
         )
 
+    def _normalize_by_token(self, text: str) -> Tuple[list[str], Dict[str, any], int]:
+        """
+        Ghép kết quả tin nhắn từ memo theo token (cụm không khoảng trắng)
+
+        Mọi pattern leet / separator / token đều dừng ở khoảng trắng (ký tự non-word, không phải chữ),
+        nên xử lý từng cụm riêng cho cùng kết quả với pipeline regex trên cả tin nhắn. Riêng
+        validated_leet_count phụ thuộc các từ gốc của cả tin nhắn -> memo lưu các từ đã decode
+        có trong từ điển, lọc lại theo tập từ gốc khi ghép.
+
+        Returns:
+            (tokens, leet_stats, separator_count)
+        """
+        chunks = text.split()
+        entries = [None] * len(chunks)
+        missing = {}  # token chưa có trong memo -> các vị trí trong tin nhắn (lặp lại trong tin tính là hit)
+        with self._token_cache_lock:
+            # Lexicon dùng chung bị sửa từ layer khác -> kết quả validate trong memo đã cũ
+            lexicon_version = self.lexicon.version
+            if self._token_cache_version != lexicon_version:
+                self._token_cache.clear()
+                self._token_cache_version = lexicon_version
+            for i, chunk in enumerate(chunks):
+                entry = self._token_cache.get(chunk)
+                if entry is not None:
+                    self._token_cache.move_to_end(chunk)
+                    self.token_cache_stats['hits'] += 1
+                    entries[i] = entry
+                elif chunk in missing:
+                    self.token_cache_stats['hits'] += 1
+                    missing[chunk].append(i)
+                else:
+                    self.token_cache_stats['misses'] += 1
+                    missing[chunk] = [i]
+
+        if missing:
+            computed = {}
+            for chunk, positions in missing.items():
+                computed[chunk] = entry = self._normalize_token(chunk)
+                for i in positions:
+                    entries[i] = entry
+            with self._token_cache_lock:
+                # Lexicon đổi trong lúc tính -> không lưu kết quả theo nội dung cũ
+                if self._token_cache_version != self.lexicon.version:
+                    computed = {}
+                for chunk, entry in computed.items():
+                    self._token_cache[chunk] = entry
+                    self._token_cache.move_to_end(chunk)
+                while len(self._token_cache) > self.token_cache_size:
+                    self._token_cache.popitem(last=False)
+                    self.token_cache_stats['evictions'] += 1
+
+        tokens = []
+        original_lower = set()
+        rule_counts = dict.fromkeys(self._leet_rules, 0)
+        leet_chars = at_count = dollar_count = sep_count = 0
+        for chunk_tokens, counts, chunk_original, _ in entries:
+            tokens.extend(chunk_tokens)
+            original_lower.update(chunk_original)
+            if counts is not None:
+                chunk_leet, chunk_at, chunk_dollar, chunk_sep, chunk_rules = counts
+                leet_chars += chunk_leet
+                at_count += chunk_at
+                dollar_count += chunk_dollar
+                sep_count += chunk_sep
+                for name, count in chunk_rules:
+                    rule_counts[name] += count
+
+        stats = {
+            'leet_count': 0,
+            'teencode_count': 0,
+            'visual_leet_count': 0,
+            'symbol_leet_count': 0,
+            'validated_leet_count': 0,
+            'weighted_leet_score': 0.0,
+        }
+        self._accumulate_leet_stats(stats, leet_chars, at_count, dollar_count, rule_counts)
+        stats['validated_leet_count'] = sum(
+            1 for *_, validated in entries for word in validated if word not in original_lower
+        )
+        return tokens, stats, sep_count
+
+    def _normalize_token(self, chunk: str) -> tuple:
+        """
+        Chạy pipeline regex trên 1 cụm không khoảng trắng, trả về entry cho memo:
+            (tokens, counts hoặc None nếu không có leet/separator, từ gốc lowercase, từ decode có trong từ điển)
+        với counts = (leet_chars, at_count, dollar_count, separator_count, ((rule, count), ...))
+        """
+        rule_counts = dict.fromkeys(self._leet_rules, 0)
+        segments = self._split_tag_segments(chunk)
+        decoded, (leet_chars, at_count, dollar_count), original_words = self._scan_leet_segments(segments, rule_counts)
+        tokens, _, sep_count = self._clean_and_tokenize(decoded)
+        tokens = tuple(tokens)
+
+        rules = tuple((name, count) for name, count in rule_counts.items() if count)
+        counts = None
+        if leet_chars or sep_count or rules:
+            counts = (leet_chars, at_count, dollar_count, sep_count, rules)
+        validated = tuple(
+            word.lower() for word in re.findall(WORD_REGEX, ''.join(decoded), re.IGNORECASE)
+            if self._validate_word_in_dict(word)
+        )
+        return tokens, counts, frozenset(w.lower() for w in original_words), validated
+
+    def get_token_cache_stats(self) -> dict:
+        """Thống kê memo token: hits, misses, evictions, size, capacity, hit_rate"""
+        with self._token_cache_lock:
+            stats = dict(self.token_cache_stats)
+            stats['size'] = len(self._token_cache)
+        stats['capacity'] = self.token_cache_size
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+    def clear_token_cache(self):
+        """Xóa toàn bộ memo token (giữ nguyên thống kê)"""
+        with self._token_cache_lock:
+            self._token_cache.clear()
+
 
 # --- TEST ---
 if __name__ == "__main__":
@@ -1,5 +1,17 @@
+import os
+import sys
 from dataclasses import dataclass
 
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+# Import tuyệt đối
+from linguistic_features.lexicon import (LEX_BRAND, LEX_CUSTOM, LEX_ENTITY, LEX_JARGON, LEX_SLANG,
+                                         LEX_WHITELIST, Lexicon)
+from linguistic_features.vocabulary import IdBitmap, TokenIds
+
 @dataclass
 class WhitelistResult:
     """Kết quả filter whitelist - tương tự NormalizationResult của Layer 2"""
@@ -7,6 +19,10 @@ class WhitelistResult:
     whitelisted_tokens: list[str]   # Tokens đã bị lọc (không cần check)
     whitelist_count: int = 0        # Feature: số tokens trong whitelist
     original_tokens: list[str] = None  # Tokens gốc từ input
+    ids_to_check: TokenIds = None   # ID (Vocabulary) của tokens_to_check, chỉ có khi dùng filter_ids()
+
+# Trạng thái theo ID trong bitmap: chưa tính / cần check / whitelist
+_ID_UNKNOWN, _ID_CHECK, _ID_WHITELISTED = 0, 1, 2
 
 
 class WhitelistFilter:
@@ -15,31 +31,49 @@ class WhitelistFilter:
     Lọc bỏ các token hợp lệ không cần kiểm tra chính tả
     """
     
-    def __init__(self, custom_whitelist_path=None):
+    def __init__(self, custom_whitelist_path=None, lexicon: Lexicon = None):
         # Khởi tạo các danh sách whitelist theo category
         self.brand_list = self._build_brand_list()
         self.jargon_list = self._build_jargon_list()
         self.slang_abbr_list = self._build_slang_abbr_list()
         self.entity_tokens = self._build_entity_tokens()
         
-        # Gộp tất cả thành một set để tra cứu O(1)
-        self.whitelist = set()
-        self.whitelist.update(self.brand_list)
-        self.whitelist.update(self.jargon_list)
-        self.whitelist.update(self.slang_abbr_list)
-        self.whitelist.update(self.entity_tokens)
+        # Đăng ký từng category vào Lexicon (dùng chung với Layer 2/4 nếu được truyền vào):
+        # 1 lần tra hash trả về bitmask, whitelist = có bit bất kỳ trong LEX_WHITELIST
+        self.lexicon = lexicon if lexicon is not None else Lexicon()
+        self.lexicon.add(self.brand_list, LEX_BRAND)
+        self.lexicon.add(self.jargon_list, LEX_JARGON)
+        self.lexicon.add(self.slang_abbr_list, LEX_SLANG)
+        self.lexicon.add(self.entity_tokens, LEX_ENTITY)
         
         # Load custom whitelist nếu có
         if custom_whitelist_path:
             self._load_custom_whitelist(custom_whitelist_path)
 
+        # Bitmap kết quả is_whitelisted() theo ID của Vocabulary (tính 1 lần cho mỗi token)
+        self._id_bitmap = IdBitmap()
+
+        # (Lexicon.version, frozenset) của property whitelist, chỉ gộp lại khi Lexicon đổi
+        self._whitelist_cache = (None, frozenset())
+
+    @property
+    def whitelist(self) -> frozenset:
+        """Toàn bộ từ whitelist (gộp các category, chỉ đọc, cache theo Lexicon.version)"""
+        version = self.lexicon.version
+        cached_version, words = self._whitelist_cache
+        if cached_version != version:
+            words = frozenset(word for category in (LEX_BRAND, LEX_JARGON, LEX_SLANG, LEX_ENTITY, LEX_CUSTOM)
+                              for word in self.lexicon.words(category))
+            self._whitelist_cache = (version, words)
+        return words
+
     # ... các method _build_*() và filter()
     def is_whitelisted(self, token: str) -> bool:
         token_lower = token.lower().strip()
         
-        # Check 1: Có trong whitelist set không? (O(1) lookup)
+        # Check 1: Có trong whitelist không? (1 lần tra Lexicon)
         # VD: "vcb", "otp", "sim" → True
-        if token_lower in self.whitelist:
+        if self.lexicon.masks.get(token_lower, 0) & LEX_WHITELIST:
             return True
         
         # Check 2: Là số thuần túy không?
@@ -180,11 +214,9 @@ class WhitelistFilter:
         """Load whitelist tùy chỉnh từ file"""
         try:
             with open(path, 'r', encoding='utf-8') as f:
-                for line in f:
-                    word = line.strip().lower()
-                    # Bỏ qua dòng trống và comment
-                    if word and not word.startswith('#'):
-                        self.whitelist.add(word)
+                words = [line.strip().lower() for line in f]
+            # Bỏ qua dòng trống và comment
+            self.lexicon.add((word for word in words if word and not word.startswith('#')), LEX_CUSTOM)
             print(f"✓ Custom whitelist loaded from: {path}")
         except FileNotFoundError:
             print(f"⚠ Warning: Custom whitelist not found: {path}")
@@ -223,6 +255,55 @@ class WhitelistFilter:
             original_tokens=list(tokens)  # Copy để tránh mutation
         )
 
+    def filter_ids(self, token_ids, vocabulary) -> WhitelistResult:
+        """
+        Giống filter() nhưng nhận mảng ID từ Vocabulary (NormalizationResult.token_ids)
+        Kết quả is_whitelisted() được lưu trong bitmap theo ID -> mỗi token chỉ xử lý chuỗi 1 lần.
+
+        Args:
+            token_ids: Mảng ID token từ Layer 2
+            vocabulary: Vocabulary đã cấp các ID
+
+        Returns:
+            WhitelistResult, có thêm ids_to_check để đưa thẳng vào Layer 4 (extract_ids)
+        """
+        if not token_ids:
+            return WhitelistResult(
+                tokens_to_check=[],
+                whitelisted_tokens=[],
+                whitelist_count=0,
+                original_tokens=[],
+                ids_to_check=TokenIds()
+            )
+
+        table = vocabulary.table(token_ids)  # StaleTokenIdsError nếu Vocabulary đã reset sau Layer 2
+        states = self._id_bitmap.for_table(table, self.lexicon.version)
+        tokens = table.tokens
+        ids_to_check = TokenIds(generation=table.generation)
+        whitelisted_tokens = []
+
+        for token_id in token_ids:
+            state = states[token_id]
+            if state == _ID_UNKNOWN:
+                state = _ID_WHITELISTED if self.is_whitelisted(tokens[token_id]) else _ID_CHECK
+                states[token_id] = state
+            if state == _ID_WHITELISTED:
+                whitelisted_tokens.append(tokens[token_id])
+            else:
+                ids_to_check.append(token_id)
+
+        return WhitelistResult(
+            tokens_to_check=vocabulary.lookup(ids_to_check),
+            whitelisted_tokens=whitelisted_tokens,
+            whitelist_count=len(whitelisted_tokens),
+            original_tokens=vocabulary.lookup(token_ids),
+            ids_to_check=ids_to_check
+        )
+
+    def clear_id_cache(self):
+        """Xóa bitmap theo ID (sửa Lexicon đã tự làm mới bitmap)"""
+        self._id_bitmap.clear()
+
 # --- TEST ---
 if __name__ == "__main__":
     whitelist_filter = WhitelistFilter()
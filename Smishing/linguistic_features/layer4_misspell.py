@@ -13,6 +13,8 @@ if parent_dir not in sys.path:
 
 # Import tuyệt đối
 from dicts.dict import remove_vietnamese_diacritics
+from linguistic_features.lexicon import LEX_FULL, LEX_SHADOW, Lexicon
+from linguistic_features.vocabulary import IdBitmap
 try:
     from ..dicts.dict import remove_vietnamese_diacritics
 except ImportError:
@@ -34,15 +36,28 @@ class MisspellResult:
     # --------------------
     oov_tokens: List[str] = field(default_factory=list)
 
+# Cờ phân loại 1 token (lưu trong bitmap theo ID, _COMPUTED = đã tính)
+_CHECKED = 1        # Token được đếm vào mẫu số oov_density
+_OOV = 2
+_GIBBERISH = 4
+_REPEATED = 8
+_BROKEN_TELEX = 16
+_RUN_ON = 32        # isalpha() và dính từ
+_COMPUTED = 128
+
 class MisspellExtractor:
-    def __init__(self, full_dict: Optional[Set[str]] = None, shadow_dict: Optional[Set[str]] = None, dict_path: Optional[str] = None):
-        if full_dict is None or shadow_dict is None:
-             self.full_dict = set() # Placeholder
-             self.shadow_dict = set() # Placeholder
-        else:
+    def __init__(self, full_dict: Optional[Set[str]] = None, shadow_dict: Optional[Set[str]] = None, dict_path: Optional[str] = None,
+                 lexicon: Optional[Lexicon] = None):
+        # Từ điển nằm trong Lexicon (bit LEX_FULL / LEX_SHADOW): truyền lexicon của Layer 2 để dùng chung,
+        # khi đó không cần truyền full_dict / shadow_dict
+        self.lexicon = lexicon if lexicon is not None else Lexicon()
+        if full_dict is not None and shadow_dict is not None:
             self.full_dict = full_dict
             self.shadow_dict = shadow_dict
 
+        # Bitmap cờ phân loại theo ID của Vocabulary (dùng bởi extract_ids)
+        self._id_bitmap = IdBitmap()
+
         # Regex Broken Telex (Giữ nguyên)
         self.broken_telex_pattern = re.compile(
             r'(?i)\b[a-z]*('
@@ -70,6 +85,22 @@ class MisspellExtractor:
             re.IGNORECASE
         )
 
+    @property
+    def full_dict(self) -> Set[str]:
+        return self.lexicon.words(LEX_FULL)
+
+    @full_dict.setter
+    def full_dict(self, value: Set[str]):
+        self.lexicon.set_words(LEX_FULL, value)
+
+    @property
+    def shadow_dict(self) -> Set[str]:
+        return self.lexicon.words(LEX_SHADOW)
+
+    @shadow_dict.setter
+    def shadow_dict(self, value: Set[str]):
+        self.lexicon.set_words(LEX_SHADOW, value)
+
     def _remove_accents(self, text: str) -> str:
         if not isinstance(text, str): return text
         # Fallback nếu không import được
@@ -84,12 +115,13 @@ class MisspellExtractor:
         
         # Thử cắt đôi token tại mọi vị trí
         # vd: v-uilong, vu-ilong, vui-long...
+        lookup = self.lexicon.masks.get
         for i in range(2, len(token) - 1):
             left = token[:i]
             right = token[i:]
             
             # Check xem cả 2 phần có nghĩa không (dùng shadow dict)
-            if left in self.shadow_dict and right in self.shadow_dict:
+            if lookup(left, 0) & LEX_SHADOW and lookup(right, 0) & LEX_SHADOW:
                 return True
         return False
 
@@ -105,64 +137,84 @@ class MisspellExtractor:
             
         return False
 
-    def extract(self, tokens: List[str]) -> MisspellResult:
-        if not tokens or not isinstance(tokens, list):
-            return MisspellResult()
+    def _token_flags(self, token: str, token_lower: str, token_no_accent: Optional[str] = None) -> int:
+        """
+        Phân loại 1 token (đã strip) thành tổ hợp cờ _CHECKED / _OOV / ...
+        token_no_accent: dạng bỏ dấu tính sẵn (Vocabulary.shadow), None -> tự tính khi cần
+        """
+        if not token or token.isdigit() or len(token) < 2:
+            return 0
+
+        # Whitelist: Bỏ qua các đơn vị dung lượng (3gb, 2mb, 15gb...)
+        if self.data_capacity_pattern.match(token):
+            return 0
+
+        # --- DUAL LOOKUP CHECK ---
+        # 1 lần tra Lexicon cho cả full_dict và shadow_dict; tra lại chỉ khi bỏ dấu làm đổi token
+        categories = self.lexicon.masks.get(token_lower, 0)
+        if categories & LEX_FULL:
+            return _CHECKED
+
+        if token_no_accent is None:
+            token_no_accent = self._remove_accents(token_lower)
+        if token_no_accent != token_lower:
+            categories = self.lexicon.masks.get(token_no_accent, 0)
+        if categories & LEX_SHADOW:
+            return _CHECKED
 
+        # === TOKEN IS OOV ===
+        flags = _CHECKED | _OOV
+
+        # 1. Check Gibberish (Ưu tiên check rác trước)
+        if self._is_gibberish(token_no_accent):
+            flags |= _GIBBERISH
+
+        # 2. Check Repeated Chars (Lỗi lặp > 2)
+        if self.repeated_char_pattern.search(token_lower):
+            flags |= _REPEATED
+
+        # 3. Check Broken Telex (Chỉ check nếu KHÔNG phải repeated char quá nhiều)
+        elif self.broken_telex_pattern.search(token_lower):
+            flags |= _BROKEN_TELEX
+
+        # 4. Check Run-on Words (Dính từ) - chỉ token không chứa ký tự lạ.
+        # Điều kiện "chưa có gibberish" phụ thuộc cả câu nên xét ở _build_result()
+        if token.isalpha() and self._check_run_on_word(token_no_accent):
+            flags |= _RUN_ON
+
+        return flags
+
+    def _build_result(self, classified) -> MisspellResult:
+        """Gộp (flags, token, length) của từng token thành MisspellResult"""
         oov_tokens = []
         broken_telex_count = 0
         max_len = 0
         checked_token_count = 0
-        
+
         # Bộ đếm lỗi
         gibberish_count = 0
         repeated_char_count = 0
         run_on_word_count = 0
 
-        for token in tokens:
-            if not isinstance(token, str): continue
-            token = token.strip()
-            if not token or token.isdigit() or len(token) < 2:
-                continue
-            
-            # Whitelist: Bỏ qua các đơn vị dung lượng (3gb, 2mb, 15gb...)
-            if self.data_capacity_pattern.match(token):
+        for flags, token, length in classified:
+            if not flags & _CHECKED:
                 continue
-            
             checked_token_count += 1
-            token_lower = token.lower()
-
-            # --- DUAL LOOKUP CHECK ---
-            if token_lower in self.full_dict:
+            if not flags & _OOV:
                 continue
-            
-            token_no_accent = self._remove_accents(token_lower)
-            if token_no_accent in self.shadow_dict:
-                continue
-            
-            # === TOKEN IS OOV ===
+
             oov_tokens.append(token)
-            if len(token) > max_len: max_len = len(token)
+            if length > max_len: max_len = length
 
-            # 1. Check Gibberish (Ưu tiên check rác trước)
-            if self._is_gibberish(token_no_accent):
+            if flags & _GIBBERISH:
                 gibberish_count += 1
-                # Nếu đã là rác, có thể không cần check các lỗi khác để tiết kiệm, 
-                # hoặc check tiếp tùy nhu cầu. Ở đây ta check tiếp.
-
-            # 2. Check Repeated Chars (Lỗi lặp > 2)
-            if self.repeated_char_pattern.search(token_lower):
+            if flags & _REPEATED:
                 repeated_char_count += 1
-                
-            # 3. Check Broken Telex (Chỉ check nếu KHÔNG phải repeated char quá nhiều)
-            elif self.broken_telex_pattern.search(token_lower):
+            elif flags & _BROKEN_TELEX:
                 broken_telex_count += 1
-                
-            # 4. Check Run-on Words (Dính từ)
-            # Chỉ check nếu token không chứa ký tự lạ và không phải gibberish
-            if not gibberish_count and token.isalpha():
-                if self._check_run_on_word(token_no_accent):
-                    run_on_word_count += 1
+            # Chỉ đếm dính từ khi câu chưa có token rác nào (tính tới token hiện tại)
+            if not gibberish_count and flags & _RUN_ON:
+                run_on_word_count += 1
 
         oov_count = len(oov_tokens)
         density = oov_count / checked_token_count if checked_token_count > 0 else 0.0
@@ -178,4 +230,46 @@ class MisspellExtractor:
             run_on_word_count=run_on_word_count,
             # List
             oov_tokens=oov_tokens
-        )
\ No newline at end of file
+        )
+
+    def extract(self, tokens: List[str]) -> MisspellResult:
+        if not tokens or not isinstance(tokens, list):
+            return MisspellResult()
+
+        classified = []
+        for token in tokens:
+            if not isinstance(token, str): continue
+            token = token.strip()
+            classified.append((self._token_flags(token, token.lower()), token, len(token)))
+
+        return self._build_result(classified)
+
+    def extract_ids(self, token_ids, vocabulary) -> MisspellResult:
+        """
+        Giống extract() nhưng nhận mảng ID từ Vocabulary (WhitelistResult.ids_to_check).
+        Cờ phân loại được lưu trong bitmap theo ID, dùng lower/shadow/length tính sẵn của Vocabulary
+        -> token lặp lại giữa các tin nhắn không phải tra từ điển / chạy regex lại.
+        """
+        if not token_ids:
+            return MisspellResult()
+
+        table = vocabulary.table(token_ids)  # StaleTokenIdsError nếu Vocabulary đã reset sau Layer 2
+        states = self._id_bitmap.for_table(table, self.lexicon.version)
+        stripped = table.stripped
+        length = table.length
+
+        classified = []
+        for token_id in token_ids:
+            flags = states[token_id]
+            if not flags:
+                flags = _COMPUTED | self._token_flags(
+                    stripped[token_id], table.lower[token_id], table.shadow[token_id]
+                )
+                states[token_id] = flags
+            classified.append((flags, stripped[token_id], length[token_id]))
+
+        return self._build_result(classified)
+
+    def clear_id_cache(self):
+        """Xóa bitmap theo ID (sửa Lexicon đã tự làm mới bitmap)"""
+        self._id_bitmap.clear()
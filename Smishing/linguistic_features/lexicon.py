@@ -0,0 +1,69 @@
+import threading
+from typing import Dict, Iterable, Set
+
+# Category bit của 1 mục trong Lexicon (1 từ có thể thuộc nhiều category)
+LEX_FULL = 1        # full_dict: từ điển có dấu (Layer 2, 4)
+LEX_SHADOW = 2      # shadow_dict: từ điển không dấu (Layer 2, 4)
+LEX_BRAND = 4       # Whitelist Layer 3: thương hiệu (dùng chung với DomainVerifier)
+LEX_JARGON = 8      # Whitelist Layer 3: thuật ngữ
+LEX_SLANG = 16      # Whitelist Layer 3: viết tắt / teencode / tiếng Anh
+LEX_ENTITY = 32     # Whitelist Layer 3: tag entity của Layer 1
+LEX_CUSTOM = 64     # Whitelist Layer 3: file whitelist tùy chỉnh
+LEX_WHITELIST = LEX_BRAND | LEX_JARGON | LEX_SLANG | LEX_ENTITY | LEX_CUSTOM
+
+LEX_CATEGORIES = (LEX_FULL, LEX_SHADOW, LEX_BRAND, LEX_JARGON, LEX_SLANG, LEX_ENTITY, LEX_CUSTOM)
+
+
+class Lexicon:
+    """
+    Từ vựng hợp nhất dùng chung giữa Layer 2, 3, 4 và DomainVerifier:
+    1 dict duy nhất từ -> bitmask category, nên 1 lần tra hash trả lời cùng lúc
+    "có trong full_dict / shadow_dict / whitelist (brand, jargon, slang, entity) không".
+
+    Hot path tra thẳng self.masks.get(word, 0) (bỏ 1 tầng gọi hàm Python của lookup()).
+    Sửa nội dung qua add() / set_words() (không sửa trực tiếp masks hay set trả về từ words()):
+    mỗi lần sửa tăng version, các layer so version để bỏ memo / bitmap tính theo nội dung cũ.
+    """
+
+    def __init__(self):
+        self.masks: Dict[str, int] = {}
+        self._words: Dict[int, Set[str]] = {category: set() for category in LEX_CATEGORIES}
+        self._lock = threading.Lock()
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self.masks)
+
+    def lookup(self, word: str) -> int:
+        """Bitmask category của word (0 nếu không có)"""
+        return self.masks.get(word, 0)
+
+    def words(self, category: int) -> Set[str]:
+        """Tập từ của 1 category (chỉ đọc)"""
+        return self._words[category]
+
+    def add(self, words: Iterable[str], category: int):
+        """Thêm từ vào 1 category"""
+        with self._lock:
+            masks = self.masks
+            members = self._words[category]
+            for word in words:
+                masks[word] = masks.get(word, 0) | category
+                members.add(word)
+            self.version += 1
+
+    def set_words(self, category: int, words: Iterable[str]):
+        """Thay toàn bộ từ của 1 category (VD: gán full_dict mới)"""
+        with self._lock:
+            masks = self.masks
+            for word in self._words[category]:
+                mask = masks[word] & ~category
+                if mask:
+                    masks[word] = mask
+                else:
+                    del masks[word]
+            members = set(words)
+            for word in members:
+                masks[word] = masks.get(word, 0) | category
+            self._words[category] = members
+            self.version += 1
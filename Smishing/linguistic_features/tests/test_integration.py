@@ -0,0 +1,127 @@
+"""
+test_integration.py
+===================
+Integration tests cho pipeline trích xuất đặc trưng (SmishingFeatureExtractor: Layer 1 -> 4)
+
+Chạy tests:
+    pytest tests/test_integration.py -v
+"""
+
+import pytest
+import sys
+from pathlib import Path
+
+# === SETUP PATH ===
+ROOT_DIR = Path(__file__).resolve().parent.parent.parent.parent  # IE403_DoAnCuoiKy/
+sys.path.insert(0, str(ROOT_DIR))
+
+from Smishing.features import SmishingFeatureExtractor
+
+
+# ============================================================
+# FIXTURES
+# ============================================================
+
+@pytest.fixture(scope="module")
+def long_extractor():
+    """Extractor ở chế độ tin nhắn dài: ngưỡng 400 ký tự, cửa sổ mặc định"""
+    return SmishingFeatureExtractor(long_message_chars=400)
+
+
+# ============================================================
+# TEST GROUP 1: CHẾ ĐỘ TIN NHẮN DÀI
+# ============================================================
+
+class TestLongMessageMode:
+    """Tests cho long_message_chars / window_chars"""
+
+    def test_default_window_follows_threshold(self, long_extractor):
+        assert long_extractor.window_chars == 400
+        assert SmishingFeatureExtractor(long_message_chars=1000).window_chars == 600
+
+    def test_invalid_window(self):
+        with pytest.raises(ValueError):
+            SmishingFeatureExtractor(long_message_chars=400, window_chars=500)
+
+    def test_layer1_scans_full_text(self, long_extractor):
+        """URL / SĐT nằm vắt qua vị trí long_message_chars vẫn được mask"""
+        # Entity có khoảng trắng bên trong, trải qua ký tự thứ 400
+        for entity, label in [("bit . ly/abc123", "url_count"), ("0901 234 567", "mobile_count")]:
+            text = "x" * 392 + " " + entity + " " + "chao ban " * 60
+            features, masked, _ = long_extractor.extract_features(text, return_dict=True)
+            assert features[label] == 1
+            assert entity not in masked
+
+
+# ============================================================
+# TEST GROUP 2: CỬA SỔ ĐẦU + CUỐI
+# ============================================================
+
+class TestHeadTailWindow:
+    """Tests cho _head_tail_window(): chỉ bỏ từ bị cắt ngang"""
+
+    @pytest.fixture
+    def extractor(self, long_extractor):
+        long_extractor.window_chars = 10  # Mỗi phần 5 ký tự
+        yield long_extractor
+        long_extractor.window_chars = 400
+
+    def test_cut_on_word_boundary_keeps_words(self, extractor):
+        # Điểm cắt đầu (sau "ab cd") và cuối (trước "hi jk") đều là khoảng trắng
+        window, _ = extractor._head_tail_window("ab cd efg hi jk")
+        assert window == "ab cd hi jk"
+
+    def test_cut_inside_word_drops_partial_word(self, extractor):
+        window, _ = extractor._head_tail_window("ab cdefg xyz xyzw hi")
+        assert window == "ab hi"
+
+    def test_scale_is_length_ratio(self, extractor):
+        text = "abcde xyz xyz ghijk"
+        window, scale = extractor._head_tail_window(text)
+        assert scale == pytest.approx(len(text) / len(window))
+
+
+# ============================================================
+# TEST GROUP 3: VOCABULARY DÙNG CHUNG
+# ============================================================
+
+class TestSharedVocabulary:
+    """Vocabulary dùng chung giữa các session: reset giữa Layer 2 và Layer 3 không làm sai feature"""
+
+    def test_reset_between_layers(self, long_extractor, monkeypatch):
+        text = "Ban da trung thuong 500k, vao ngay bit.ly/abc123 de nhan qua"
+        expected = long_extractor.extract_features(text, return_dict=True)[0]
+
+        vocabulary = long_extractor.vocabulary
+        normalize = long_extractor.normalizer.normalize
+
+        def normalize_then_reset(text):
+            # Thread khác làm Vocabulary vượt max_size ngay sau Layer 2 của tin nhắn này
+            result = normalize(text)
+            monkeypatch.setattr(vocabulary, 'max_size', len(vocabulary) - 1)
+            vocabulary.intern_all(['khac'])
+            monkeypatch.setattr(vocabulary, 'max_size', 500_000)
+            return result
+
+        monkeypatch.setattr(long_extractor.normalizer, 'normalize', normalize_then_reset)
+        generation = vocabulary.generation
+        features = long_extractor.extract_features(text, return_dict=True)[0]
+        assert vocabulary.generation == generation + 1
+        assert features == expected
+
+
+# ============================================================
+# TEST GROUP 4: DOMAIN VERIFIER
+# ============================================================
+
+class TestDomainVerifier:
+    """DomainVerifier chỉ kiểm tra URL web (label 'url'), không tra link Zalo/Telegram"""
+
+    def test_app_links_not_checked(self):
+        pytest.importorskip("duckduckgo_search")
+        from Smishing.domain_check import DomainVerifier
+
+        verifier = DomainVerifier()
+        assert verifier.URL_LABELS == ('url',)
+        text = "Ket ban zalo.me/abc123 hoac t.me/shopee_cskh de nhan qua"
+        assert verifier.verify(text) == ("SKIP", "No URL", 0.0)
@@ -9,7 +9,10 @@ Chạy tests:
 """
 
 import pytest
+import random
+import re
 import sys
+import unicodedata
 from pathlib import Path
 import pandas as pd
 from datetime import datetime
@@ -19,7 +22,9 @@ from datetime import datetime
 ROOT_DIR = Path(__file__).resolve().parent.parent.parent.parent  # IE403_DoAnCuoiKy/
 sys.path.insert(0, str(ROOT_DIR))
 
-from Smishing.preprocessing.layer1_masking import AggressiveMasker
+from Smishing.preprocessing.homoglyph import HOMOGLYPHS, fold_homoglyphs
+from Smishing.preprocessing.layer1_masking import (AggressiveMasker, EntitySpan, UrlEntity,
+                                                   build_trie_regex, parse_url, parse_registered_domain)
 from Smishing.data_loader import load_dataset, DataLoader
 
 
@@ -273,6 +278,35 @@ class TestIntegrationWithDataset:
         
         assert len(masked_texts) == len(texts)
         assert len(metas) == len(texts)
+
+    def test_mask_batch_parallel_preserves_order(self, masker, sample_dataset):
+        """mask_batch() trên process pool cho kết quả giống hệt, đúng thứ tự"""
+        if sample_dataset is None:
+            pytest.skip("Dataset không tồn tại")
+
+        texts = sample_dataset["content"].fillna("").astype(str).head(200).tolist()
+        expected = masker._mask_batch(texts)
+        assert masker.mask_batch(texts, workers=2, chunk_size=16, min_parallel_size=0) == expected
+
+    def test_mask_batch_small_batch_in_process(self, masker):
+        texts = ["Goi 0901234567", "Nhan 500k", ""]
+        assert masker.mask_batch(texts, workers=4) == masker._mask_batch(texts)
+
+    def test_mask_joined_matches_per_message(self, masker, sample_dataset):
+        """Batch mode 'joined' (ghép buffer) cho kết quả giống hệt mask() từng tin nhắn"""
+        if sample_dataset is None:
+            pytest.skip("Dataset không tồn tại")
+
+        texts = sample_dataset["content"].fillna("").astype(str).head(500).tolist()
+        assert masker._mask_joined(texts) == masker._mask_batch(texts)
+
+    def test_mask_joined_edge_messages(self, masker):
+        """Tin rỗng, chỉ có khoảng trắng, chứa separator hoặc bắt đầu bằng dấu kết hợp"""
+        texts = ["", "   ", "  Goi 0901234567  ", "a\x00b 0901234567", "\u0301abc",
+                 "STK 123456789 vcb", "Ma OTP 123456 www.abc.xyz"]
+        expected = masker._mask_batch(texts)
+        assert masker._mask_joined(texts) == expected
+        assert masker.mask_batch(texts, joined=True) == expected
     
     def test_entity_counts(self, masker, sample_dataset):
         """Test đếm entity"""
@@ -289,6 +323,493 @@ class TestIntegrationWithDataset:
             assert val >= 0
 
 
+class TestCompiledPatterns:
+    """Tests cho registry pattern đã biên dịch sẵn"""
+
+    def test_all_entity_patterns_compiled(self, masker):
+        """Mọi pattern thuần trong self.patterns phải có bản compiled"""
+        entities = masker._compiled['entities']
+        assert list(entities.keys()) == list(masker.patterns.keys())
+        for label, (token_tag, logic) in entities.items():
+            assert token_tag == masker.patterns[label][0]
+            assert callable(logic) or isinstance(logic, re.Pattern)
+
+    def test_mask_independent_of_re_cache(self):
+        """Kết quả không đổi khi cache nội bộ của `re` bị xóa"""
+        masker = AggressiveMasker(cache_size=0)
+        text = "Soan ST5K gui 9029. Truy cap bit.ly/abc hoac goi 0901234567 truoc 10h30"
+        expected = masker.mask(text)
+        re.purge()
+        assert masker.mask(text) == expected
+
+    def test_sub_and_collect_matches_findall(self, masker):
+        """Giá trị thu được khi thay thế phải giống findall() (0, 1 và nhiều group)"""
+        text = "Goi 0901234567 hoac 0912.345.678, han 10/12/2024 luc 10h30"
+        for regex in (masker._compiled['entities']['mobile'][1],
+                      re.compile(r'(09)\d+'), re.compile(r'(\d+)/(\d+)(/\d+)?')):
+            masked, matches = masker._sub_and_collect(regex, "<TAG>", text)
+            assert matches == regex.findall(text)
+            assert masked == regex.sub("<TAG>", text)
+
+
+class TestExtractSpans:
+    """Tests cho extract_spans(): offset thực thể trên text gốc (NFC)"""
+
+    def test_offsets_on_original_text(self, masker):
+        text = "Soan  ST5K gui 9029 de nhan 500k. Truy cap bit.ly/abc"
+        spans = masker.extract_spans(text)
+        assert [(s.label, s.value) for s in spans] == [
+            ("code", "ST5K"), ("shortcode", "9029"), ("money", "500k"), ("url", "bit.ly/abc")
+        ]
+        for span in spans:
+            assert text[span.start:span.end] == span.value
+
+    def test_obfuscated_url_span_covers_spaces(self, masker):
+        text = "Truy cap acb . com . vn de xac thuc"
+        (span,) = masker.extract_spans(text)
+        assert span == EntitySpan(9, 23, "url", "acb.com.vn")
+
+    def test_empty(self, masker):
+        assert masker.extract_spans("") == []
+
+    def test_values_match_mask_metadata(self, masker, sample_dataset):
+        """Mọi tin nhắn: giá trị trong spans == metadata của mask(), span trỏ đúng đoạn text gốc"""
+        if sample_dataset is None:
+            pytest.skip("Dataset not found")
+        for content in sample_dataset["content"].fillna("").astype(str):
+            _, metadata = masker.mask(content)
+            spans = masker.extract_spans(content)
+            values = {}
+            for span in spans:
+                values.setdefault(span.label, []).append(span.value)
+            assert {k: sorted(v) for k, v in values.items()} == {k: sorted(v) for k, v in metadata.items()}
+
+            text = unicodedata.normalize("NFC", content)
+            for span in spans:
+                segment = re.sub(r"\s+", " ", text[span.start:span.end])
+                if span.label == "url":
+                    assert segment.replace(" ", "").startswith(span.value)
+                else:
+                    assert segment == span.value
+
+
+class TestMaskCache:
+    """Tests cho LRU cache của mask()"""
+
+    def test_hit_and_miss_counters(self, masker):
+        text = "Goi 0901234567 de nhan 500k"
+        first = masker.mask(text)
+        assert masker.mask(text) == first
+        stats = masker.get_cache_stats()
+        assert (stats['hits'], stats['misses'], stats['size']) == (1, 1, 1)
+
+    def test_returned_metadata_cannot_corrupt_cache(self, masker):
+        text = "Goi 0901234567 de nhan 500k"
+        _, metadata = masker.mask(text)
+        metadata['mobile'].append("0000000000")
+        metadata['fake'] = ["x"]
+        assert masker.mask(text)[1] == {'mobile': ['0901234567'], 'money': ['500k']}
+
+    def test_eviction(self):
+        masker = AggressiveMasker(cache_size=2)
+        for text in ("Goi 0901234567", "Goi 0912345678", "Goi 0987654321"):
+            masker.mask(text)
+        stats = masker.get_cache_stats()
+        assert (stats['size'], stats['evictions']) == (2, 1)
+        masker.mask("Goi 0901234567")  # Đã bị đẩy ra (least recently used)
+        assert masker.get_cache_stats()['misses'] == 4
+
+    def test_disabled(self):
+        masker = AggressiveMasker(cache_size=0)
+        masker.mask("Goi 0901234567")
+        masker.mask("Goi 0901234567")
+        stats = masker.get_cache_stats()
+        assert (stats['hits'], stats['misses'], stats['size']) == (0, 0, 0)
+
+    def test_thread_safe(self):
+        from concurrent.futures import ThreadPoolExecutor
+        masker = AggressiveMasker(cache_size=8)
+        texts = [f"Goi 09{i:08d} de nhan {i}k" for i in range(32)] * 4
+        expected = [AggressiveMasker(cache_size=0).mask(t) for t in texts]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            assert list(pool.map(masker.mask, texts)) == expected
+        stats = masker.get_cache_stats()
+        assert stats['hits'] + stats['misses'] == len(texts)
+        assert stats['size'] <= 8
+
+
+class TestBoundedTime:
+    """Tests cho bounded-time mode (max_length / time_budget_ms)"""
+
+    def test_short_messages_unchanged(self, masker, sample_dataset):
+        if sample_dataset is None:
+            pytest.skip("Dataset not found")
+        bounded = AggressiveMasker(max_length=2000, time_budget_ms=1000)
+        for content in sample_dataset["content"].fillna("").astype(str).head(300):
+            assert bounded.mask(content) == masker.mask(content)
+        assert bounded.budget_stats == {'segmented': 0, 'over_budget': 0}
+
+    def test_long_adversarial_message_segmented(self):
+        """Input gây backtrack O(n^2) vẫn được xử lý theo từng đoạn, entity phía sau không bị mất"""
+        bounded = AggressiveMasker(cache_size=0, max_length=300)
+        text = "ab." * 2000 + " lien he 0901234567"
+        masked, meta = bounded.mask(text)
+        assert meta.get('mobile') == ['0901234567']
+        assert masked.endswith("lien he <PHONE>")
+        assert bounded.budget_stats['segmented'] == 1
+
+    def test_time_budget_skips_url_regexes(self):
+        masker = AggressiveMasker(cache_size=0, time_budget_ms=0)
+        masked, meta = masker.mask("Truy cap  bit.ly/abc  goi 0901234567")
+        assert masked == "Truy cap bit.ly/abc goi <PHONE>"
+        assert meta == {'mobile': ['0901234567']}
+        assert masker.budget_stats['over_budget'] == 1
+
+    def test_over_budget_result_not_cached(self):
+        """Kết quả thiếu URL do hết ngân sách không được cache -> lần sau đủ thời gian vẫn mask đủ"""
+        masker = AggressiveMasker(cache_size=16, time_budget_ms=0)
+        text = "Truy cap bit.ly/abc goi 0901234567"
+        assert masker.mask(text)[0] == "Truy cap bit.ly/abc goi <PHONE>"
+        assert masker.get_cache_stats()['size'] == 0
+
+        masker.time_budget_ms = 1000
+        assert masker.mask(text)[0] == "Truy cap <URL> goi <PHONE>"
+        assert masker.get_cache_stats()['size'] == 1
+
+
+class TestKeywordAnchors:
+    """Tests cho keyword-anchored sub (bank_acc, shortcode context)"""
+
+    def test_anchors_are_literal_prefix_free(self, masker):
+        anchors = masker._compiled['bank_anchors']
+        assert 'bank' in anchors and 'banking' not in anchors
+        assert 'tk' in anchors and 'tài khoản' in anchors
+
+    @pytest.mark.parametrize("text", [
+        "STK: 0123456789 Vietcombank", "so tk 12345678901", "ſtk 12345678", "İstk 12345678",
+        "xstk 12345678", "Gửi 9029 ngay", "LIÊN HỆ 888", "lh  191 hoac gui 1414", "khong co tu khoa",
+    ])
+    def test_same_as_regex_sub(self, masker, text):
+        bank = re.compile(rf'(?i)\b({masker.bank_keywords})(?:[\s:\.\-\|]*?)(\d{{8,19}})(?!\d)')
+        replacer = lambda m: f"{m.group(1)} <TAG>"
+        for regex, anchors in ((bank, masker._compiled['bank_anchors']),
+                               (masker._compiled['shortcode_context'], masker._compiled['shortcode_anchors'])):
+            assert masker._anchored_sub(regex, anchors, replacer, text)[0] == regex.sub(replacer, text)
+
+    def test_bank_acc_keeps_baseline_quantifier(self, masker):
+        """Pattern STK giữ nguyên bản gốc: rf-string biến \\d{8,19} thành \\d(8, 19) (model đã train trên hành vi này)"""
+        assert masker._compiled['bank_acc'].pattern.endswith(r'(\d(8, 19))(?!\d)')
+        assert masker.mask("STK 0123456789 vcb") == ("STK 0123456789 vcb", {})
+        assert masker.mask("STK 38, 19 vcb") == ("STK <BANK_ACC> vcb", {'bank_acc': ['38, 19']})
+
+
+class TestPrefilter:
+    """Tests cho prefilter theo capability (digit, '.', '@', '/', từ khóa ngân hàng)"""
+
+    def test_skip_groups_without_trigger_chars(self, masker):
+        masked, meta = masker.mask("Chuc mung ban da trung thuong, lien he ngay")
+        assert meta == {}
+        stats = masker.get_prefilter_stats()
+        assert stats['messages'] == 1
+        assert stats['skipped']['mobile'] == 1
+        assert stats['skipped']['email'] == 1
+        assert stats['skipped']['url'] == 0  # Có dấu ',' -> vẫn phải chạy URL (broken shortener)
+
+    def test_same_output_without_prefilter(self, masker, sample_dataset):
+        if sample_dataset is None:
+            pytest.skip("Dataset not found")
+        plain = AggressiveMasker(prefilter=False)
+        for content in sample_dataset["content"].fillna("").astype(str):
+            assert masker.mask(content) == plain.mask(content)
+        assert plain.get_prefilter_stats()['messages'] == 0
+
+    def test_obfuscated_dot_word_not_skipped(self, masker):
+        """'dot' thay cho dấu chấm vẫn phải qua nhóm URL"""
+        text = "Truy cap s h o p e e dot v n de nhan qua"
+        assert masker.mask(text) == AggressiveMasker(prefilter=False).mask(text)
+        assert masker.get_prefilter_stats()['skipped']['url'] == 0
+
+    def test_stats_exact_under_threads(self):
+        """Masker dùng chung giữa các thread: bộ đếm prefilter / bounded-time không bị mất lượt tăng"""
+        from concurrent.futures import ThreadPoolExecutor
+
+        text = "Chuc mung ban trung thuong lien he ngay hom nay de nhan qua"
+        calls = 2000
+        bounded = AggressiveMasker(cache_size=0, max_length=20)
+        previous = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)  # Đổi thread liên tục để lộ race của +=
+        try:
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                list(pool.map(lambda _: bounded.mask(text), range(calls)))
+        finally:
+            sys.setswitchinterval(previous)
+
+        stats = bounded.get_prefilter_stats()
+        segments = stats['messages'] // calls
+        assert bounded.budget_stats['segmented'] == calls
+        assert stats['messages'] == segments * calls and segments > 1
+        assert stats['skipped']['mobile'] == segments * calls
+
+
+class TestConfigReload:
+    """Tests cho cấu hình Layer 1 nạp từ file JSON và hot reload"""
+
+    @pytest.fixture
+    def write_config(self, tmp_path):
+        """Ghi bản sửa của cấu hình mặc định ra file tạm"""
+        import json
+
+        def write(version, **changes):
+            config = json.loads(AggressiveMasker.DEFAULT_CONFIG_PATH.read_text(encoding="utf-8"))
+            config["version"] = version
+            config.update(changes)
+            path = tmp_path / f"layer1_{version}.json"
+            path.write_text(json.dumps(config, ensure_ascii=False), encoding="utf-8")
+            return path
+        return write
+
+    def test_default_config_loaded(self, masker):
+        assert masker.config_path == str(AggressiveMasker.DEFAULT_CONFIG_PATH)
+        assert masker._compiled['version'] == masker.config_version
+        assert '9029' in masker.known_shortcodes and 'ECO' in masker.valid_code_prefixes
+
+    def test_reload_adds_risky_tld(self, masker, write_config):
+        text = "Truy cap abc.scam ngay"
+        assert masker.mask(text)[0] == text
+
+        risky = masker.risky_tlds.split('|') + ['scam']
+        version = masker.reload_config(write_config("v2", risky_tlds=risky))
+
+        assert version == "v2" and masker.config_version == "v2"
+        assert masker.mask(text) == ("Truy cap <URL> ngay", {'url': ['abc.scam']})
+
+    def test_invalid_config_keeps_running_config(self, masker, write_config):
+        before = masker._compiled
+        with pytest.raises(ValueError):
+            masker.reload_config(write_config("broken", risky_tlds=[]))
+        with pytest.raises(ValueError):
+            masker.reload_config(write_config("reordered", patterns={"code": {"tag": "<CODE>"}}))
+        assert masker._compiled is before
+        assert masker.mask("Goi 0901234567")[0] == "Goi <PHONE>"
+
+    @staticmethod
+    def _patterns_with(label, entry):
+        import json
+        patterns = json.loads(AggressiveMasker.DEFAULT_CONFIG_PATH.read_text(encoding="utf-8"))["patterns"]
+        patterns[label] = entry
+        return patterns
+
+    @pytest.mark.parametrize("label, entry", [
+        ("mobile", {"regex": r"0\d{9}"}),            # Thiếu tag
+        ("mobile", {"tag": 1, "regex": r"0\d{9}"}),  # tag sai kiểu
+        ("mobile", {"tag": "<PHONE>", "regex": 5}),  # regex sai kiểu
+        ("mobile", "<PHONE>"),                      # entry không phải object
+        ("url", {}),                                # Custom masker thiếu tag
+    ])
+    def test_malformed_pattern_entry_raises_value_error(self, masker, write_config, label, entry):
+        before = masker._compiled
+        with pytest.raises(ValueError):
+            masker.reload_config(write_config("broken", patterns=self._patterns_with(label, entry)))
+        assert masker._compiled is before
+
+    @pytest.mark.parametrize("changes", [{"patterns": []}, {"risky_tlds": "vn|xyz"}])
+    def test_wrong_section_type_raises_value_error(self, masker, write_config, changes):
+        with pytest.raises(ValueError):
+            masker.reload_config(write_config("broken", **changes))
+
+    def test_non_object_config_raises_value_error(self, masker, tmp_path):
+        path = tmp_path / "layer1_list.json"
+        path.write_text("[]", encoding="utf-8")
+        with pytest.raises(ValueError):
+            masker.reload_config(path)
+
+    def test_in_flight_message_keeps_old_config(self, masker, write_config):
+        """Reload giữa lúc xử lý 1 tin nhắn không đổi bộ pattern của tin đó"""
+        with masker._pin_config() as pinned:
+            masker.reload_config(write_config("v2", known_shortcodes=[]))
+            assert masker._compiled is pinned
+            assert masker._compiled['shortcode_whitelist'] is not None
+        assert masker._compiled['version'] == "v2"
+        assert masker._compiled['shortcode_whitelist'] is None
+
+    def test_reload_invalidates_cache(self, write_config):
+        masker = AggressiveMasker(cache_size=16)
+        text = "Truy cap abc.scam ngay"
+        masker.mask(text)
+        masker.reload_config(write_config("v2", risky_tlds=masker.risky_tlds.split('|') + ['scam']))
+        assert masker.mask(text)[0] == "Truy cap <URL> ngay"
+
+    @pytest.mark.skipif(not hasattr(__import__("signal"), "SIGUSR1"), reason="Cần POSIX signal")
+    def test_reload_on_signal(self, masker, write_config):
+        import os
+        import signal
+
+        masker.reload_config(write_config("v1"))
+        write_config("v1", risky_tlds=masker.risky_tlds.split('|') + ['scam'])
+        previous = signal.getsignal(signal.SIGUSR1)
+        try:
+            masker.install_reload_signal(signal.SIGUSR1)
+            os.kill(os.getpid(), signal.SIGUSR1)
+            assert masker.mask("Truy cap abc.scam ngay")[0] == "Truy cap <URL> ngay"
+        finally:
+            signal.signal(signal.SIGUSR1, previous)
+
+    @pytest.mark.skipif(not hasattr(__import__("signal"), "SIGUSR1"), reason="Cần POSIX signal")
+    def test_bad_config_on_signal_keeps_running_config(self, masker, write_config):
+        """File lỗi cấu trúc (thiếu tag) khi reload bằng signal: log lỗi, mask() vẫn chạy với cấu hình cũ"""
+        import os
+        import signal
+
+        masker.reload_config(write_config("v1"))
+        before = masker._compiled
+        write_config("v1", patterns=self._patterns_with("mobile", {"regex": r"0\d{9}"}))
+        previous = signal.getsignal(signal.SIGUSR1)
+        try:
+            masker.install_reload_signal(signal.SIGUSR1)
+            os.kill(os.getpid(), signal.SIGUSR1)
+            assert masker.mask("Goi 0901234567")[0] == "Goi <PHONE>"
+            assert masker._compiled is before
+            assert masker.config_version == "v1"
+        finally:
+            signal.signal(signal.SIGUSR1, previous)
+
+
+class TestUrlEntities:
+    """Tests cho URL entity có cấu trúc (parse_url, extract_urls)"""
+
+    def test_parse_url_fields(self):
+        entity = parse_url("https://vietcombank.ngrok-free.app/login?id=1.")
+        assert entity == UrlEntity(raw="https://vietcombank.ngrok-free.app/login?id=1.",
+                                   cleaned="https://vietcombank.ngrok-free.app/login?id=1",
+                                   scheme="https", host="vietcombank.ngrok-free.app",
+                                   registered_domain="ngrok-free.app", suffix="app",
+                                   is_ip=False, path="/login?id=1")
+
+    def test_parse_url_schemeless_and_ip(self):
+        entity = parse_url("Shopee.VN/km")
+        assert (entity.scheme, entity.host, entity.registered_domain, entity.suffix) == ("", "shopee.vn", "shopee.vn", "vn")
+
+        ip = parse_url("http://192.168.1.50:8080/update")
+        assert ip.is_ip and ip.host == "192.168.1.50" and ip.registered_domain == "" and ip.path == "/update"
+
+    def test_extract_urls_matches_metadata(self, masker):
+        """Mỗi URL/app link trong metadata có đúng 1 entity, raw lấy từ text gốc"""
+        text = "Vao zalo.me/abc123 hoac https://vcb-secure.xyz/login, lap lai vcb-secure.xyz/login"
+        entities = masker.extract_urls(text)
+        _, metadata = masker.mask(text)
+
+        values = metadata['zalo'] + metadata['url']
+        assert [e.cleaned for e in entities] == list(dict.fromkeys(v.rstrip('.,;:') for v in values))
+        assert entities[0].registered_domain == "zalo.me"
+        assert all(e.raw in text for e in entities)
+
+    @pytest.mark.parametrize("text", [
+        "Vao zalo.me/abc123 hoac https://vcb-secure.xyz/login, lap lai vcb-secure.xyz/login",
+        "VCB thong bao: TK 0123456789 bi khoa, LH 0901 234 567 hoac bit . ly/abc123 truoc 12/05",
+        "Ban nhan 500k tu Shopee, gui ma OTP 123456 toi t.me/shopee_cskh",
+        "",
+    ])
+    def test_mask_with_spans_single_pass(self, masker, text):
+        """mask_with_spans() = mask() + extract_spans(); extract_urls() dùng lại spans cho kết quả như cũ"""
+        masked, metadata, spans = masker.mask_with_spans(text)
+        assert (masked, metadata) == masker.mask(text)
+        assert spans == masker.extract_spans(text)
+        assert masker.extract_urls(text, spans=spans) == masker.extract_urls(text)
+
+    def test_extract_urls_web_only(self, masker):
+        """labels=('url',) (DomainVerifier): bỏ link Zalo/Telegram, giống bản gốc chỉ đọc metadata['url']"""
+        text = "Vao zalo.me/abc123 hoac t.me/shopee_cskh, xac thuc tai https://vcb-secure.xyz/login"
+        _, metadata, spans = masker.mask_with_spans(text)
+        entities = masker.extract_urls(text, labels=('url',), spans=spans)
+        assert [e.cleaned for e in entities] == metadata['url'] == ["https://vcb-secure.xyz/login"]
+
+    def test_registered_domain_memoized(self):
+        parse_registered_domain.cache_clear()
+        for _ in range(3):
+            parse_url("https://km.viettel.vn/abc")
+        info = parse_registered_domain.cache_info()
+        assert (info.hits, info.misses) == (2, 1)
+        assert info.maxsize is not None
+
+
+class TestTrieRegex:
+    """Tests cho trie regex của các danh sách từ (TLD, từ khóa, đơn vị tiền, shortcode)"""
+
+    def test_prefix_factoring(self):
+        assert build_trie_regex(["bank", "banking", "bidv"]) == "b(?:ank(?:|ing)|idv)"
+        assert build_trie_regex(["account", "acc"]) == "acc(?:ount|)"
+        assert build_trie_regex([]) == ""
+
+    def test_matches_flat_alternation_order(self):
+        """Không có \\b phía sau: thứ tự từ trong danh sách quyết định nhánh match, trie phải giữ nguyên"""
+        import random
+        rng = random.Random(0)
+        for _ in range(200):
+            words = ["".join(rng.choice("abc") for _ in range(rng.randint(1, 4))) for _ in range(rng.randint(1, 8))]
+            text = "".join(rng.choice("abc ") for _ in range(40))
+            for suffix in ("", r"\b", "c"):
+                flat = re.compile(f"(?:{'|'.join(words)}){suffix}")
+                trie = re.compile(f"(?:{build_trie_regex(words)}){suffix}")
+                assert [m.span() for m in flat.finditer(text)] == [m.span() for m in trie.finditer(text)], words
+
+    def test_bank_keywords_match_flat(self, masker):
+        """Từ khóa STK: trie và alternation phẳng bắt cùng từ khóa (quantifier {8,19} chuẩn)"""
+        words = masker.bank_keywords.split('|')
+        template = r'(?i)\b({})(?:[\s:\.\-\|]*?)(\d{{8,19}})(?!\d)'
+        flat = re.compile(template.format('|'.join(words)))
+        trie = re.compile(template.format(build_trie_regex(words)))
+        for text in ["STK: 0123456789 Vietcombank", "banking 123456789", "so tai khoan 12345678901",
+                     "MB 99998888 tk 11112222", "account|123456789012"]:
+            assert [m.groups() for m in flat.finditer(text)] == [m.groups() for m in trie.finditer(text)]
+
+    def test_masker_trie_matches_flat(self, masker, sample_dataset):
+        if sample_dataset is None:
+            pytest.skip("Dataset không tồn tại")
+        flat = AggressiveMasker(trie_regex=False)
+        for text in sample_dataset["content"].fillna("").astype(str).head(300):
+            assert masker.mask(text) == flat.mask(text)
+
+
+class TestHomoglyphFolding:
+    """Tests cho Tầng 0 (trước Layer 1): fold ký tự look-alike Cyrillic/Greek/fullwidth về chữ Latin"""
+
+    def test_cyrillic_brand(self):
+        assert fold_homoglyphs("Ѵietcombаnk") == ("Vietcombank", 2)
+        assert fold_homoglyphs("Ngân hàng Ѵietcombаnk thông báo") == ("Ngân hàng Vietcombank thông báo", 2)
+
+    def test_greek_fullwidth_math(self):
+        assert fold_homoglyphs("ΑΡΡLΕ") == ("APPLE", 4)
+        assert fold_homoglyphs("ｗｗｗ．ｖｃｂ．ｃｏｍ　０９１２") == ("www.vcb.com 0912", 16)
+        assert fold_homoglyphs("𝐕𝐢𝐞𝐭 𝟏𝟐𝟑") == ("Viet 123", 7)
+
+    def test_vietnamese_and_ascii_unchanged(self, sample_dataset):
+        """Chữ Latin (kể cả tiếng Việt có dấu) không bao giờ bị thay"""
+        texts = ["", "Xin chào, mời bạn truy cập https://example.vn", "ĐĂNG KÝ ngay ưu đãi ở đây"]
+        if sample_dataset is not None:
+            texts += sample_dataset["content"].fillna("").astype(str).tolist()
+        for text in texts:
+            folded, count = fold_homoglyphs(text)
+            assert (folded == text) == (count == 0)
+        dict_path = ROOT_DIR / "Smishing" / "dicts" / "full_dict.txt"
+        if dict_path.exists():
+            for word in dict_path.read_text(encoding="utf-8").split("\n"):
+                assert fold_homoglyphs(word) == (word, 0)
+
+    def test_table_is_one_to_one_latin(self):
+        """Mỗi ký tự chỉ đổi thành đúng 1 ký tự ASCII -> độ dài text và offset không đổi"""
+        for code, latin in HOMOGLYPHS.items():
+            assert code > 127 and len(latin) == 1 and latin.isascii()
+            # Chữ Latin thật chỉ có ı, ɑ, ɡ (không dùng trong tiếng Việt)
+            assert not unicodedata.name(chr(code)).startswith("LATIN") or code in (0x0131, 0x0251, 0x0261)
+
+    def test_folded_url_is_masked(self, masker):
+        """URL fullwidth / Cyrillic lọt qua regex Layer 1 nếu không fold trước"""
+        text = "Truy cap ｖｃｂ－ｖｎ．ｃｏｍ de xac thuc"
+        folded, count = fold_homoglyphs(text)
+        assert count == 10
+        assert "<URL>" in masker.mask(folded)[0]
+
+
 # ============================================================
 # EDGE CASES & REGRESSION TESTS
 # ============================================================
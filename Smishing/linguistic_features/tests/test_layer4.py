@@ -22,7 +22,9 @@ from pathlib import Path
 ROOT_DIR = Path(__file__).resolve().parent.parent.parent.parent
 sys.path.insert(0, str(ROOT_DIR))
 
-from Smishing.misspell_detection.layer4_misspell import MisspellExtractor, MisspellResult
+from Smishing.linguistic_features.layer4_misspell import MisspellExtractor, MisspellResult
+from Smishing.linguistic_features.vocabulary import StaleTokenIdsError, Vocabulary
+from Smishing.linguistic_features.lexicon import LEX_FULL
 
 
 # ============================================================
@@ -181,6 +183,64 @@ class TestMetrics:
         assert res.longest_oov_length == 5
 
 
+# ============================================================
+# TEST GROUP 4: EXTRACT THEO TOKEN ID (VOCABULARY)
+# ============================================================
+
+class TestExtractIds:
+    """extract_ids() trên mảng ID phải cho cùng kết quả với extract() trên chuỗi"""
+
+    @pytest.mark.parametrize("tokens", [
+        ['xin', 'chao', 'kaka', 'hoho'],
+        ['xin', 'kaka', '123', 'a', ' BẠN '],
+        ['dduwowng', 'aam', 'hottt', 'ngannn'],
+        ['xinchao', 'xkqz', 'nganhang'],  # Dính từ sau token rác không được đếm
+        ['3gb', '15Mbps', 'xyz', 'xyz'],
+    ])
+    def test_same_result_as_extract(self, extractor, tokens):
+        vocab = Vocabulary()
+        assert extractor.extract_ids(vocab.intern_all(tokens), vocab) == extractor.extract(tokens)
+
+    def test_empty_ids(self, extractor):
+        assert extractor.extract_ids(Vocabulary().intern_all([]), Vocabulary()) == MisspellResult()
+
+    def test_flags_reused_across_messages(self, extractor, monkeypatch):
+        """Mỗi ID chỉ được phân loại 1 lần"""
+        vocab = Vocabulary()
+        calls = []
+        original = extractor._token_flags
+        monkeypatch.setattr(extractor, '_token_flags', lambda *args: calls.append(args[0]) or original(*args))
+
+        extractor.extract_ids(vocab.intern_all(['xin', 'kaka']), vocab)
+        res = extractor.extract_ids(vocab.intern_all(['kaka', 'kaka', 'chao']), vocab)
+        assert calls == ['xin', 'kaka', 'chao']
+        assert res.oov_tokens == ['kaka', 'kaka']
+
+    def test_lexicon_update_invalidates_flags(self, extractor):
+        """Thêm từ qua Lexicon -> version tăng -> flags theo ID tự tính lại"""
+        vocab = Vocabulary()
+        ids = vocab.intern_all(['kaka'])
+        assert extractor.extract_ids(ids, vocab).oov_count == 1
+
+        extractor.lexicon.add(['kaka'], LEX_FULL)
+        assert extractor.extract_ids(ids, vocab).oov_count == 0
+
+    def test_stale_ids_rejected(self, extractor):
+        vocab = Vocabulary(max_size=1)
+        stale = vocab.intern_all(['xin', 'kaka'])
+        vocab.intern_all(['chao'])
+        with pytest.raises(StaleTokenIdsError):
+            extractor.extract_ids(stale, vocab)
+
+    def test_set_full_dict_replaces_words(self, extractor):
+        vocab = Vocabulary()
+        ids = vocab.intern_all(['xin', 'kaka'])
+        extractor.full_dict = {'kaka'}
+        extractor.shadow_dict = set()
+        assert extractor.extract_ids(ids, vocab).oov_tokens == ['xin']
+        assert extractor.extract(['xin', 'kaka']).oov_tokens == ['xin']
+
+
 # ============================================================
 # INTEGRATION TEST & EXPORT
 # ============================================================
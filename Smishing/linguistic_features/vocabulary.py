@@ -0,0 +1,192 @@
+import os
+import sys
+import threading
+from array import array
+from typing import Iterable
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+# Import tuyệt đối
+from dicts.dict import remove_vietnamese_diacritics
+
+
+class StaleTokenIdsError(ValueError):
+    """Mảng ID thuộc generation cũ của Vocabulary (Vocabulary đã reset sau khi cấp các ID này)"""
+
+
+class TokenIds(array):
+    """Mảng ID (array 'I') kèm generation của Vocabulary đã cấp các ID"""
+
+    def __new__(cls, ids: Iterable[int] = (), generation: int = 0):
+        token_ids = super().__new__(cls, 'I', ids)
+        token_ids.generation = generation
+        return token_ids
+
+
+class VocabularyTable:
+    """
+    Dữ liệu của 1 generation: dict token -> ID và các thuộc tính theo ID (list song song, index = ID).
+    Reset tạo bảng mới thay vì sửa bảng cũ -> thread đang giữ bảng cũ vẫn đọc được dữ liệu nhất quán.
+    """
+
+    def __init__(self, generation: int):
+        self.generation = generation
+        self.ids = {}
+        self.tokens = []
+        self.stripped = []
+        self.lower = []
+        self.shadow = []
+        self.is_digit = []
+        self.length = []
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+
+class Vocabulary:
+    """
+    Từ vựng intern dùng chung giữa Layer 2, 3, 4: mỗi token (chuỗi) có 1 ID số nguyên ổn định
+    cùng các thuộc tính tính sẵn 1 lần, thay vì Layer 3/4 lặp lại lower/strip/bỏ dấu cho từng token.
+
+    Thuộc tính theo ID (list song song, index = ID), tính trên token đã strip():
+        tokens     : token gốc (khóa intern)
+        stripped   : token.strip()
+        lower      : stripped.lower()
+        shadow     : lower bỏ dấu (remove_vietnamese_diacritics)
+        is_digit   : stripped.isdigit()
+        length     : len(stripped)
+
+    Khi số token vượt max_size, từ vựng được reset ở đầu lần intern kế tiếp và generation tăng lên.
+    intern_all() trả về TokenIds mang generation; table() từ chối ID của generation cũ
+    (StaleTokenIdsError) thay vì trả về token khác đã được cấp lại cùng ID.
+    """
+
+    def __init__(self, max_size: int = 500_000):
+        if max_size < 1:
+            raise ValueError("max_size must be >= 1")
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._table = VocabularyTable(0)
+
+    # Thuộc tính của generation hiện tại
+    @property
+    def generation(self) -> int:
+        return self._table.generation
+
+    @property
+    def tokens(self) -> list:
+        return self._table.tokens
+
+    @property
+    def stripped(self) -> list:
+        return self._table.stripped
+
+    @property
+    def lower(self) -> list:
+        return self._table.lower
+
+    @property
+    def shadow(self) -> list:
+        return self._table.shadow
+
+    @property
+    def is_digit(self) -> list:
+        return self._table.is_digit
+
+    @property
+    def length(self) -> list:
+        return self._table.length
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+    @staticmethod
+    def _add(table: VocabularyTable, token: str) -> int:
+        """Thêm token mới vào bảng (gọi khi đã giữ lock)"""
+        token_id = table.ids.get(token)
+        if token_id is not None:
+            return token_id
+        token_id = len(table.tokens)
+        stripped = token.strip()
+        lower = stripped.lower()
+        table.tokens.append(token)
+        table.stripped.append(stripped)
+        table.lower.append(lower)
+        table.shadow.append(remove_vietnamese_diacritics(lower))
+        table.is_digit.append(stripped.isdigit())
+        table.length.append(len(stripped))
+        # Ghi dict sau cùng: thread đọc không khóa chỉ thấy ID khi thuộc tính đã sẵn sàng
+        table.ids[token] = token_id
+        return token_id
+
+    def intern(self, token: str) -> int:
+        """ID của 1 token (thêm vào từ vựng nếu chưa có)"""
+        return self.intern_all([token])[0]
+
+    def intern_all(self, tokens: Iterable[str]) -> TokenIds:
+        """
+        ID cho cả danh sách token (cùng 1 generation, ghi trong TokenIds.generation)
+        Token đã có chỉ tốn 1 lần tra dict của bảng hiện tại; token mới được thêm dưới lock.
+        """
+        tokens = list(tokens)
+        table = self._table  # Đọc 1 lần: dict ID và generation luôn thuộc cùng 1 bảng
+        ids = list(map(table.ids.get, tokens))
+        if None in ids or len(table) > self.max_size:
+            with self._lock:
+                table = self._table
+                if len(table) > self.max_size:
+                    table = self._table = VocabularyTable(table.generation + 1)
+                ids = [self._add(table, token) for token in tokens]
+        return TokenIds(ids, table.generation)
+
+    def table(self, token_ids: TokenIds) -> VocabularyTable:
+        """
+        Bảng thuộc tính của generation đã cấp token_ids
+
+        Raises:
+            StaleTokenIdsError: Vocabulary đã reset sau khi cấp token_ids
+        """
+        table = self._table
+        if token_ids.generation != table.generation:
+            raise StaleTokenIdsError(
+                f"Token IDs of generation {token_ids.generation}, vocabulary is at generation {table.generation}"
+            )
+        return table
+
+    def lookup(self, token_ids: TokenIds) -> list[str]:
+        """Token gốc theo danh sách ID"""
+        tokens = self.table(token_ids).tokens
+        return [tokens[i] for i in token_ids]
+
+
+class IdBitmap:
+    """
+    Bitmap (bytearray, 1 byte / ID) lưu kết quả tính theo ID của 1 layer, VD: whitelist / OOV flags.
+    Giá trị 0 = chưa tính. Tự reset khi đổi bảng của Vocabulary (Vocabulary khác hoặc generation mới)
+    hoặc khi version của dữ liệu layer dùng để tính (VD: Lexicon.version) thay đổi.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        # (bảng, version, states) gán nguyên khối -> thread khác không thấy states của bảng khác
+        self._current = (None, None, bytearray())
+
+    @property
+    def states(self) -> bytearray:
+        return self._current[2]
+
+    def for_table(self, table: VocabularyTable, version: int = 0) -> bytearray:
+        """bytearray đủ dài cho mọi ID hiện có của bảng"""
+        current_table, current_version, states = self._current
+        if current_table is not table or current_version != version:
+            states = bytearray()
+            self._current = (table, version, states)
+        missing = len(table) - len(states)
+        if missing > 0:
+            states.extend(bytes(missing))
+        return states
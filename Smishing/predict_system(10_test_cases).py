@@ -2,7 +2,6 @@ import joblib
 import logging
 import warnings
 import re
-import unicodedata
 
 warnings.filterwarnings("ignore")
 logging.getLogger('xgboost').setLevel(logging.WARNING)
@@ -10,6 +9,7 @@ logging.getLogger('xgboost').setLevel(logging.WARNING)
 try:
     from features import SmishingFeatureExtractor
     from domain_check import DomainVerifier
+    from dicts.dict import strip_accents
 except ImportError as e:
     print(f"❌ LỖI IMPORT SYSTEM: {e}")
     exit()
@@ -29,9 +29,7 @@ class SmishingDetectionSystem:
             exit()
 
     def _normalize_for_keywords(self, text: str) -> str:
-        text = unicodedata.normalize("NFKD", text)
-        text = "".join(ch for ch in text if not unicodedata.combining(ch))
-        text = text.lower()
+        text = strip_accents(text).lower()
         text = re.sub(r"[^a-z0-9\s]", " ", text)
 
         return re.sub(r"\s+", " ", text).strip()
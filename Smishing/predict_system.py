@@ -1,7 +1,6 @@
 import joblib
 import logging
 import warnings
-import unicodedata
 import re  # Cần import thêm re để xử lý Regex boundary
 
 warnings.filterwarnings("ignore")
@@ -10,6 +9,7 @@ logging.getLogger('xgboost').setLevel(logging.WARNING)
 try:
     from features import SmishingFeatureExtractor
     from domain_check import DomainVerifier
+    from dicts.dict import strip_accents
 except ImportError as e:
     print(f"❌ LỖI IMPORT SYSTEM: {e}")
     exit()
@@ -30,10 +30,8 @@ class SmishingDetectionSystem:
             exit()
 
     def _simple_normalize(self, text: str) -> str:
-        """Chuẩn hóa nhẹ để so khớp từ khóa."""
-        text = unicodedata.normalize("NFKD", text)
-        text = "".join(ch for ch in text if not unicodedata.combining(ch))
-        return text.lower()
+        """Chuẩn hóa nhẹ để so khớp từ khóa (tin nhắn ASCII bỏ qua NFKD)."""
+        return strip_accents(text).lower()
 
     def predict(self, text, sender_type='unknown'):
         # ---------------------------------------------------------
@@ -0,0 +1,92 @@
+import re
+import unicodedata
+
+# Chữ Cyrillic / Greek trông giống hệt chữ Latin (theo Unicode confusables.txt, chỉ giữ các cặp 1 ký tự -> 1 ký tự)
+# VD: "Ѵietcombаnk" (Ѵ U+0474, а U+0430) -> "Vietcombank"
+_CYRILLIC_CONFUSABLES = {
+    'А': 'A', 'В': 'B', 'Е': 'E', 'К': 'K', 'М': 'M', 'Н': 'H', 'О': 'O', 'Р': 'P',
+    'С': 'C', 'Т': 'T', 'Х': 'X', 'У': 'Y', 'Ү': 'Y', 'Ѕ': 'S', 'І': 'I', 'Ӏ': 'I',
+    'Ј': 'J', 'Ѵ': 'V', 'Ԛ': 'Q', 'Ԝ': 'W',
+    'а': 'a', 'е': 'e', 'о': 'o', 'р': 'p', 'с': 'c', 'у': 'y', 'ү': 'y', 'х': 'x',
+    'ѕ': 's', 'і': 'i', 'ј': 'j', 'ѵ': 'v', 'ԁ': 'd', 'һ': 'h', 'ӏ': 'l', 'ԛ': 'q', 'ԝ': 'w',
+}
+_GREEK_CONFUSABLES = {
+    'Α': 'A', 'Β': 'B', 'Ε': 'E', 'Ζ': 'Z', 'Η': 'H', 'Ι': 'I', 'Κ': 'K', 'Μ': 'M',
+    'Ν': 'N', 'Ο': 'O', 'Ρ': 'P', 'Τ': 'T', 'Υ': 'Y', 'Χ': 'X',
+    'α': 'a', 'γ': 'y', 'ι': 'i', 'κ': 'k', 'ν': 'v', 'ο': 'o', 'ρ': 'p', 'υ': 'u',
+    'ϲ': 'c', 'ϳ': 'j',
+}
+# Chữ Latin IPA / Thổ Nhĩ Kỳ không dùng trong tiếng Việt
+_LATIN_CONFUSABLES = {'ɑ': 'a', 'ɡ': 'g', 'ı': 'i'}
+
+# Khối ký tự mà NFKC đưa về đúng 1 ký tự ASCII in được: fullwidth (！..～) và chữ/số toán học (𝐕𝐢𝐞𝐭, 𝟎𝟗...)
+_NFKC_BLOCKS = (range(0xFF01, 0xFF5F), range(0x1D400, 0x1D800))
+
+
+def _build_homoglyph_table() -> dict:
+    """Bảng str.translate: code point look-alike -> ký tự Latin/ASCII (luôn 1 -> 1, độ dài text không đổi)"""
+    table = {}
+    for block in _NFKC_BLOCKS:
+        for code in block:
+            folded = unicodedata.normalize('NFKC', chr(code))
+            if len(folded) == 1 and folded.isascii() and folded.isprintable():
+                table[code] = folded
+    table[0x3000] = ' '  # Khoảng trắng fullwidth (ideographic space)
+    for mapping in (_CYRILLIC_CONFUSABLES, _GREEK_CONFUSABLES, _LATIN_CONFUSABLES):
+        table.update({ord(char): latin for char, latin in mapping.items()})
+    return table
+
+
+def _char_class(codes, extra: str = '') -> str:
+    """Character class regex, code point liên tiếp gom thành khoảng; extra: đoạn thêm vào cuối class"""
+    parts = []
+    codes = sorted(codes)
+    start = prev = codes[0]
+    for code in codes[1:] + [None]:
+        if code is not None and code == prev + 1:
+            prev = code
+            continue
+        parts.append(re.escape(chr(start)) if start == prev else f'{re.escape(chr(start))}-{re.escape(chr(prev))}')
+        if code is not None:
+            start = prev = code
+    return '[' + ''.join(parts) + extra + ']'
+
+
+class _HomoglyphTable(dict):
+    """Bảng str.translate: look-alike -> Latin, ký tự khác -> giữ. Tự điền ký tự đã gặp (tránh KeyError mỗi ký tự)."""
+
+    def __missing__(self, code):
+        self[code] = code
+        return code
+
+
+# Mapping tĩnh code point -> ký tự thay thế (không chứa các mục giữ nguyên mà _HomoglyphTable tự điền)
+HOMOGLYPHS = _build_homoglyph_table()
+_HOMOGLYPH_TABLE = _HomoglyphTable(HOMOGLYPHS)
+# Class có nhiều khoảng ngoài BMP bị sre so tuần tự từng khoảng (rất chậm), phần BMP thì tra bitmap O(1) mỗi ký tự:
+# - _HOMOGLYPH_PREFILTER: BMP chính xác + cả khối chữ toán học (có thể dương tính giả, chỉ dùng để lọc nhanh)
+# - _HOMOGLYPH_BMP_PATTERN / _HOMOGLYPH_PATTERN: đếm chính xác khi text không có / có ký tự ngoài BMP
+_BMP_CODES = [code for code in HOMOGLYPHS if code <= 0xFFFF]
+_HOMOGLYPH_PREFILTER = re.compile(_char_class(_BMP_CODES, extra='\U0001D400-\U0001D7FF'))
+_HOMOGLYPH_BMP_PATTERN = re.compile(_char_class(_BMP_CODES))
+_HOMOGLYPH_PATTERN = re.compile(_char_class(list(HOMOGLYPHS)))
+_NON_BMP_PATTERN = re.compile('[\U00010000-\U0010FFFF]')
+
+
+def fold_homoglyphs(text: str) -> tuple[str, int]:
+    """
+    Tầng 0 (trước Layer 1): đưa ký tự look-alike (Cyrillic/Greek, fullwidth, chữ toán học) về chữ Latin
+    để regex URL/SĐT của Layer 1 và leet/từ điển của Layer 2-4 thấy đúng chữ.
+
+    Text ASCII (phần lớn traffic) trả về ngay; text có dấu chỉ tốn 1 lần regex search,
+    1 lượt str.translate chỉ chạy khi thật sự có ký tự look-alike.
+
+    Returns:
+        (text đã fold, homoglyph_count = số ký tự bị thay)
+    """
+    if text.isascii():
+        return text, 0
+    if _HOMOGLYPH_PREFILTER.search(text) is None:
+        return text, 0
+    pattern = _HOMOGLYPH_PATTERN if _NON_BMP_PATTERN.search(text) else _HOMOGLYPH_BMP_PATTERN
+    return text.translate(_HOMOGLYPH_TABLE), len(pattern.findall(text))
@@ -1,66 +1,422 @@
+from bisect import bisect_right
 from collections import OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from urllib.parse import urlsplit
+import hashlib
+import ipaddress
+import json
+import logging
+import os
 import re
+import signal
+import threading
+import time
 import iocextract # pip install iocextract
+import tldextract # pip install tldextract
 import unicodedata
 
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class EntitySpan:
+    """1 thực thể Layer 1, offset tính trên text gốc đã chuẩn hóa NFC"""
+    start: int   # text[start:end] là đoạn chứa giá trị thực thể
+    end: int
+    label: str   # Label trong AggressiveMasker.patterns (url, mobile, code...)
+    value: str   # Giá trị giống metadata của mask() (URL đã bỏ khoảng trắng, STK không kèm từ khóa...)
+
+
+@dataclass(frozen=True)
+class UrlEntity:
+    """1 URL do Layer 1 bắt được, đã phân tích sẵn cho DomainVerifier"""
+    raw: str                # Đoạn text gốc (có thể chứa khoảng trắng obfuscate: "s h o p e e . v n")
+    cleaned: str            # Bỏ khoảng trắng và dấu câu cuối ('.,;:')
+    scheme: str             # 'http' / 'https' hoặc '' nếu không có
+    host: str               # Hostname viết thường (không port, không userinfo)
+    registered_domain: str  # domain + suffix theo Public Suffix List ('' nếu không có suffix, VD: IP)
+    suffix: str
+    is_ip: bool
+    path: str               # Phần sau host (path, query, fragment)
+
+
+# Số host giữ trong cache parse registered domain (spam lặp lại cùng vài domain)
+REGISTERED_DOMAIN_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=REGISTERED_DOMAIN_CACHE_SIZE)
+def parse_registered_domain(host: str) -> tuple[str, str]:
+    """
+    Tách (registered_domain, suffix) của host bằng tldextract, có memo (bounded LRU).
+    VD: 'vietcombank.ngrok-free.app' -> ('ngrok-free.app', 'app'); IP/không có suffix -> ('', '')
+    """
+    ext = tldextract.extract(host)
+    if not ext.suffix:
+        return "", ""
+    return f"{ext.domain}.{ext.suffix}".lower(), ext.suffix.lower()
+
+
+def parse_url(value: str, raw: str = None) -> UrlEntity:
+    """
+    Phân tích 1 URL (giá trị metadata của Layer 1, link trong kết quả search, href...) thành UrlEntity.
+
+    Args:
+        value: URL (có thể không có scheme, chứa khoảng trắng obfuscate)
+        raw: Đoạn text gốc tương ứng (mặc định = value)
+    """
+    cleaned = ''.join(value.split()).rstrip('.,;:')
+    scheme, sep, rest = cleaned.partition('://')
+    if sep and scheme.lower() in ('http', 'https'):
+        scheme = scheme.lower()
+    else:
+        scheme, rest = '', cleaned
+
+    try:
+        parts = urlsplit('http://' + rest)
+        host = (parts.hostname or '').rstrip('.')
+        path = rest[len(parts.netloc):]
+    except ValueError:  # VD: IPv6 thiếu ngoặc
+        host, path = '', ''
+
+    try:
+        ipaddress.ip_address(host)
+        is_ip = True
+    except ValueError:
+        is_ip = False
+
+    registered_domain, suffix = parse_registered_domain(host) if host else ("", "")
+    return UrlEntity(raw=value if raw is None else raw, cleaned=cleaned, scheme=scheme, host=host,
+                     registered_domain=registered_domain, suffix=suffix, is_ip=is_ip, path=path)
+
+
+def build_trie_regex(words) -> str:
+    """
+    Biên dịch danh sách từ thành alternation đã gộp tiền tố (trie regex), VD:
+    ['bank', 'banking', 'bidv'] -> 'b(?:ank(?:|ing)|idv)'.
+
+    Match giống hệt alternation phẳng '|'.join(words) (cùng flags): các nhánh con bắt đầu bằng ký tự khác
+    nhau nên loại trừ nhau, chỉ điểm kết thúc từ ('') cạnh tranh với nhánh con -> nhánh con bị tách
+    quanh điểm kết thúc để giữ đúng thứ tự thử của danh sách. Ký tự được escape -> từ là literal.
+    Giả định 2 nhánh anh em không phải biến thể hoa/thường của nhau khi dùng re.IGNORECASE.
+    """
+    def emit(suffixes):
+        items = []      # [(ký tự đầu, [phần còn lại...])], ('', None) = kết thúc từ
+        end_at = -1     # Vị trí item kết thúc từ (nhánh sau nó không được gộp với nhánh trước nó)
+        for suffix in suffixes:
+            if not suffix:
+                end_at = len(items)
+                items.append(('', None))
+                continue
+            for i in range(len(items) - 1, end_at, -1):
+                if items[i][0] == suffix[0]:
+                    items[i][1].append(suffix[1:])
+                    break
+            else:
+                items.append((suffix[0], [suffix[1:]]))
+
+        sources = ['' if rest is None else re.escape(ch) + emit(rest) for ch, rest in items]
+        if len(sources) == 1:
+            return sources[0]
+        return '(?:' + '|'.join(sources) + ')'
+
+    # Từ lặp lại không bao giờ được thử tới (bản đầu tiên đã thử cùng nhánh)
+    words = list(dict.fromkeys(words))
+    return emit(words) if words else ''
+
+
 class AggressiveMasker:
-    def __init__(self):
-        # Sử dụng OrderedDict để quản lý thứ tự ưu tiên xử lý
-        # Key: Tên loại thực thể
-        # Value: Tuple (Token thay thế, Regex Pattern hoặc Hàm xử lý)
-        self.patterns = OrderedDict([
-            # 1. Nền tảng cụ thể (Zalo/Tele) cần bắt trước khi bắt URL chung
-            ('zalo', ('<APP_LINK>', r'(?:https?:\/\/)?(?:www\.)?(?:zalo\.me|zalo\.vn)\/[\w\.-]+')),
-            ('telegram', ('<APP_LINK>', r'(?:https?:\/\/)?(?:www\.)?(?:t\.me|telegram\.me)\/[\w_]+')),
-            
-            # 2. Email (Thường đi kèm trong URL, nên xử lý sau hoặc cùng lúc)
-            ('email', ('<EMAIL>', r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b')),
+    # File cấu hình mặc định: pattern thực thể, TLD, từ khóa, whitelist shortcode, tiền tố code
+    DEFAULT_CONFIG_PATH = Path(__file__).with_name('layer1_config.json')
 
-            # 3. URL (Kết hợp iocextract và Aggressive Regex)
-            ('url', ('<URL>', self._custom_url_masker)), 
+    # Thứ tự ưu tiên xử lý các loại thực thể (cấu hình phải khai báo đúng thứ tự này)
+    ENTITY_LABELS = ('zalo', 'telegram', 'email', 'url', 'bank_acc', 'hotline', 'landline',
+                     'mobile', 'shortcode', 'datetime', 'money', 'code')
 
-            # 4. BANK ACCOUNT (bắt stk)
-            ('bank_acc', ('<BANK_ACC>', self._custom_bank_masker)),
+    # Thực thể xử lý bằng hàm custom (cấu hình chỉ khai báo token, regex nằm trong code)
+    # Danh sách từ được biên dịch thành alternation (trie regex). Pattern thực thể trong cấu hình
+    # có thể tham chiếu bằng placeholder '{tên danh sách}', VD: money -> '{money_units}'
+    WORD_LISTS = ('safe_tlds', 'risky_tlds', 'bank_keywords', 'shortcode_context_keywords',
+                  'money_units', 'known_shortcodes')
 
-            # 5A. HOTLINE (1800/1900) - Ưu tiên bắt trước Mobile
-            # Bắt: 19001009, 1900 1009, 1900.55.55.88, 1800-1090
-            ('hotline', ('<PHONE>', r'(?<!\d)(?:1800|1900)(?:[\s\.-]?\d){4,6}(?!\d)')),
+    CUSTOM_MASKERS = {
+        'url': '_custom_url_masker',
+        'bank_acc': '_custom_bank_masker',
+        'shortcode': '_custom_shortcode_masker',
+        'code': '_custom_code_masker',
+    }
 
-            # 5B. MÁY BÀN (LANDLINE - Đầu 02x)
-            # Bắt: 024.3838.3838, 028 3939 3939 (Tổng 11 số)
-            ('landline', ('<PHONE>', r'(?<!\d)02\d(?:[\s\.-]?\d){8}(?!\d)')),
+    # Thứ tự stage = đúng thứ tự các lần re.sub trong mask(), dùng cho extract_spans() và batch 'joined'
+    # (key trong registry compiled, label metadata, loại xử lý)
+    STAGES = [
+        ('zalo', 'zalo', 'plain'),
+        ('telegram', 'telegram', 'plain'),
+        ('email', 'email', 'plain'),
+        ('url_broken_shortener', 'url', 'url'),
+        ('url_heavily_obfuscated', 'url', 'url_obfuscated'),
+        ('url_protocol', 'url', 'url'),
+        ('url_schemeless_safe', 'url', 'url'),
+        ('url_schemeless_risky', 'url', 'url'),
+        ('bank_acc', 'bank_acc', 'keyword'),
+        ('hotline', 'hotline', 'plain'),
+        ('landline', 'landline', 'plain'),
+        ('mobile', 'mobile', 'plain'),
+        ('shortcode_whitelist', 'shortcode', 'plain'),
+        ('shortcode_context', 'shortcode', 'keyword'),
+        ('datetime', 'datetime', 'plain'),
+        ('money', 'money', 'plain'),
+        ('code_candidate', 'code', 'code'),
+        ('otp', 'code', 'otp'),
+    ]
 
-            # 5C. DI ĐỘNG (MOBILE - Đầu 03/05/07/08/09 hoặc +84)
-            # Loại trừ trường hợp 1900 đã bắt ở trên
-            ('mobile', ('<PHONE>', r'(?<!\d)(?:(?:[+]84|84)[\s\.-]?\d(?:[\s\.-]?\d){8}|0[35789](?:[\s\.-]?\d){8})(?!\d)')),
-            
-            # 5D. SHORTCODE (Đầu số dịch vụ ngắn 3-6 số)
-            ('shortcode', ('<PHONE>', self._custom_shortcode_masker)),
+    # Ký tự ghép các tin nhắn trong batch mode 'joined': không phải \w, \d, \s và không nằm trong
+    # class ký tự nào của các pattern -> không match nào vượt qua được, ranh giới \b/lookaround giữ nguyên
+    JOIN_SEPARATOR = '\x00'
 
-            # 6. Ngày giờ (Datetime)
-            # Bắt: 15/05, 10:30, 10h30, 15p, 30 ngay
-            ('datetime', ('<TIME>', r'\b\d{1,2}[/-]\d{1,2}(?:[/-]\d{2,4})?\b|\b\d{1,2}[:h]\d{2}\b|\b\d+\s?(?:phút|p|giờ|h|ngày|tháng|năm)\b')),
-            
-            # 7. Tiền tệ (Money)
-            # Bắt: 100k, 500.000d, 1 triệu, 50 USD
-            ('money', ('<MONEY>', r'(?i)\b(?:\d+(?:[.,]\d+)*\s*(?:triệu|trieu|tr|tỷ|ty|nghìn|nghin|ngàn|ngan|đồng|dong|vnd|vnđ|usd|k|đ|d)\b|[1-9]\d{0,2}(?:[.,]\d{3})+)(?!\d)')),
-            
-            # 8. Code & OTP (Xử lý cuối cùng để tránh ăn vào số trong URL/Date)
-            ('code', ('<CODE>', self._custom_code_masker))
-        ])
+    # Capability bits của prefilter (tính 1 lần cho mỗi tin nhắn)
+    CAP_DIGIT = 1          # Có chữ số (\d)
+    CAP_DOT = 2            # Có '.' hoặc biến thể dấu chấm trong URL obfuscate (',', 'dot')
+    CAP_AT = 4             # Có '@'
+    CAP_SLASH = 8          # Có '/'
+    CAP_BANK_KEYWORD = 16  # Có từ khóa ngân hàng/STK (chỉ kiểm tra khi có chữ số)
 
-    def _custom_url_masker(self, text, token_tag):
-        extracted = []
-        
-        # 1. CẬP NHẬT TLDs
-        # Thêm app, io, dev, cloud... (các TLD hiện đại hacker hay dùng)
-        safe_tlds = r'vn|com|net|org|edu|gov|int|mil|biz|info|mobi|aero|asia|jobs|museum|app|io|dev|cloud'
-        
-        risky_tlds = (
-            r'name|ly|me|gl|to|co|cc|ws|tk|ga|cf|ml|at|su|bid|cfd|'
-            r'xyz|top|icu|vip|pro|club|win|life|fun|tech|site|online|store|shop|live|website'
+    # Nhóm pattern -> các capability bắt buộc. Thiếu 1 bit bất kỳ thì cả nhóm không thể match.
+    # Token chèn vào (<URL>, <PHONE>...) không chứa các ký tự trên nên capability tính trên
+    # text gốc luôn bao trùm text ở các stage sau.
+    PREFILTER_REQUIREMENTS = {
+        'zalo': CAP_DOT | CAP_SLASH,
+        'telegram': CAP_DOT | CAP_SLASH,
+        'email': CAP_AT | CAP_DOT,
+        'url': CAP_DOT,
+        'bank_acc': CAP_DIGIT | CAP_BANK_KEYWORD,
+        'hotline': CAP_DIGIT,
+        'landline': CAP_DIGIT,
+        'mobile': CAP_DIGIT,
+        'shortcode': CAP_DIGIT,
+        'datetime': CAP_DIGIT,
+        'money': CAP_DIGIT,
+        'code': CAP_DIGIT,
+    }
+
+    def __init__(self, prefilter: bool = True, cache_size: int = 4096,
+                 max_length: int = None, time_budget_ms: float = None, config_path: str = None,
+                 trie_regex: bool = True):
+        """
+        Args:
+            prefilter: Bỏ qua các nhóm pattern không thể match dựa trên capability của tin nhắn
+            cache_size: Số kết quả mask() tối đa giữ trong LRU cache (0 = tắt cache)
+            max_length: Bounded-time mode - tin nhắn dài hơn được mask theo từng đoạn <= max_length ký tự
+            time_budget_ms: Bounded-time mode - ngân sách thời gian cho mỗi tin nhắn; hết ngân sách thì
+                            bỏ qua các regex URL còn lại (các entity khác vẫn được mask).
+                            Ngân sách chỉ được kiểm tra giữa các lần gọi regex nên cần đi kèm
+                            max_length để chặn thời gian của từng lần gọi.
+            config_path: File cấu hình JSON (mặc định DEFAULT_CONFIG_PATH), nạp lại bằng reload_config()
+            trie_regex: Biên dịch các danh sách từ (WORD_LISTS) thành trie regex thay vì alternation phẳng
+                        (cùng kết quả match)
+        """
+        if cache_size < 0:
+            raise ValueError("cache_size must be >= 0")
+        if max_length is not None and max_length < 1:
+            raise ValueError("max_length must be >= 1")
+        self.max_length = max_length
+        self.time_budget_ms = time_budget_ms
+        # Thống kê bounded-time mode: số tin bị cắt đoạn / số lần hết ngân sách thời gian
+        self.budget_stats = {'segmented': 0, 'over_budget': 0}
+        self.prefilter = prefilter
+        self.trie_regex = trie_regex
+
+        # Thống kê prefilter: số tin nhắn đã xử lý và số lần mỗi nhóm pattern bị bỏ qua
+        self.prefilter_stats = {'messages': 0, 'skipped': {label: 0 for label in self.PREFILTER_REQUIREMENTS}}
+
+        # LRU cache cho mask(): spam gửi hàng loạt cùng 1 nội dung -> chỉ mask 1 lần
+        # Key: hash nội dung, Value: (masked_text, metadata dạng tuple - không thể bị sửa từ bên ngoài)
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        # Lock dùng chung cho cache và mọi bộ đếm thống kê (masker dùng chung giữa các thread)
+        self._cache_lock = threading.Lock()
+        self.cache_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+        # Cấu hình Layer 1 (pattern, TLD, từ khóa, whitelist) đọc từ file JSON có version.
+        # Bộ compiled đang dùng nằm trong self._config và chỉ được thay nguyên khối (reload_config);
+        # mỗi tin nhắn ghim 1 bộ compiled từ đầu đến cuối (self._pinned) nên reload giữa chừng không ảnh hưởng.
+        self._pinned = threading.local()
+        self._reload_lock = threading.Lock()
+        self._reload_requested = False
+        self._generation = 0
+        self.config_path = None
+        self.reload_config(config_path)
+
+    @property
+    def _compiled(self) -> dict:
+        """Bộ compiled của tin nhắn đang xử lý trên thread hiện tại (nếu có), ngược lại là bộ mới nhất"""
+        return getattr(self._pinned, 'config', None) or self._config
+
+    @contextmanager
+    def _pin_config(self):
+        """Ghim bộ compiled hiện tại cho thread này đến hết khối with (lồng nhau -> giữ bộ ngoài cùng)"""
+        pinned = getattr(self._pinned, 'config', None)
+        if pinned is not None:
+            yield pinned
+            return
+        if self._reload_requested:
+            self._reload_from_signal()
+        config = self._pinned.config = self._config
+        try:
+            yield config
+        finally:
+            self._pinned.config = None
+
+    def reload_config(self, config_path: str = None) -> str:
+        """
+        Nạp (lại) cấu hình Layer 1 từ file JSON, biên dịch toàn bộ rồi thay bộ compiled đang dùng bằng 1 phép gán.
+        Tin nhắn đang xử lý tiếp tục dùng bộ cũ. File lỗi -> raise, cấu hình đang chạy giữ nguyên.
+
+        Args:
+            config_path: File cấu hình (mặc định: file đang dùng, lần đầu là DEFAULT_CONFIG_PATH)
+
+        Returns:
+            version của cấu hình vừa nạp
+        """
+        with self._reload_lock:
+            path = Path(config_path or self.config_path or self.DEFAULT_CONFIG_PATH)
+            with open(path, encoding='utf-8') as f:
+                settings = self._parse_config(json.load(f))
+            compiled = self._compile_patterns(settings)
+            compiled['generation'] = self._generation + 1
+
+            self._generation += 1
+            self._config = compiled
+            self.config_path = str(path)
+            self.config_version = settings['version']
+            # Thuộc tính public mô tả cấu hình mới nhất (xử lý nội bộ chỉ đọc qua self._compiled)
+            self.patterns = settings['patterns']
+            self.safe_tlds = settings['safe_tlds']
+            self.risky_tlds = settings['risky_tlds']
+            self.bank_keywords = settings['bank_keywords']
+            self.shortcode_context_keywords = settings['shortcode_context_keywords']
+            self.money_units = settings['money_units']
+            self.known_shortcodes = settings['known_shortcodes']
+            self.valid_code_prefixes = settings['valid_code_prefixes']
+
+        # Kết quả cũ không còn đúng với cấu hình mới (key cache cũng chứa generation)
+        self.clear_cache()
+        return self.config_version
+
+    def install_reload_signal(self, signum: int = None):
+        """
+        Nạp lại cấu hình khi nhận signal (mặc định SIGHUP). Phải gọi từ main thread.
+        Handler chỉ đặt cờ; việc nạp lại diễn ra trước tin nhắn kế tiếp (tránh deadlock với lock của cache).
+        """
+        if signum is None:
+            signum = signal.SIGHUP
+
+        def request_reload(_signum, _frame):
+            self._reload_requested = True
+
+        signal.signal(signum, request_reload)
+
+    def _reload_from_signal(self):
+        self._reload_requested = False
+        try:
+            version = self.reload_config()
+            logger.info(f"Layer 1 config reloaded: {self.config_path} (version {version})")
+        except Exception as e:
+            # Chạy bên trong mask() của traffic thật -> mọi lỗi chỉ được log, giữ cấu hình đang chạy
+            logger.error(f"Layer 1 config reload failed, keeping version {self.config_version}: {e}")
+
+    def _parse_config(self, config: dict) -> dict:
+        """
+        Kiểm tra và chuyển cấu hình JSON về dạng dùng để biên dịch.
+        Các danh sách từ (WORD_LISTS) được giữ nguyên để _compile_patterns biên dịch thành alternation.
+        Mọi lỗi cấu trúc (thiếu khóa, sai kiểu) đều raise ValueError.
+        """
+        if not isinstance(config, dict):
+            raise ValueError("Layer 1 config must be a JSON object")
+        try:
+            version = str(config['version'])
+            patterns = config['patterns']
+            lists = {key: config[key] for key in self.WORD_LISTS + ('valid_code_prefixes',)}
+        except KeyError as e:
+            raise ValueError(f"Invalid Layer 1 config: missing {e}") from None
+
+        if not isinstance(patterns, dict):
+            raise ValueError("Layer 1 config 'patterns' must be an object of label -> entry")
+        if tuple(patterns) != self.ENTITY_LABELS:
+            raise ValueError(f"Layer 1 config patterns must be {self.ENTITY_LABELS} in this order, got {tuple(patterns)}")
+        for key, items in lists.items():
+            if not isinstance(items, list) or not all(isinstance(item, str) and item for item in items):
+                raise ValueError(f"Layer 1 config '{key}' must be a list of non-empty strings")
+            if not items and key != 'known_shortcodes':
+                raise ValueError(f"Layer 1 config '{key}' must not be empty")
+
+        entries = OrderedDict()
+        for label, entry in patterns.items():
+            if not isinstance(entry, dict):
+                raise ValueError(f"Layer 1 config pattern '{label}' must be an object")
+            tag = entry.get('tag')
+            if not isinstance(tag, str) or not tag:
+                raise ValueError(f"Layer 1 config pattern '{label}' needs a non-empty string 'tag'")
+            if 'regex' in entry and not isinstance(entry['regex'], str):
+                raise ValueError(f"Layer 1 config pattern '{label}' 'regex' must be a string")
+            if label in self.CUSTOM_MASKERS:
+                if 'regex' in entry:
+                    raise ValueError(f"Layer 1 config pattern '{label}' is handled in code and takes no 'regex'")
+                logic = getattr(self, self.CUSTOM_MASKERS[label])
+            elif 'regex' not in entry:
+                raise ValueError(f"Layer 1 config pattern '{label}' needs a 'regex'")
+            else:
+                logic = entry['regex']
+            entries[label] = (tag, logic)
+
+        return {
+            'version': version,
+            'patterns': entries,
+            'word_lists': {key: tuple(lists[key]) for key in self.WORD_LISTS},
+            # Dạng chuỗi '|' cho thuộc tính public (tương thích cách khai báo cũ)
+            'safe_tlds': '|'.join(lists['safe_tlds']),
+            'risky_tlds': '|'.join(lists['risky_tlds']),
+            'bank_keywords': '|'.join(lists['bank_keywords']),
+            'shortcode_context_keywords': '|'.join(lists['shortcode_context_keywords']),
+            'money_units': '|'.join(lists['money_units']),
+            'known_shortcodes': list(lists['known_shortcodes']),
+            'valid_code_prefixes': frozenset(lists['valid_code_prefixes']),
+        }
+
+    def _compile_patterns(self, settings: dict) -> dict:
+        """
+        Biên dịch toàn bộ regex của Layer 1 (pattern thực thể + regex con trong các hàm custom).
+
+        Args:
+            settings: Cấu hình đã kiểm tra (_parse_config)
+
+        Returns:
+            dict: {
+                'entities': OrderedDict label -> (token_tag, compiled regex hoặc hàm custom),
+                '<tên regex con>': compiled regex, ...
+                'version', 'valid_code_prefixes': lấy từ cấu hình
+            }
+        """
+        compiled = {'version': settings['version'], 'valid_code_prefixes': settings['valid_code_prefixes']}
+
+        # Danh sách từ -> alternation (trie regex gộp tiền tố hoặc alternation phẳng, cùng kết quả match)
+        alternation = build_trie_regex if self.trie_regex else '|'.join
+        words = {key: alternation(items) for key, items in settings['word_lists'].items()}
+
+        def expand(pattern):
+            for key, source in words.items():
+                pattern = pattern.replace('{' + key + '}', source)
+            return pattern
+
+        # Pattern thực thể thuần: dùng cùng flags với re.findall/re.sub trước đây
+        compiled['entities'] = OrderedDict(
+            (label, (token_tag, logic if callable(logic) else re.compile(expand(logic), re.IGNORECASE | re.UNICODE)))
+            for label, (token_tag, logic) in settings['patterns'].items()
         )
 
+        # --- URL ---
         # 2. XỬ LÝ ĐẶC BIỆT: BROKEN SHORTENERS
         # Bắt riêng bit.ly, t.ly, tinyurl bị chèn khoảng trắng: "bi t . ly", "bit .ly"
         # Logic: (b i t) + (khoảng trắng/dấu chấm lộn xộn) + (l y)
@@ -99,19 +455,235 @@ class AggressiveMasker:
         # 4. SCHEMELESS (Giữ nguyên logic cũ để an toàn)
         # Safe TLDs (Fuzzy - cho phép khoảng trắng)
         schemeless_safe_pattern = (
-            r'(?i)\b(?:[\w\-]+)(?:\s*\.\s*[\w\-]+)*\s*\.\s*(?:' + safe_tlds + r')\b(?:[\/][\w\-\.\?\=\&\%]*)?'
+            r'(?i)\b(?:[\w\-]+)(?:\s*\.\s*[\w\-]+)*\s*\.\s*(?:' + words['safe_tlds'] + r')\b(?:[\/][\w\-\.\?\=\&\%]*)?'
         )
         # Risky TLDs (Strict - bắt buộc dính liền)
         schemeless_risky_pattern = (
-            r'(?i)\b(?:[\w\-]+)(?:\.[\w\-]+)*\.(?:' + risky_tlds + r')\b(?:[\/][\w\-\.\?\=\&\%]*)?'
+            r'(?i)\b(?:[\w\-]+)(?:\.[\w\-]+)*\.(?:' + words['risky_tlds'] + r')\b(?:[\/][\w\-\.\?\=\&\%]*)?'
+        )
+
+        compiled['url_broken_shortener'] = re.compile(broken_shortener_pattern)
+        compiled['url_heavily_obfuscated'] = re.compile(heavily_obfuscated_pattern)
+        compiled['url_protocol'] = re.compile(protocol_agnostic_pattern)
+        compiled['url_schemeless_safe'] = re.compile(schemeless_safe_pattern)
+        compiled['url_schemeless_risky'] = re.compile(schemeless_risky_pattern)
+        # Cleanup: ký tự URL còn sót dính sau token <URL>
+        url_tag = settings['patterns']['url'][0]
+        compiled['url_tail'] = re.compile(rf'{re.escape(url_tag)}[\w\.\-\/]+')
+        compiled['whitespace'] = re.compile(r'\s+')
+
+        # --- BANK ACCOUNT ---
+        bank_keywords = words['bank_keywords']
+        # Regex giải thích:
+        # 1. (?i)\b(?:...): Bắt đầu bằng một trong các từ khóa trên (case-insensitive)
+        # 2. (?:[\s:\.\-]*?): Cho phép các ký tự ngăn cách (dấu hai chấm, khoảng trắng, dấu chấm...)
+        # 3. (\d{8,19}): Bắt dãy số chính (STK thường từ 8 đến 19 số)
+        # 4. (?!\d): Đảm bảo kết thúc dãy số (không cắt giữa chừng)
+        # 5. Lookbehind/Context check: Đảm bảo số này gắn liền với keyword
+        # LƯU Ý: trong rf-string, {8,19} được format thành tuple -> regex thực tế là \d(8, 19)
+        # (1 chữ số + chuỗi "8, 19"), nên STK 8-19 số không bao giờ match. Giữ nguyên như bản gốc vì
+        # model đã train trên feature này; sửa thành {{8,19}} là thay đổi feature, cần train lại model.
+        compiled['bank_acc'] = re.compile(
+            rf'(?i)\b({bank_keywords})(?:[\s:\.\-\|]*?)(\d{8,19})(?!\d)'
         )
 
+        # --- SHORTCODE ---
+        # 1. Tối ưu Whitelist: Gộp thành 1 Regex duy nhất thay vì for loop
+        # Tạo regex dạng: \b(191|900|999|...)\b
+        compiled['shortcode_whitelist'] = (
+            re.compile(r'\b(' + words['known_shortcodes'] + r')\b')
+            if settings['known_shortcodes'] else None
+        )
+        shortcode_context_keywords = words['shortcode_context_keywords']
+        # 2. Xử lý theo Context (Ngữ cảnh)
+        # Regex: (Nhóm từ khóa) + (Khoảng trắng) + (Nhóm số Shortcode)
+        # Group 1: Từ khóa (gửi, soạn...)
+        # Group 2: Số điện thoại
+        compiled['shortcode_context'] = re.compile(
+            rf'(?i)\b({shortcode_context_keywords})\s+(\d{{3,6}})\b'
+        )
+
+        # --- KEYWORD ANCHORS (bank, shortcode context) ---
+        # Tìm vị trí từ khóa bằng str.find trên text đã casefold, chỉ chạy regex tại các vị trí đó
+        compiled['bank_anchors'] = self._build_keyword_anchors(settings['bank_keywords'])
+        compiled['shortcode_anchors'] = self._build_keyword_anchors(settings['shortcode_context_keywords'])
+
+        # --- CODE & OTP ---
+        # Regex bắt chuỗi: Bắt đầu bằng Chữ, chứa Số
+        compiled['code_candidate'] = re.compile(r'\b[A-Z]+[0-9]+[A-Z0-9]*\b')
+        compiled['code_prefix'] = re.compile(r'^[A-Z]+')
+        compiled['code_digit'] = re.compile(r'\d')
+        compiled['code_leet'] = re.compile(r'^[A-Z]+[01][A-Z]+$')
+        # OTP (Số thuần túy 4-6 ký tự)
+        compiled['otp'] = re.compile(r'(?<![\w<])\d{4,6}(?![\w>])')
+
+        # --- PREFILTER ---
+        compiled['cap_digit'] = re.compile(r'\d')
+        compiled['cap_dot_word'] = re.compile(r'(?i)dot')
+
+        # --- JOINED BATCH ---
+        # Strip từng tin nhắn sau bước gom khoảng trắng của URL masker
+        compiled['join_strip'] = re.compile(rf' ?{re.escape(self.JOIN_SEPARATOR)} ?')
+
+        # --- STAGES (extract_spans / batch 'joined') ---
+        compiled['stages'] = self._build_stages(compiled)
+
+        return compiled
+
+    # Ký tự mà re.IGNORECASE coi là tương đương chữ ASCII nhưng str.lower() không đổi ('ı' ~ 'i', 'ſ' ~ 's')
+    _CASEFOLD_FIXES = str.maketrans({'ı': 'i', 'ſ': 's'})
+
+    @staticmethod
+    def _build_keyword_anchors(keywords: str) -> tuple:
+        """
+        Chuyển alternation từ khóa (chuỗi regex dạng 'stk|tài khoản|...') thành tuple từ khóa
+        đã lower. Bỏ các từ khóa có tiền tố là từ khóa khác (cùng vị trí bắt đầu, VD: 'banking' vs 'bank').
+        """
+        words = []
+        for word in keywords.split('|'):
+            if any(ch in word for ch in '\\.^$*+?{}[]()'):
+                raise ValueError(f"Keyword anchor must be a literal: {word!r}")
+            words.append(word.lower())
+        words = sorted(set(words))
+        return tuple(w for w in words if not any(w != other and w.startswith(other) for other in words))
+
+    def _keyword_hits(self, text: str, anchors: tuple):
+        """
+        Vị trí (tăng dần) mà 1 từ khóa trong anchors xuất hiện (không phân biệt hoa thường).
+        Returns: list vị trí, hoặc None nếu không map được vị trí (lower() làm đổi độ dài text)
+        """
+        folded = text.lower()
+        if len(folded) != len(text):
+            return None
+        if 'ı' in folded or 'ſ' in folded:
+            folded = folded.translate(self._CASEFOLD_FIXES)
+
+        hits = set()
+        find = folded.find
+        for word in anchors:
+            pos = find(word)
+            while pos != -1:
+                hits.add(pos)
+                pos = find(word, pos + 1)
+        return sorted(hits)
+
+    def _anchored_sub(self, regex, anchors: tuple, replacer, text: str) -> tuple[str, bool]:
+        """
+        Tương đương regex.sub(replacer, text) với regex bắt đầu bằng 1 từ khóa trong anchors,
+        nhưng chỉ thử match tại vị trí có từ khóa thay vì mọi vị trí.
+
+        Returns: (text mới, có từ khóa hay không)
+        """
+        hits = self._keyword_hits(text, anchors)
+        if hits is None:
+            return regex.sub(replacer, text), True
+        if not hits:
+            return text, False
+
+        pieces = []
+        cursor = 0
+        for pos in hits:
+            if pos < cursor:
+                continue
+            match = regex.match(text, pos)
+            if match is None:
+                continue
+            pieces.append(text[cursor:pos])
+            pieces.append(replacer(match))
+            cursor = match.end()
+        if not pieces:
+            return text, True
+        pieces.append(text[cursor:])
+        return ''.join(pieces), True
+
+    def _build_stages(self, compiled: dict) -> list:
+        """
+        Các stage theo thứ tự STAGES, bỏ stage không có regex (VD: whitelist shortcode rỗng).
+
+        Returns:
+            list: [(key, label, kind, token_tag, compiled regex), ...]
+        """
+        stages = []
+        for key, label, kind in self.STAGES:
+            regex = compiled[key] if key in compiled else compiled['entities'][key][1]
+            if regex is None:
+                continue
+            stages.append((key, label, kind, compiled['entities'][label][0], regex))
+        return stages
+
+    def _is_obfuscated_url(self, url: str) -> bool:
+        """Các rule lọc false positive cho pattern HEAVILY OBFUSCATED DOMAINS"""
+        # RULE 1: Space density (giảm xuống 5% để bắt được "shopee . vn")
+        space_density = url.count(' ') / len(url) if url else 0
+        if space_density < 0.05:  # Chỉ 5% space threshold
+            return False
+        
+        # RULE 2: Context filtering (giữ nguyên)
+        context_words = ['microsoft', 'apple', 'google', 'facebook', 'truy cập', 'website', 'trang web']
+        if any(word in url.lower() for word in context_words):
+            return False
+        
+        # RULE 3: Length validation (tăng lên để tránh false positive)
+        if len(url) < 8:  # Domain quá ngắn
+            return False
+        
+        # RULE 4: Kiểm tra có đủ obfuscated features
+        has_space_in_domain = ' ' in url.split('.')[0] if '.' in url else ' ' in url
+        has_dot_obfuscation = ('(.)' in url or ' . ' in url or '( . )' in url)
+        
+        if not (has_space_in_domain or has_dot_obfuscation):
+            return False  # Không đủ dấu hiệu obfuscated
+        
+        return True
+
+    def _is_service_code(self, val: str) -> bool:
+        """Phân loại chuỗi Chữ hoa + Số: Code gói cước (True) hay Leetspeak/khác (False)"""
+        compiled = self._compiled
+        
+        # --- LOGIC PHÂN LOẠI ---
+        
+        # Rule 1: Độ dài. Code gói cước thường ngắn (3-8 ký tự).
+        # Leet speak spam thường dài (ví dụ: KHUYENMA1 -> 9 ký tự)
+        if len(val) > 8: 
+            return False # Trả về nguyên gốc để xử lý như Leet word
+
+        # Rule 2: Kiểm tra Prefix
+        match_prefix = compiled['code_prefix'].match(val)
+        if match_prefix:
+            prefix = match_prefix.group(0)
+            
+            # === THÊM RULE MỚI: Phân biệt Leetspeak ===
+            # Leetspeak: Chỉ có 1 số (0 hoặc 1) xen giữa các chữ
+            # Code: Thường có nhiều số liên tiếp hoặc số > 1
+            
+            digits = compiled['code_digit'].findall(val)
+            
+            # Nếu chỉ có 1 số VÀ số đó là 0 hoặc 1 → Có thể là Leetspeak
+            if len(digits) == 1 and digits[0] in '01':
+                # Kiểm tra thêm: Có chữ SAU số không? (pattern Leet: C0NG, T1EN)
+                if compiled['code_leet'].match(val):
+                    return False  # Leetspeak → Không mask
+            
+            # Nếu prefix hợp lệ VÀ không phải Leetspeak → Mask
+            if prefix in compiled['valid_code_prefixes']:
+                return True
+        
+        return False
+
+    def _is_otp(self, val: str) -> bool:
+        """OTP 4-6 số, loại trừ năm (19xx, 20xx)"""
+        return not (val.startswith(('19', '20')) and len(val) == 4)
+
+    def _custom_url_masker(self, text, token_tag, deadline: float = None):
+        extracted = []
+        compiled = self._compiled
+
         # --- THỰC THI REPLACEMENT ---
         def replace_and_extract(match):
             url = match.group(0)
             # Clean URL: Xóa hết khoảng trắng thừa để Domain Check hoạt động được
             # VD: "bi t . ly" -> "bit.ly"
-            clean_url = re.sub(r'\s+', '', url)
+            clean_url = compiled['whitespace'].sub('', url)
             
             # Xử lý riêng cho trường hợp dấu chấm bị tách: "bit . ly" -> "bit.ly"
             # Nhưng cẩn thận không nối "com . vn" thành "com.vn" nếu logic trên chưa xử lý
@@ -122,76 +694,43 @@ class AggressiveMasker:
         
         def heavily_obfuscated_replacer(match):
             url = match.group(0)
-            
-            # RULE 1: Space density (giảm xuống 5% để bắt được "shopee . vn")
-            space_density = url.count(' ') / len(url) if url else 0
-            if space_density < 0.05:  # Chỉ 5% space threshold
+            if not self._is_obfuscated_url(url):
                 return url  # Không mask
             
-            # RULE 2: Context filtering (giữ nguyên)
-            context_words = ['microsoft', 'apple', 'google', 'facebook', 'truy cập', 'website', 'trang web']
-            if any(word in url.lower() for word in context_words):
-                return url  # Không mask
-            
-            # RULE 3: Length validation (tăng lên để tránh false positive)
-            if len(url) < 8:  # Domain quá ngắn
-                return url
-            
-            # RULE 4: Kiểm tra có đủ obfuscated features
-            has_space_in_domain = ' ' in url.split('.')[0] if '.' in url else ' ' in url
-            has_dot_obfuscation = ('(.)' in url or ' . ' in url or '( . )' in url)
-            
-            if not (has_space_in_domain or has_dot_obfuscation):
-                return url  # Không đủ dấu hiệu obfuscated
-            
             # Nếu pass tất cả rules → mask
-            clean_url = re.sub(r'\s+', '', url)  # Clean trước khi lưu
+            clean_url = compiled['whitespace'].sub('', url)  # Clean trước khi lưu
             extracted.append(clean_url)
             return token_tag
 
-        # Thứ tự ưu tiên (Pattern cụ thể chạy trước)
-        
-        # B1: Bắt Broken Shorteners (Case 2)
-        text = re.sub(broken_shortener_pattern, replace_and_extract, text)
-
-        # # B2: Bắt Heavily OBFUSCATED DOMAINS (Case 2.5)
-        text = re.sub(heavily_obfuscated_pattern, heavily_obfuscated_replacer, text)
-
-        # B3: Bắt Protocol mạnh (Case 3)
-        text = re.sub(protocol_agnostic_pattern, replace_and_extract, text)
-
-        # B4: Bắt Schemeless Safe
-        text = re.sub(schemeless_safe_pattern, replace_and_extract, text)
-        
-        # B5: Bắt Schemeless Risky
-        text = re.sub(schemeless_risky_pattern, replace_and_extract, text)
+        # Prefilter: không có dấu chấm (hay biến thể) thì không regex URL nào match được,
+        # nhưng bước cleanup vẫn phải chạy
+        if self.prefilter and not self._has_dot_like(text):
+            self._bump(self.prefilter_stats['skipped'], 'url')
+        else:
+            # Thứ tự ưu tiên (Pattern cụ thể chạy trước)
+            steps = [
+                ('url_broken_shortener', replace_and_extract),           # B1: Bắt Broken Shorteners (Case 2)
+                ('url_heavily_obfuscated', heavily_obfuscated_replacer),  # B2: Bắt Heavily OBFUSCATED DOMAINS (Case 2.5)
+                ('url_protocol', replace_and_extract),                   # B3: Bắt Protocol mạnh (Case 3)
+                ('url_schemeless_safe', replace_and_extract),            # B4: Bắt Schemeless Safe
+                ('url_schemeless_risky', replace_and_extract),           # B5: Bắt Schemeless Risky
+            ]
+            for key, replacer in steps:
+                # Bounded-time: hết ngân sách thời gian -> bỏ các regex URL còn lại
+                # (các regex này backtrack nặng nhất), cleanup và các entity số vẫn chạy
+                if deadline is not None and time.perf_counter() > deadline:
+                    break
+                text = compiled[key].sub(replacer, text)
 
         # Cleanup
-        text = re.sub(rf'{token_tag}[\w\.\-\/]+', token_tag, text)
-        text = re.sub(r'\s+', ' ', text).strip()
+        text = compiled['url_tail'].sub(token_tag, text)
+        text = compiled['whitespace'].sub(' ', text).strip()
 
         return text, extracted
 
     def _custom_bank_masker(self, text, token_tag):
         extracted = []
         
-        # Danh sách từ khóa nhận diện STK (Ngân hàng & Từ chỉ định)
-        keywords = (
-            r'stk|số tk|so tk|số tài khoản|so tai khoan|tài khoản|tai khoan|tk|account|acc|'
-            r'ngân hàng|ngan hang|bank|banking|'
-            r'vietcombank|vcb|techcombank|tcb|mbbank|mb|bidv|vietinbank|vtb|'
-            r'agribank|vpbank|acb|sacombank|tpbank|hdbank|vib|ocb|shb|eximbank|msb'
-        )
-        
-        # Regex giải thích:
-        # 1. (?i)\b(?:...): Bắt đầu bằng một trong các từ khóa trên (case-insensitive)
-        # 2. (?:[\s:\.\-]*?): Cho phép các ký tự ngăn cách (dấu hai chấm, khoảng trắng, dấu chấm...)
-        # 3. (\d{8,19}): Bắt dãy số chính (STK thường từ 8 đến 19 số)
-        # 4. (?!\d): Đảm bảo kết thúc dãy số (không cắt giữa chừng)
-        # 5. Lookbehind/Context check: Đảm bảo số này gắn liền với keyword
-        
-        pattern = rf'(?i)\b({keywords})(?:[\s:\.\-\|]*?)(\d{8,19})(?!\d)'
-        
         def replacer(match):
             keyword = match.group(1) # Giữ lại từ khóa (vd: "Vietcombank")
             number = match.group(2)  # Số tài khoản
@@ -206,22 +745,18 @@ class AggressiveMasker:
             # để giữ ngữ cảnh cho model hiểu đây là thông tin thanh toán.
             return f"{keyword} {token_tag}"
 
-        # Thực hiện replace
-        text = re.sub(pattern, replacer, text)
+        # Thực hiện replace: mọi STK đều bắt đầu bằng từ khóa -> chỉ chạy regex tại vị trí từ khóa
+        text, has_keyword = self._anchored_sub(
+            self._compiled['bank_acc'], self._compiled['bank_anchors'], replacer, text
+        )
+        if not has_keyword and self.prefilter:
+            self._bump(self.prefilter_stats['skipped'], 'bank_acc')
         
         return text, extracted
 
     def _custom_shortcode_masker(self, text, token_tag):
         extracted = []
-        
-        # 1. Tối ưu Whitelist: Gộp thành 1 Regex duy nhất thay vì for loop
-        # Pattern: \b(191|900|...)\b
-        known_shortcodes = [
-            '191', '900', '999', '18001091', '106226', '5050', '9029', 
-            '888', '1414', '9123', '9011'
-        ]
-        # Tạo regex dạng: \b(191|900|999|...)\b
-        whitelist_pattern = r'\b(' + '|'.join(known_shortcodes) + r')\b'
+        compiled = self._compiled
         
         # Hàm callback để thay thế và lưu lại giá trị
         def whitelist_replacer(match):
@@ -230,14 +765,10 @@ class AggressiveMasker:
             return token_tag # Thay thế bằng <PHONE>
 
         # Thực hiện thay thế an toàn
-        if known_shortcodes:
-            text = re.sub(whitelist_pattern, whitelist_replacer, text)
+        if compiled['shortcode_whitelist'] is not None:
+            text = compiled['shortcode_whitelist'].sub(whitelist_replacer, text)
 
         # 2. Xử lý theo Context (Ngữ cảnh)
-        # Regex: (Nhóm từ khóa) + (Khoảng trắng) + (Nhóm số Shortcode)
-        # Group 1: Từ khóa (gửi, soạn...)
-        # Group 2: Số điện thoại
-        context_pattern = r'(?i)\b(gửi|gui|lh|liên hệ|hotline|tổng đài|cskh)\s+(\d{3,6})\b'
 
         def context_replacer(match):
             keyword = match.group(1) # Giữ nguyên từ khóa (ví dụ: "soạn")
@@ -250,72 +781,37 @@ class AggressiveMasker:
             # Chỉ thay thế phần số, giữ lại phần từ khóa
             return f"{keyword} {token_tag}"
 
-        text = re.sub(context_pattern, context_replacer, text)
+        text, _ = self._anchored_sub(
+            compiled['shortcode_context'], compiled['shortcode_anchors'], context_replacer, text
+        )
                  
         return text, extracted
 
     def _custom_code_masker(self, text, token_tag):
         extracted = []
-        
-        # --- DANH SÁCH TIỀN TỐ GÓI CƯỚC HỢP LỆ ---
-        # Bộ lọc quan trọng nhất để phân biệt Code vs Leet Speak
-        # Code nhà mạng luôn bắt đầu bằng các cụm từ này
-        VALID_PREFIXES = {
-            'V', 'ST', 'D', 'C', 'M', 'MI', 'SD', 'HD', 'VD', 'MAX', 'BIG', 'KC', # Viettel/Vina/Mobi prefixes
-            'DK', 'HUY', 'Y', 'KT', 'T', # Cú pháp tin nhắn
-            'NAP', 'TK', 'MK', # Viết tắt chức năng
-            'UMAX', 'TRE', 'SV', 'ECO' # Các gói đặc thù
-        }
+        compiled = self._compiled
 
         # 1. Bắt Code dịch vụ (Chữ hoa + Số)
         def code_replacer(match):
             val = match.group(0)
-            
-            # --- LOGIC PHÂN LOẠI ---
-            
-            # Rule 1: Độ dài. Code gói cước thường ngắn (3-8 ký tự).
-            # Leet speak spam thường dài (ví dụ: KHUYENMA1 -> 9 ký tự)
-            if len(val) > 8: 
-                return val # Trả về nguyên gốc để xử lý như Leet word
-
-            # Rule 2: Kiểm tra Prefix
-            match_prefix = re.match(r'^[A-Z]+', val)
-            if match_prefix:
-                prefix = match_prefix.group(0)
-                
-                # === THÊM RULE MỚI: Phân biệt Leetspeak ===
-                # Leetspeak: Chỉ có 1 số (0 hoặc 1) xen giữa các chữ
-                # Code: Thường có nhiều số liên tiếp hoặc số > 1
-                
-                digits = re.findall(r'\d', val)
-                
-                # Nếu chỉ có 1 số VÀ số đó là 0 hoặc 1 → Có thể là Leetspeak
-                if len(digits) == 1 and digits[0] in '01':
-                    # Kiểm tra thêm: Có chữ SAU số không? (pattern Leet: C0NG, T1EN)
-                    if re.match(r'^[A-Z]+[01][A-Z]+$', val):
-                        return val  # Leetspeak → Không mask
-                
-                # Nếu prefix hợp lệ VÀ không phải Leetspeak → Mask
-                if prefix in VALID_PREFIXES:
-                    extracted.append(val)
-                    return token_tag
-            
+            if self._is_service_code(val):
+                extracted.append(val)
+                return token_tag
             return val
 
         # Regex bắt chuỗi: Bắt đầu bằng Chữ, chứa Số
-        text = re.sub(r'\b[A-Z]+[0-9]+[A-Z0-9]*\b', code_replacer, text)
+        text = compiled['code_candidate'].sub(code_replacer, text)
 
         # 2. Bắt OTP (Số thuần túy 4-6 ký tự) - GIỮ NGUYÊN
-        otp_pattern = r'(?<![\w<])\d{4,6}(?![\w>])'
         
         def otp_replacer(match):
             val = match.group(0)
-            if val.startswith(('19', '20')) and len(val) == 4:
+            if not self._is_otp(val):
                 return val 
             extracted.append(val)
             return "<CODE>"
 
-        text = re.sub(otp_pattern, otp_replacer, text)
+        text = compiled['otp'].sub(otp_replacer, text)
             
         return text, extracted
 
@@ -326,29 +822,370 @@ class AggressiveMasker:
         """
         if not text:
             return "", {}
-        
-        # Chuẩn hóa Unicode trước
-        text = unicodedata.normalize('NFC', text)
-        
+
+        with self._pin_config() as config:
+            return self._mask_cached(text, config['generation'])
+
+    def _mask_cached(self, text: str, generation: int) -> tuple[str, dict]:
+        if not self.cache_size:
+            return self._mask_uncached(text)[:2]
+
+        # Key gồm generation của cấu hình -> không trả kết quả của bộ pattern cũ sau reload
+        key = (generation, hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).digest())
+        with self._cache_lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.cache_stats['hits'] += 1
+            else:
+                self.cache_stats['misses'] += 1
+
+        if cached is None:
+            masked_text, metadata, over_budget = self._mask_uncached(text)
+            if over_budget:
+                # Kết quả có thể thiếu (đã bỏ qua regex URL) -> không cache, lần sau có thể xử lý đủ trong ngân sách
+                return masked_text, metadata
+            cached = (masked_text, tuple((label, tuple(items)) for label, items in metadata.items()))
+            with self._cache_lock:
+                self._cache[key] = cached
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+                    self.cache_stats['evictions'] += 1
+
+        # Trả về bản sao (dict/list mới) -> caller sửa metadata không làm hỏng cache
+        masked_text, metadata = cached
+        return masked_text, {label: list(items) for label, items in metadata}
+
+    def _bump(self, stats: dict, key: str):
+        """Tăng 1 bộ đếm thống kê dưới lock (+= trên dict không an toàn khi nhiều thread cùng mask())"""
+        with self._cache_lock:
+            stats[key] += 1
+
+    def get_cache_stats(self) -> dict:
+        """Thống kê LRU cache của mask(): hits, misses, evictions, size, capacity, hit_rate"""
+        with self._cache_lock:
+            stats = dict(self.cache_stats)
+            stats['size'] = len(self._cache)
+        stats['capacity'] = self.cache_size
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+    def clear_cache(self):
+        """Xóa toàn bộ cache (giữ nguyên thống kê)"""
+        with self._cache_lock:
+            self._cache.clear()
+
+    def _mask_uncached(self, text: str) -> tuple[str, dict, bool]:
+        """
+        Mask 1 tin nhắn (không qua cache)
+        Returns: (masked_text, metadata, over_budget) - over_budget: hết ngân sách thời gian, kết quả có thể thiếu
+        """
+        # Chuẩn hóa Unicode trước (tin nhắn ASCII không dấu đã là NFC)
+        if not text.isascii():
+            text = unicodedata.normalize('NFC', text)
+
+        deadline = None
+        if self.time_budget_ms is not None:
+            deadline = time.perf_counter() + self.time_budget_ms / 1000
+
+        if self.max_length and len(text) > self.max_length:
+            result = self._mask_segments(text, deadline)
+        else:
+            result = self._mask_normalized(text, deadline)
+
+        over_budget = deadline is not None and time.perf_counter() > deadline
+        if over_budget:
+            self._bump(self.budget_stats, 'over_budget')
+        return result[0], result[1], over_budget
+
+    def _mask_normalized(self, text: str, deadline: float = None) -> tuple[str, dict]:
+        """Mask text đã NFC"""
+        return self._mask_sequential(text, deadline)
+
+    def _mask_segments(self, text: str, deadline: float = None) -> tuple[str, dict]:
+        """
+        Bounded-time: tin nhắn dài hơn max_length được cắt thành các đoạn <= max_length
+        (ưu tiên cắt tại khoảng trắng) và mask từng đoạn. Các regex URL có độ phức tạp
+        O(n^2) theo độ dài input nên giới hạn độ dài đoạn = giới hạn thời gian mỗi đoạn.
+        Thực thể nằm vắt qua điểm cắt có thể bị bỏ sót.
+        """
+        self._bump(self.budget_stats, 'segmented')
+        masked_parts = []
+        values = defaultdict(list)
+
+        start = 0
+        n = len(text)
+        while start < n:
+            end = min(start + self.max_length, n)
+            if end < n:
+                cut = max(text.rfind(ch, start + 1, end) for ch in ' \n\t')
+                if cut > start:
+                    end = cut
+            masked, metadata = self._mask_normalized(text[start:end], deadline)
+            if masked:
+                masked_parts.append(masked)
+            for label, items in metadata.items():
+                values[label].extend(items)
+            start = end
+
+        metadata = {label: values[label] for label in self._compiled['entities'] if label in values}
+        return ' '.join(masked_parts), metadata
+
+    def extract_spans(self, text: str) -> list[EntitySpan]:
+        """
+        Trích xuất thực thể kèm offset trên text gốc (NFC) để map token ngược về text ban đầu
+        (highlight trên UI, giải thích, DomainVerifier...) mà không cần chạy lại regex.
+
+        Returns:
+            list[EntitySpan] sắp xếp theo vị trí. Giá trị (value) giống hệt metadata của mask().
+        """
+        return self.mask_with_spans(text)[2]
+
+    def mask_with_spans(self, text: str) -> tuple[str, dict, list[EntitySpan]]:
+        """
+        1 lượt Layer 1 trả về cả kết quả của mask() lẫn extract_spans(), cho caller cần cả 2
+        (VD: DomainVerifier lấy URL từ spans và text đã mask để tìm brand) thay vì chạy Layer 1 hai lần.
+        Không qua LRU cache và bounded-time mode (giống extract_spans()).
+
+        Returns:
+            (masked_text, metadata, spans): masked_text/metadata giống hệt mask(), spans sắp xếp theo vị trí
+        """
+        if not text:
+            return "", {}, []
+        if not text.isascii():
+            text = unicodedata.normalize('NFC', text)
+        with self._pin_config():
+            masked_text, spans = self._extract_spans_tracked(text)
+
+        # spans theo thứ tự tạo (stage -> vị trí) = thứ tự extend metadata của mask()
+        metadata = {}
+        for span in spans:
+            metadata.setdefault(span.label, []).append(span.value)
+        return masked_text, metadata, sorted(spans, key=lambda span: span.start)
+
+    def extract_urls(self, text: str, labels: tuple = ('zalo', 'telegram', 'url'),
+                     spans: list[EntitySpan] = None) -> list[UrlEntity]:
+        """
+        Trích xuất URL dạng UrlEntity (scheme, host, registered domain...) theo thứ tự xuất hiện,
+        không trùng lặp (theo URL đã làm sạch). Registered domain được memo theo host.
+
+        Args:
+            labels: Các loại thực thể là URL (mặc định gồm cả app link Zalo/Telegram)
+            spans: Spans đã có của chính text này (mask_with_spans) -> không chạy lại Layer 1
+        """
+        if not text:
+            return []
+        if not text.isascii():
+            text = unicodedata.normalize('NFC', text)
+        if spans is None:
+            spans = self.extract_spans(text)
+
+        entities = {}
+        for span in spans:
+            if span.label in labels:
+                entity = parse_url(span.value, raw=text[span.start:span.end])
+                entities.setdefault(entity.cleaned, entity)
+        return list(entities.values())
+
+    def _capabilities(self, text: str) -> int:
+        """
+        Tính capability mask của tin nhắn (các bit CAP_*) cho prefilter.
+        CAP_BANK_KEYWORD được kiểm tra tại stage bank (trên text hiện tại) nên không có ở đây.
+        """
+        caps = 0
+        if self._compiled['cap_digit'].search(text):
+            caps |= self.CAP_DIGIT
+        if self._has_dot_like(text):
+            caps |= self.CAP_DOT
+        if '@' in text:
+            caps |= self.CAP_AT
+        if '/' in text:
+            caps |= self.CAP_SLASH
+        return caps
+
+    def _has_dot_like(self, text: str) -> bool:
+        """CAP_DOT: '.', ',' (broken shortener "bit , ly") hoặc 'dot' (heavily obfuscated "abc dot vn")"""
+        return '.' in text or ',' in text or self._compiled['cap_dot_word'].search(text) is not None
+
+    def get_prefilter_stats(self) -> dict:
+        """
+        Thống kê prefilter để theo dõi trên production.
+
+        Returns:
+            dict: {'messages': N, 'skipped': {label: số lần bỏ qua}, 'skip_rate': {label: tỉ lệ}}
+        """
+        with self._cache_lock:
+            messages = self.prefilter_stats['messages']
+            skipped = dict(self.prefilter_stats['skipped'])
+        return {
+            'messages': messages,
+            'skipped': skipped,
+            'skip_rate': {label: (n / messages if messages else 0.0) for label, n in skipped.items()},
+        }
+
+    def _mask_sequential(self, text: str, deadline: float = None) -> tuple[str, dict]:
+        """
+        Chạy lần lượt từng pattern theo thứ tự ưu tiên (mỗi pattern quét và dựng lại toàn bộ text 1 lần).
+        deadline (time.perf_counter()): mốc hết ngân sách thời gian của bounded-time mode
+        """
         metadata = defaultdict(list)
         processed_text = text
 
-        for label, (token_tag, logic) in self.patterns.items():
+        caps = None
+        skipped = []
+        if self.prefilter:
+            # CAP_BANK_KEYWORD được kiểm tra trong _custom_bank_masker (trên text hiện tại)
+            caps = self._capabilities(text) | self.CAP_BANK_KEYWORD
+
+        for label, (token_tag, logic) in self._compiled['entities'].items():
+            # URL luôn phải chạy bước cleanup -> tự kiểm tra CAP_DOT trong _custom_url_masker
+            if caps is not None and label != 'url':
+                required = self.PREFILTER_REQUIREMENTS.get(label, 0)
+                if caps & required != required:
+                    skipped.append(label)
+                    continue
+
             if callable(logic):
                 # Nếu là hàm custom (URL, Code)
-                processed_text, items = logic(processed_text, token_tag)
+                if label == 'url' and deadline is not None:
+                    processed_text, items = logic(processed_text, token_tag, deadline=deadline)
+                else:
+                    processed_text, items = logic(processed_text, token_tag)
                 if items:
                     metadata[label].extend(items)
             else:
-                # Nếu là Regex thuần
-                matches = re.findall(logic, processed_text, flags=re.IGNORECASE | re.UNICODE)
+                # Nếu là Regex thuần (đã biên dịch sẵn): thay bằng Token và thu giá trị trong cùng 1 lượt
+                processed_text, matches = self._sub_and_collect(logic, token_tag, processed_text)
                 if matches:
                     metadata[label].extend(matches)
-                    # Thay thế bằng Token
-                    processed_text = re.sub(logic, token_tag, processed_text, flags=re.IGNORECASE | re.UNICODE)
+
+        if caps is not None:
+            # Cập nhật thống kê prefilter 1 lần (dưới lock) cho cả tin nhắn
+            with self._cache_lock:
+                self.prefilter_stats['messages'] += 1
+                for label in skipped:
+                    self.prefilter_stats['skipped'][label] += 1
 
         return processed_text, dict(metadata)
 
+    @staticmethod
+    def _sub_and_collect(regex, token_tag: str, text: str) -> tuple[str, list]:
+        """
+        Thay mọi match bằng token_tag, đồng thời thu giá trị match (1 lần quét thay vì findall + sub).
+        Giá trị thu được giống hệt regex.findall(): group(0) nếu không có group,
+        group(1) nếu có 1 group, tuple các group nếu có nhiều group.
+        """
+        matches = []
+        if regex.groups == 0:
+            def replacer(m):
+                matches.append(m.group(0))
+                return token_tag
+        else:
+            def replacer(m):
+                matches.append(m.group(1) or '' if regex.groups == 1 else m.groups(''))
+                return token_tag
+
+        text, _ = regex.subn(replacer, text)
+        return text, matches
+
+    def _extract_spans_tracked(self, text: str) -> tuple[str, list[EntitySpan]]:
+        """
+        Chạy các stage theo đúng thứ tự của mask() (STAGES), đồng thời giữ ánh xạ
+        từng ký tự của text hiện tại về khoảng tương ứng trên text gốc.
+        Text chỉ được dựng lại ở stage có match (thay vì mỗi lần re.sub).
+
+        Returns:
+            (masked_text, spans theo thứ tự tạo): masked_text giống hệt output của mask()
+        """
+        compiled = self._compiled
+        stages = compiled['stages']
+        url_tag = compiled['entities']['url'][0]
+
+        current = text
+        raw = [(i, i + 1) for i in range(len(text))]  # ký tự hiện tại -> (raw_start, raw_end)
+        owner = [None] * len(text)                     # ký tự thuộc token của span nào
+        spans = []                                     # [raw_start, raw_end, label, value]
+
+        def substitute(regex, replace):
+            """re.sub có theo dõi offset. replace(match) trả về None (giữ nguyên) hoặc list (chuỗi, raw range, owner)"""
+            nonlocal current, raw, owner
+            pieces, new_raw, new_owner = [], [], []
+            cursor = 0
+            for m in regex.finditer(current):
+                parts = replace(m)
+                if parts is None:
+                    continue
+                start, end = m.span()
+                pieces.append(current[cursor:start])
+                new_raw += raw[cursor:start]
+                new_owner += owner[cursor:start]
+                for chunk, raw_range, chunk_owner in parts:
+                    pieces.append(chunk)
+                    new_raw += [raw_range] * len(chunk)
+                    new_owner += [chunk_owner] * len(chunk)
+                cursor = end
+            if cursor:
+                pieces.append(current[cursor:])
+                current = ''.join(pieces)
+                raw = new_raw + raw[cursor:]
+                owner = new_owner + owner[cursor:]
+
+        def raw_range_of(start, end):
+            return (raw[start][0], raw[end - 1][1]) if end > start else (raw[start][0], raw[start][0])
+
+        def new_span(start, end, label, value, token_tag):
+            raw_range = raw_range_of(start, end)
+            spans.append([raw_range[0], raw_range[1], label, value])
+            return [(token_tag, raw_range, len(spans) - 1)]
+
+        def make_replacer(label, kind, token_tag):
+            def replace(m):
+                value = m.group(0)
+                if kind == 'url_obfuscated' and not self._is_obfuscated_url(value):
+                    return None
+                if kind == 'code' and not self._is_service_code(value):
+                    return None
+                if kind == 'otp' and not self._is_otp(value):
+                    return None
+                if kind in ('url', 'url_obfuscated'):
+                    value = compiled['whitespace'].sub('', value)
+                if kind != 'keyword':
+                    return new_span(m.start(), m.end(), label, value, token_tag)
+                # "gui 9029" -> "gui <PHONE>": giữ từ khóa, khoảng ngăn cách thành 1 dấu cách
+                keyword_end, (number_start, number_end) = m.end(1), m.span(2)
+                return ([(m.group(1), raw_range_of(m.start(1), keyword_end), None),
+                         (' ', raw_range_of(keyword_end, number_start), None)] +
+                        new_span(number_start, number_end, label, m.group(2), token_tag))
+            return replace
+
+        def url_tail(m):
+            # "<URL>abc" -> "<URL>": phần đuôi bị ăn được tính vào span URL tương ứng
+            raw_range = raw_range_of(*m.span())
+            span_id = owner[m.start()]
+            if span_id is not None:
+                spans[span_id][1] = raw_range[1]
+            return [(url_tag, raw_range, span_id)]
+
+        # Prefilter giống mask(): bỏ qua stage không thể match (cleanup URL vẫn chạy)
+        caps = self._capabilities(text) | self.CAP_BANK_KEYWORD if self.prefilter else None
+
+        for key, label, kind, token_tag, regex in stages:
+            required = self.PREFILTER_REQUIREMENTS.get(label, 0)
+            if caps is None or caps & required == required:
+                substitute(regex, make_replacer(label, kind, token_tag))
+            if key == 'url_schemeless_risky':
+                # Cleanup của URL masker (kể cả strip)
+                substitute(compiled['url_tail'], url_tail)
+                substitute(compiled['whitespace'], lambda m: [(' ', raw_range_of(*m.span()), None)])
+                if current.startswith(' '):
+                    current, raw, owner = current[1:], raw[1:], owner[1:]
+                if current.endswith(' '):
+                    current, raw, owner = current[:-1], raw[:-1], owner[:-1]
+
+        return current, [EntitySpan(*span) for span in spans]
+
     def _mask_batch(self, texts: list[str]) -> tuple[list[str], list[dict]]:
         """
         Logic xử lý batch
@@ -363,6 +1200,148 @@ class AggressiveMasker:
             
         return masked_texts, metadatas
 
+    def _mask_joined(self, texts: list[str]) -> tuple[list[str], list[dict]]:
+        """
+        Batch mode 'joined': ghép các tin nhắn bằng JOIN_SEPARATOR, chạy mỗi pattern 1 lần trên
+        buffer chung rồi tách text và metadata về từng tin nhắn (theo vị trí separator).
+        Giảm chi phí ~20 lần gọi `re` cho mỗi tin nhắn ngắn. Kết quả giống hệt mask() từng tin.
+
+        Tin nhắn rỗng/không phải str/chứa JOIN_SEPARATOR được mask riêng bằng mask().
+        Không đi qua LRU cache, không cập nhật prefilter_stats; bounded-time mode
+        (max_length/time_budget_ms) cần mask từng tin nên dùng _mask_batch().
+        """
+        if self.max_length or self.time_budget_ms is not None:
+            return self._mask_batch(texts)
+
+        with self._pin_config():
+            return self._mask_joined_pinned(texts)
+
+    def _mask_joined_pinned(self, texts: list[str]) -> tuple[list[str], list[dict]]:
+        sep = self.JOIN_SEPARATOR
+        results = [None] * len(texts)
+        indices = []
+        parts = []
+        for i, text in enumerate(texts):
+            if isinstance(text, str) and text and sep not in text:
+                indices.append(i)
+                parts.append(text)
+            else:
+                results[i] = self.mask(text)
+
+        if parts:
+            # NFC không thay đổi qua separator (\x00 không kết hợp với ký tự nào)
+            buffer = sep.join(parts)
+            if not buffer.isascii():
+                buffer = unicodedata.normalize('NFC', buffer)
+            values = [defaultdict(list) for _ in parts]
+            masked = self._mask_joined_buffer(buffer, values).split(sep)
+            for i, masked_text, metadata in zip(indices, masked, values):
+                results[i] = (masked_text, dict(metadata))
+
+        return [r[0] for r in results], [r[1] for r in results]
+
+    def _mask_joined_buffer(self, buffer: str, values: list) -> str:
+        """
+        Chạy các stage (thứ tự của mask(), STAGES) trên buffer đã ghép.
+        Giá trị thực thể được gán về tin nhắn chứa vị trí match: values[i][label].
+        """
+        compiled = self._compiled
+        sep = self.JOIN_SEPARATOR
+        url_tag = compiled['entities']['url'][0]
+        anchors = {'bank_acc': compiled['bank_anchors'], 'shortcode_context': compiled['shortcode_anchors']}
+
+        # Capability của cả buffer bao trùm capability của từng tin nhắn
+        caps = self._capabilities(buffer) | self.CAP_BANK_KEYWORD if self.prefilter else None
+
+        for key, label, kind, token_tag, regex in compiled['stages']:
+            required = self.PREFILTER_REQUIREMENTS.get(label, 0)
+            if caps is None or caps & required == required:
+                separators = None
+
+                def replace(m):
+                    nonlocal separators
+                    value = m.group(0)
+                    if kind == 'url_obfuscated' and not self._is_obfuscated_url(value):
+                        return value
+                    if kind == 'code' and not self._is_service_code(value):
+                        return value
+                    if kind == 'otp' and not self._is_otp(value):
+                        return value
+
+                    # Tin nhắn chứa match = số separator đứng trước match (trong buffer trước khi sub)
+                    if separators is None:
+                        separators = []
+                        pos = buffer.find(sep)
+                        while pos != -1:
+                            separators.append(pos)
+                            pos = buffer.find(sep, pos + 1)
+                    items = values[bisect_right(separators, m.start())][label]
+
+                    if kind == 'keyword':
+                        items.append(m.group(2))
+                        return f"{m.group(1)} {token_tag}"
+                    if kind in ('url', 'url_obfuscated'):
+                        value = compiled['whitespace'].sub('', value)
+                    items.append(value)
+                    return token_tag
+
+                if kind == 'keyword':
+                    buffer, _ = self._anchored_sub(regex, anchors[key], replace, buffer)
+                else:
+                    buffer = regex.sub(replace, buffer)
+
+            if key == 'url_schemeless_risky':
+                # Cleanup của URL masker, strip áp dụng cho từng tin nhắn
+                buffer = compiled['url_tail'].sub(url_tag, buffer)
+                buffer = compiled['whitespace'].sub(' ', buffer)
+                buffer = compiled['join_strip'].sub(sep, buffer).strip()
+
+        return buffer
+
+    def mask_batch(self, texts: list[str], workers: int = None, chunk_size: int = 256,
+                   min_parallel_size: int = 2000, joined: bool = False) -> tuple[list[str], list[dict]]:
+        """
+        Mask nhiều tin nhắn, chia thành các chunk chạy song song trên process pool.
+        Mỗi worker khởi tạo AggressiveMasker (cùng cấu hình) đúng 1 lần rồi xử lý mọi chunk được giao.
+
+        Args:
+            texts: Danh sách tin nhắn
+            workers: Số process (mặc định = số CPU). workers <= 1 -> chạy tuần tự trong process hiện tại
+            chunk_size: Số tin nhắn mỗi chunk gửi sang worker
+            min_parallel_size: Batch nhỏ hơn ngưỡng này chạy trong process hiện tại
+                               (chi phí khởi tạo pool lớn hơn lợi ích)
+            joined: True -> mỗi chunk (hoặc cả batch khi chạy tuần tự) được mask bằng _mask_joined()
+
+        Returns:
+            (masked_texts, metadatas) theo đúng thứ tự input, giống _mask_batch()
+
+        Note: Cache và thống kê (cache_stats, prefilter_stats...) nằm trong từng worker,
+        không cộng dồn về masker hiện tại.
+        """
+        texts = list(texts)
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be >= 1")
+
+        chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+        if workers <= 1 or len(chunks) <= 1 or len(texts) < min_parallel_size:
+            return self._mask_joined(texts) if joined else self._mask_batch(texts)
+
+        options = {'prefilter': self.prefilter, 'cache_size': self.cache_size,
+                   'max_length': self.max_length, 'time_budget_ms': self.time_budget_ms,
+                   'config_path': self.config_path, 'trie_regex': self.trie_regex}
+        masked_texts = []
+        metadatas = []
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks)),
+                                 initializer=_init_batch_worker, initargs=(options,)) as pool:
+            # pool.map giữ nguyên thứ tự các chunk
+            for chunk_masked, chunk_metadatas in pool.map(_mask_batch_chunk, chunks, [joined] * len(chunks)):
+                masked_texts.extend(chunk_masked)
+                metadatas.extend(chunk_metadatas)
+
+        return masked_texts, metadatas
+
     def get_entity_counts(self, metadata: dict) -> dict:
         """Chuyển metadata thành entity counts"""
         return {label: len(items) for label, items in metadata.items()}
@@ -373,6 +1352,22 @@ class AggressiveMasker:
         return masked_text, counts
 
 
+# --- WORKER CHO mask_batch() (phải ở mức module để pickle được) ---
+_batch_worker_masker = None
+
+
+def _init_batch_worker(options: dict):
+    """Khởi tạo masker 1 lần cho mỗi worker process"""
+    global _batch_worker_masker
+    _batch_worker_masker = AggressiveMasker(**options)
+
+
+def _mask_batch_chunk(texts: list[str], joined: bool = False) -> tuple[list[str], list[dict]]:
+    if joined:
+        return _batch_worker_masker._mask_joined(texts)
+    return _batch_worker_masker._mask_batch(texts)
+
+
 # --- CHẠY THỬ NGHIỆM ---
 if __name__ == "__main__":
     masker = AggressiveMasker()
@@ -403,7 +1398,7 @@ if __name__ == "__main__":
     print(f"{'ORIGINAL':<50} | {'MASKED'}")
     print("-" * 100)
     
-    masked_batch, meta_batch = masker._mask_batch(samples)
+    masked_batch, meta_batch = masker.mask_batch(samples)
     
     for org, msk, meta in zip(samples, masked_batch, meta_batch):
         print(f"Org: {org}")